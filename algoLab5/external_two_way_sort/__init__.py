@@ -1 +1,6 @@
-from external_two_way_sort.external_sort import my_sort as sort
+from external_two_way_sort.external_sort import my_sort as two_way_sort
+from external_two_way_sort.kway_sort import kway_sort as sort
+from external_two_way_sort.merge import merge_sorted_files
+from external_two_way_sort.offset_sort import offset_sort
+from external_two_way_sort.compression import Codec, register_codec
+from external_two_way_sort.stream import iter_sorted, top_k
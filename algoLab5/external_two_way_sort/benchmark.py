@@ -0,0 +1,275 @@
+"""
+Бенчмарки внешней сортировки
+
+Запуск: python -m external_two_way_sort.benchmark io --size 64
+        python -m external_two_way_sort.benchmark sort --size 8 --bsize 10000
+        python -m external_two_way_sort.benchmark spill --size 8 --bsize 10000
+        python -m external_two_way_sort.benchmark codec --size 8 --bsize 10000
+"""
+import argparse
+import os
+import shutil
+from random import randint
+from time import perf_counter
+
+from external_two_way_sort.external_sort import IO, DEFAULT_BUFFER_SIZE, \
+    my_sort
+from external_two_way_sort.kway_sort import kway_sort
+
+BENCH_DIR = "bench_data"
+MB = 1 << 20
+
+
+def make_txt(path: str, size_mb: float) -> int:
+    """
+    Генерация txt файла со случайными целыми числами
+    :param path: путь к файлу
+    :param size_mb: примерный размер файла в мегабайтах
+    :return: итоговый размер файла в байтах
+    """
+    target = int(size_mb * MB)
+    with open(path, "w", encoding="utf-8") as file:
+        written = 0
+        while written < target:
+            chunk = "\n".join(str(randint(-10 ** 9, 10 ** 9))
+                              for _ in range(10000)) + "\n"
+            file.write(chunk)
+            written += len(chunk)
+    return os.path.getsize(path)
+
+
+def make_csv(path: str, size_mb: float, columns: str = "abcd") -> int:
+    """
+    Генерация csv файла со случайными целыми числами
+    :param path: путь к файлу
+    :param size_mb: примерный размер файла в мегабайтах
+    :param columns: имена столбцов
+    :return: итоговый размер файла в байтах
+    """
+    target = int(size_mb * MB)
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write(",".join(columns) + "\r\n")
+        written = 0
+        while written < target:
+            chunk = "".join(
+                ",".join(str(randint(-10 ** 6, 10 ** 6)) for _ in columns) + "\r\n"
+                for _ in range(10000))
+            file.write(chunk)
+            written += len(chunk)
+    return os.path.getsize(path)
+
+
+def bench_io(size_mb: float, buffer_size: int, batch: int) -> list[dict]:
+    """
+    Замер скорости чтения и записи через IO для txt и csv
+    :param size_mb: размер входных файлов в мегабайтах
+    :param buffer_size: размер блока IO в байтах
+    :param batch: сколько значений считывается за один вызов read_buffer
+    :return: список результатов замеров
+    """
+    results = []
+    for ext, maker in (("txt", make_txt), ("csv", make_csv)):
+        src = os.path.join(BENCH_DIR, f"bench_in.{ext}")
+        dst = os.path.join(BENCH_DIR, f"bench_out.{ext}")
+        size = maker(src, size_mb)
+
+        ts = perf_counter()
+        with open(src, "rb") as file:
+            while file.read(buffer_size):
+                pass
+        raw_time = perf_counter() - ts
+
+        inp = IO(src, "r", "i", buffer_size=buffer_size)
+        out = IO(dst, "w", header=inp.header, buffer_size=buffer_size)
+        read_time = write_time = 0.0
+        records = 0
+        while True:
+            ts = perf_counter()
+            buf = inp.read_buffer(batch)
+            read_time += perf_counter() - ts
+            if not buf:
+                break
+            records += len(buf)
+            ts = perf_counter()
+            out.write_buffer(buf)
+            write_time += perf_counter() - ts
+        ts = perf_counter()
+        out.close()
+        write_time += perf_counter() - ts
+        inp.close()
+
+        results.append({
+            "format": ext,
+            "size_mb": round(size / MB, 2),
+            "records": records,
+            "raw_read_mb_s": round(size / MB / raw_time, 1),
+            "read_mb_s": round(size / MB / read_time, 1),
+            "write_mb_s": round(os.path.getsize(dst) / MB / write_time, 1),
+        })
+    return results
+
+
+def bench_sort(size_mb: float, bsize: int) -> list[dict]:
+    """
+    Сравнение двухпутевого слияния и k-путевого слияния серий,
+    полученных выбором с замещением, по кол-ву проходов и времени
+    :param size_mb: размер входных файлов в мегабайтах
+    :param bsize: кол-во записей в памяти при формировании серий
+    :return: список результатов замеров
+    """
+    results = []
+    for ext, maker in (("txt", make_txt), ("csv", make_csv)):
+        src = os.path.join(BENCH_DIR, f"bench_in.{ext}")
+        size = maker(src, size_mb)
+        for name, engine in (("two_way", my_sort), ("kway", kway_sort)):
+            dst = os.path.join(BENCH_DIR, f"bench_out_{name}.{ext}")
+            ts = perf_counter()
+            stats = engine(src, dst, type_data="i", bsize=bsize)
+            elapsed = perf_counter() - ts
+            results.append({
+                "format": ext,
+                "engine": name,
+                "size_mb": round(size / MB, 2),
+                "runs": stats["runs"],
+                "passes": stats["passes"],
+                "time_s": round(elapsed, 2),
+            })
+    return results
+
+
+def bench_spill(size_mb: float, bsize: int) -> list[dict]:
+    """
+    Сравнение текстовых и двоичных временных серий: время сортировки
+    и среднее время одного прохода для обоих движков
+    :param size_mb: размер входных файлов в мегабайтах
+    :param bsize: кол-во записей в памяти при формировании серий
+    :return: список результатов замеров
+    """
+    results = []
+    for ext, maker in (("txt", make_txt), ("csv", make_csv)):
+        src = os.path.join(BENCH_DIR, f"bench_in.{ext}")
+        size = maker(src, size_mb)
+        for name, engine in (("two_way", my_sort), ("kway", kway_sort)):
+            for runs_format, binary_runs in (("text", False), ("bin", True)):
+                dst = os.path.join(BENCH_DIR, f"bench_out_{name}.{ext}")
+                ts = perf_counter()
+                stats = engine(src, dst, type_data="i", bsize=bsize,
+                               binary_runs=binary_runs)
+                elapsed = perf_counter() - ts
+                results.append({
+                    "format": ext,
+                    "engine": name,
+                    "runs_format": runs_format,
+                    "size_mb": round(size / MB, 2),
+                    "passes": stats["passes"],
+                    "time_s": round(elapsed, 2),
+                    "pass_time_s": round(elapsed / max(stats["passes"], 1), 2),
+                })
+    return results
+
+
+def bench_codec(size_mb: float, bsize: int, engine: str,
+                codecs: list[str]) -> list[dict]:
+    """
+    Матрица кодеков сжатия временных серий: время сортировки
+    и объем записанного на диск для txt и csv
+    :param size_mb: размер входных файлов в мегабайтах
+    :param bsize: кол-во записей в памяти при формировании серий
+    :param engine: two_way или kway
+    :param codecs: имена кодеков, none - без сжатия
+    :return: список результатов замеров
+    """
+    sort_func = my_sort if engine == "two_way" else kway_sort
+    results = []
+    for ext, maker in (("txt", make_txt), ("csv", make_csv)):
+        src = os.path.join(BENCH_DIR, f"bench_in.{ext}")
+        dst = os.path.join(BENCH_DIR, f"bench_out.{ext}")
+        size = maker(src, size_mb)
+        for codec in codecs:
+            ts = perf_counter()
+            stats = sort_func(src, dst, type_data="i", bsize=bsize, codec=codec)
+            elapsed = perf_counter() - ts
+            results.append({
+                "format": ext,
+                "codec": codec,
+                "size_mb": round(size / MB, 2),
+                "passes": stats["passes"],
+                "spilled_mb": round(stats["bytes_spilled"] / MB, 2),
+                "time_s": round(elapsed, 2),
+            })
+    return results
+
+
+def print_table(results: list[dict]) -> None:
+    """
+    Вывод результатов замеров в виде таблицы
+    :param results: список словарей с одинаковыми ключами
+    """
+    if not results:
+        return
+    cols = list(results[0])
+    widths = [max(len(col), *(len(str(res[col])) for res in results))
+              for col in cols]
+    print("  ".join(col.ljust(w) for col, w in zip(cols, widths)))
+    for res in results:
+        print("  ".join(str(res[col]).ljust(w) for col, w in zip(cols, widths)))
+
+
+def main():
+    """
+    Точка входа CLI бенчмарков
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарки внешней сортировки")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    io_parser = sub.add_parser("io", help="Скорость чтения и записи IO (МБ/с)")
+    io_parser.add_argument("--size", type=float, default=32,
+                           help="Размер входных файлов в МБ")
+    io_parser.add_argument("--io_buffer", type=int, default=DEFAULT_BUFFER_SIZE,
+                           help="Размер блока IO в байтах")
+    io_parser.add_argument("--batch", type=int, default=10000,
+                           help="Кол-во значений за один вызов read_buffer")
+
+    sort_parser = sub.add_parser("sort", help="Проходы и время: two_way против kway")
+    sort_parser.add_argument("--size", type=float, default=8,
+                             help="Размер входных файлов в МБ")
+    sort_parser.add_argument("--bsize", type=int, default=10000,
+                             help="Кол-во записей в памяти")
+
+    spill_parser = sub.add_parser("spill", help="Время проходов: текстовые "
+                                                "против двоичных серий")
+    spill_parser.add_argument("--size", type=float, default=8,
+                              help="Размер входных файлов в МБ")
+    spill_parser.add_argument("--bsize", type=int, default=10000,
+                              help="Кол-во записей в памяти")
+
+    codec_parser = sub.add_parser("codec", help="Время и объем на диске "
+                                                "для разных кодеков сжатия серий")
+    codec_parser.add_argument("--size", type=float, default=8,
+                              help="Размер входных файлов в МБ")
+    codec_parser.add_argument("--bsize", type=int, default=10000,
+                              help="Кол-во записей в памяти")
+    codec_parser.add_argument("--engine", choices=("kway", "two_way"),
+                              default="two_way", help="Движок сортировки")
+    codec_parser.add_argument("--codecs", nargs="+",
+                              default=["none", "zlib:1", "zlib:6", "bz2", "lzma:0"],
+                              help="Кодеки, с уровнем - zlib:6")
+
+    args = parser.parse_args()
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    try:
+        if args.bench == "io":
+            print_table(bench_io(args.size, args.io_buffer, args.batch))
+        elif args.bench == "sort":
+            print_table(bench_sort(args.size, args.bsize))
+        elif args.bench == "spill":
+            print_table(bench_spill(args.size, args.bsize))
+        elif args.bench == "codec":
+            print_table(bench_codec(args.size, args.bsize, args.engine,
+                                    args.codecs))
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
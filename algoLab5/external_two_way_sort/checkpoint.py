@@ -0,0 +1,232 @@
+"""
+Манифест возобновляемой сортировки: в папке задания внутри TEMP_DIR
+хранится список готовых серий с контрольными суммами,
+после падения сортировка продолжается с последней завершенной фазы
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zlib
+from typing import Optional
+
+from external_two_way_sort.external_sort import IO, TEMP_DIR
+
+MANIFEST_NAME = "manifest.json"
+CHECKSUM_BLOCK = 1 << 20
+
+
+def file_checksum(path: str) -> tuple[int, int]:
+    """
+    Контрольная сумма файла
+    :param path: путь к файлу
+    :return: crc32 и размер файла в байтах
+    """
+    crc = 0
+    size = 0
+    with open(path, "rb") as file:
+        while block := file.read(CHECKSUM_BLOCK):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+    return crc, size
+
+
+def input_signature(path: str) -> list[int]:
+    """
+    Признак неизменности входного файла
+    :param path: путь к файлу
+    :return: размер и время изменения
+    """
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Manifest:
+    """
+    Состояние задания сортировки, записываемое на диск после каждой фазы:
+    серии каждого входного файла, серии после проходов слияния
+    и файлы, отсортированные на месте
+    """
+
+    def __init__(self, params: dict, inputs: list[str]) -> None:
+        """
+        Открытие задания: если в TEMP_DIR есть манифест с теми же параметрами,
+        неизмененными входными файлами и целыми сериями - состояние
+        восстанавливается, иначе задание начинается заново
+        :param params: параметры сортировки, от которых зависит результат
+        :param inputs: входные файлы
+        """
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+        self.name = f"job_{digest.hexdigest()[:12]}"
+        self.dir = os.path.join(TEMP_DIR, self.name)
+        self.path = os.path.join(self.dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+
+        state = self._load(inputs)
+        if state is None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            state = {"params": params, "next_run": 0, "header": None,
+                     "key": None, "merged": None,
+                     "files": [{"name": name, "signature": input_signature(name),
+                                "runs": None, "done": False}
+                               for name in inputs]}
+        self.state = state
+        self.resumed = bool(self._live()) or \
+            any(entry["done"] for entry in state["files"])
+        os.makedirs(self.dir, exist_ok=True)
+        live = set(self._live()) | {MANIFEST_NAME}
+        for name in os.listdir(self.dir):
+            if name not in live:
+                os.remove(os.path.join(self.dir, name))
+        self._save()
+
+    def _load(self, inputs: list[str]) -> Optional[dict]:
+        """
+        Чтение и проверка сохраненного манифеста
+        :param inputs: входные файлы
+        :return: состояние или None, если продолжать нечего
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if [entry["name"] for entry in state["files"]] != inputs:
+            return None
+        for entry in state["files"]:
+            if entry["runs"] is None and \
+                    input_signature(entry["name"]) != entry["signature"]:
+                print(f"Входной файл {entry['name']} изменился, "
+                      f"сортировка начинается заново")
+                return None
+        checksums = state.get("checksums", {})
+        for name in self._live(state):
+            path = os.path.join(self.dir, name)
+            if not os.path.exists(path) or \
+                    list(file_checksum(path)) != checksums.get(name):
+                print(f"Серия {name} повреждена, сортировка начинается заново")
+                return None
+        return state
+
+    def _live(self, state: Optional[dict] = None) -> list[str]:
+        """
+        Серии, которые еще нужны заданию
+        :param state: состояние, по умолчанию текущее
+        :return: имена файлов серий в папке задания
+        """
+        state = state or self.state
+        if state["merged"] is not None:
+            return list(state["merged"])
+        return [name for entry in state["files"]
+                if entry["runs"] is not None and not entry["done"]
+                for name in entry["runs"]]
+
+    def _save(self) -> None:
+        """
+        Атомарная запись манифеста и удаление серий, которые больше не нужны
+        """
+        live = self._live()
+        checksums = self.state.get("checksums", {})
+        self.state["checksums"] = {
+            name: checksums.get(name) or
+            list(file_checksum(os.path.join(self.dir, name)))
+            for name in live}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump(self.state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+        for name in set(checksums) - set(live):
+            try:
+                os.remove(os.path.join(self.dir, name))
+            except FileNotFoundError:
+                pass
+
+    def run_name(self, file_ext: str) -> str:
+        """
+        Имя новой серии задания относительно TEMP_DIR
+        :param file_ext: расширение файла серии
+        :return: имя файла
+        """
+        with self._lock:
+            num = self.state["next_run"]
+            self.state["next_run"] += 1
+        return f"{self.name}/run_{num}.{file_ext}"
+
+    @staticmethod
+    def _names(runs: list[IO]) -> list[str]:
+        return [os.path.basename(run.path) for run in runs]
+
+    def file_runs(self, ind: int) -> Optional[list[str]]:
+        """
+        Сохраненные серии входного файла
+        :param ind: номер входного файла
+        :return: имена серий относительно TEMP_DIR или None
+        """
+        runs = self.state["files"][ind]["runs"]
+        return None if runs is None else [f"{self.name}/{name}" for name in runs]
+
+    def merged_runs(self) -> Optional[list[str]]:
+        """
+        Серии после последнего завершенного прохода слияния всех файлов
+        :return: имена серий относительно TEMP_DIR или None
+        """
+        runs = self.state["merged"]
+        return None if runs is None else [f"{self.name}/{name}" for name in runs]
+
+    def is_done(self, ind: int) -> bool:
+        """
+        :param ind: номер входного файла
+        :return: True если файл уже отсортирован на месте
+        """
+        return self.state["files"][ind]["done"]
+
+    def set_file_runs(self, ind: int, runs: list[IO]) -> None:
+        """
+        Запись готовых серий входного файла
+        :param ind: номер входного файла
+        :param runs: закрытые серии
+        """
+        with self._lock:
+            self.state["files"][ind]["runs"] = self._names(runs)
+            self._save()
+
+    def set_merged_runs(self, runs: list[IO]) -> None:
+        """
+        Запись серий после прохода слияния всех файлов
+        :param runs: закрытые серии
+        """
+        with self._lock:
+            self.state["merged"] = self._names(runs)
+            self._save()
+
+    def set_done(self, ind: int) -> None:
+        """
+        Отметка о том, что входной файл отсортирован на месте
+        :param ind: номер входного файла
+        """
+        with self._lock:
+            self.state["files"][ind]["done"] = True
+            self._save()
+
+    def set_format(self, header: Optional[list[str]], key: Optional[str]) -> None:
+        """
+        Запоминание заголовка и ключа, входной файл при сортировке на месте
+        к моменту возобновления может быть уже перезаписан
+        :param header: заголовок csv
+        :param key: ключ сортировки
+        """
+        if self.state["header"] is None and self.state["key"] is None:
+            self.state["header"], self.state["key"] = header, key
+
+    def finish(self) -> None:
+        """
+        Удаление папки задания после успешного завершения сортировки
+        """
+        shutil.rmtree(self.dir, ignore_errors=True)
+        try:
+            os.rmdir(TEMP_DIR)
+        except OSError:
+            pass
@@ -0,0 +1,112 @@
+"""
+Кодеки сжатия кадров временных серий.
+Каждый кадр двоичной серии сжимается отдельно,
+поэтому слияние читает и распаковывает серии потоково
+"""
+import bz2
+import lzma
+import zlib
+from typing import Optional, Union
+
+
+class Codec:
+    """
+    Кодек без сжатия и интерфейс для остальных кодеков:
+    достаточно переопределить compress и decompress
+    """
+    name = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Сжатие кадра
+        :param data: байты кадра
+        :return: сжатые байты
+        """
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Распаковка кадра
+        :param data: сжатые байты
+        :return: байты кадра
+        """
+        return data
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+class ZlibCodec(Codec):
+    """
+    Кодек zlib: быстрое сжатие, подходит для упирающейся в диск сортировки
+    """
+    name = "zlib"
+
+    def __init__(self, level: int = 1) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Bz2Codec(Codec):
+    """
+    Кодек bz2
+    """
+    name = "bz2"
+
+    def __init__(self, level: int = 9) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return bz2.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return bz2.decompress(data)
+
+
+class LzmaCodec(Codec):
+    """
+    Кодек lzma: максимальное сжатие ценой времени
+    """
+    name = "lzma"
+
+    def __init__(self, level: int = 0) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self.level, check=lzma.CHECK_NONE)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+
+CODECS = {codec.name: codec for codec in (Codec, ZlibCodec, Bz2Codec, LzmaCodec)}
+
+
+def register_codec(codec: type) -> None:
+    """
+    Регистрация пользовательского кодека
+    :param codec: подкласс Codec с уникальным name
+    """
+    CODECS[codec.name] = codec
+
+
+def get_codec(codec: Union[str, Codec, None]) -> Optional[Codec]:
+    """
+    Получение кодека по имени вида "zlib" или "zlib:6" (с уровнем сжатия)
+    :param codec: имя, экземпляр кодека или None
+    :return: экземпляр кодека или None, если сжатие не нужно
+    """
+    if codec is None or isinstance(codec, Codec):
+        return codec
+    name, _, level = codec.partition(":")
+    if name not in CODECS:
+        raise ValueError(f"unknown codec {name!r}, "
+                         f"available: {', '.join(CODECS)}")
+    if name == "none":
+        return None
+    return CODECS[name](int(level)) if level else CODECS[name]()
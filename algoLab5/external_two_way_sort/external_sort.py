@@ -1,13 +1,26 @@
 import csv
 from functools import wraps
-from io import UnsupportedOperation
+from io import UnsupportedOperation, StringIO
+from itertools import islice, chain
 import os
+import pickle
+import struct
+from shutil import copyfileobj
 from time import time
-from typing import Optional, Callable, Union, Iterable
+from typing import Optional, Callable, Union, Iterable, Iterator
 
+from external_two_way_sort.compression import Codec, get_codec
 from external_two_way_sort.internal_sort import merge_sort
+from external_two_way_sort.keys import key_converters, key_func
+from external_two_way_sort.memory import HEAP_ENTRY_OVERHEAD, parse_size, \
+    peak_rss, size_func
 TEMP_DIR = r"temp"
 EOF = "¶"
+DEFAULT_BUFFER_SIZE = 1 << 20
+MIN_BUFFER_SIZE = 4 << 10
+CSV_BATCH = 4096
+MERGE_SORT_COPIES = 3
+BIN_FRAME = struct.Struct("<Q")
 CsvRow = dict[str, Union[int, float, str]]
 
 
@@ -30,15 +43,45 @@ def timing(f: Callable):
     return wrap
 
 
+def iter_text_blocks(file, buffer_size: int) -> Iterator[StringIO]:
+    """
+    Генератор текстовых блоков бинарного файла,
+    каждый блок заканчивается на границе строки
+    :param file: файл, открытый в бинарном режиме
+    :param buffer_size: размер считываемого блока в байтах
+    :return: блок в виде StringIO, итерирование по которому дает строки
+    """
+    tail = b""
+    while block := file.read(buffer_size):
+        chunk = tail + block
+        cut = chunk.rfind(b"\n") + 1
+        tail = chunk[cut:]
+        if cut:
+            yield StringIO(chunk[:cut].decode(), newline="")
+    if tail:
+        yield StringIO(tail.decode(), newline="")
+
+
 class IO:
     """
-    Класс реализации ввода-вывода для txt и csv файлов
+    Класс реализации ввода-вывода для txt и csv файлов.
+    Файл читается и пишется крупными блоками по buffer_size байт,
+    значения разбираются и сериализуются пачками.
+    Файлы .bin - двоичный формат временных серий: кадры из длины и
+    pickle-пачки уже типизированных записей, первый кадр - заголовок csv
+    (None для txt), поэтому текст не разбирается повторно на каждом проходе.
+    Пачка кадра занимает в памяти около buffer_size байт, сколько бы
+    записей в нее ни попало.
+    Кадры .bin могут сжиматься кодеком по отдельности
     """
     def __init__(self, filename: str, mode: str, data_type: str = "s",
                  is_temp: bool = False,
                  delimiter: str = ",",
                  header: Optional[list[str, ...]] = None,
-                 key_val: Optional[str] = None):
+                 key_val: Optional[str] = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 stats: Optional[dict] = None,
+                 codec: Optional[Codec] = None):
         """
         Инициализация экземпляра класса
         :param filename: имя файла
@@ -48,13 +91,26 @@ class IO:
         :param is_temp: флаг временного файла
         :param delimiter: разделитель для csv
         :param header: заголовок для csv файлов, открытых в режиме "w"
-        :param key_val: ключевое значение, по которому производится сортировка
+        :param key_val: ключ сортировки csv: столбец или составной ключ
+        вида "date,id:i:desc", типы столбцов ключа приводятся при чтении
+        :param buffer_size: размер блока чтения и записи в байтах
+        :param stats: словарь статистики сортировки, в bytes_spilled
+        которого накапливается кол-во записанных байт
+        :param codec: кодек сжатия кадров для файлов .bin
         """
         self.mode = mode
+        self.stats = stats
+        self.codec = codec
         self.filename = filename
         self.is_temp = is_temp
+        # временный файл, который еще нужен возобновляемому заданию,
+        # удаляется манифестом задания, а не при удалении экземпляра
+        self.keep = False
+        self.data_type = data_type
         self.descr = {"i": int, "s": str, "f": float}[data_type]
         self.header = header
+        self.delimiter = delimiter
+        self.buffer_size = buffer_size
 
         try:
             os.mkdir(TEMP_DIR)
@@ -63,108 +119,213 @@ class IO:
 
         self.path = os.path.join(TEMP_DIR, filename) if is_temp else filename
 
-        self.is_txt = self.path.endswith(".txt")
-        self.file = open(self.path, mode, newline="") if not self.is_txt \
-            else open(self.path, mode)
+        self.is_bin = self.path.endswith(".bin")
+        self.is_txt = self.path.endswith(".txt") or \
+            (self.is_bin and header is None)
+        if not self.is_txt and header is None and mode == "w":
+            raise TypeError("mode is write and header is not given")
         self.key = key_val
-
+        self.file = None
+        self._sizeof = None
+        self._open()
+        if self.is_bin:
+            self.is_txt = self.header is None
+        self._convert = []
         if not self.is_txt:
-            self.delimiter = delimiter
-            if mode == "r":
-                self.csv_access = csv.DictReader(self.file,
-                                                 delimiter=delimiter)
-                self.header = self.csv_access.fieldnames
+            self.key = self.key if self.key else \
+                (self.header[0] if self.header else None)
+            if self.key:
+                self._convert = key_converters(self.key, data_type)
+
+    def _open(self) -> None:
+        """
+        Открытие файла в текущем режиме и сброс буферов
+        """
+        self.file = open(self.path, self.mode + "b", buffering=0)
+        self._pending = []
+        self._pos = 0
+        self._tail = b""
+        self._eof = False
+        self._out = []
+        self._out_size = 0
+
+        if self.is_bin:
+            if self.mode == "r":
+                frame = self._read_frame()
+                self.header = None if frame is None else pickle.loads(frame)
             else:
-                self.csv_access = csv.DictWriter(self.file, header,
-                                                 delimiter=delimiter)
-                self.csv_access.writeheader()
-            self.key = self.key if self.key else self.header[0]
-            if header is None and mode == "w":
-                raise TypeError("mode is write and header is not given")
+                self._write_frame(self.header)
+            return
+        if self.is_txt:
+            return
+        if self.mode == "r":
+            self._csv_rows = csv.reader(
+                chain.from_iterable(iter_text_blocks(self.file, self.buffer_size)),
+                delimiter=self.delimiter)
+            self.header = next(self._csv_rows, None)
+        else:
+            self._csv_text = StringIO()
+            self._csv_writer = csv.writer(self._csv_text,
+                                          delimiter=self.delimiter)
+            self._csv_writer.writerow(self.header)
+
+    def _read_frame(self) -> Optional[bytes]:
+        """
+        Считывание одного кадра двоичного файла и его распаковка кодеком
+        :return: байты кадра или None в конце файла
+        """
+        head = self.file.read(BIN_FRAME.size)
+        if len(head) < BIN_FRAME.size:
+            return None
+        size, = BIN_FRAME.unpack(head)
+        data = self.file.read(size)
+        while len(data) < size:
+            part = self.file.read(size - len(data))
+            if not part:
+                raise EOFError(f"{self.path}: truncated frame")
+            data += part
+        return data if self.codec is None else self.codec.decompress(data)
+
+    def _write_raw(self, data: bytes) -> None:
+        """
+        Запись байт в файл с учетом объема записанного во временные файлы
+        :param data: байты
+        """
+        self.file.write(data)
+        if self.stats is not None:
+            self.stats["bytes_spilled"] = \
+                self.stats.get("bytes_spilled", 0) + len(data)
+
+    def _write_frame(self, obj) -> None:
+        """
+        Запись объекта в двоичный файл кадром с префиксом длины
+        :param obj: сериализуемый объект
+        """
+        blob = pickle.dumps(obj, protocol=5)
+        if self.codec is not None:
+            blob = self.codec.compress(blob)
+        self._write_raw(BIN_FRAME.pack(len(blob)) + blob)
+
+    def _fill_bin(self) -> bool:
+        """
+        Считывание следующего кадра двоичного файла
+        :return: True если удалось считать хотя бы одну запись
+        """
+        while (frame := self._read_frame()) is not None:
+            self._pending, self._pos = pickle.loads(frame), 0
+            if self._pending:
+                return True
+        self._pending, self._pos = [], 0
+        return False
 
-    def _read_txt(self) -> Union[int, float, str]:
-        """
-        Метод считывания одной строки из txt файла
-        :return: строка, приведенная к data_type типу
-        """
-        if self.mode != "r":
-            raise UnsupportedOperation("not readable")
-        res = []
-        while True:
-            char = self.file.read(1)
-            if char == "":
-                break
-            if char == "\n":
-                if (val := "".join(res)) != "None":
+    def _fill_txt(self) -> bool:
+        """
+        Считывание следующего блока txt файла и разбор всех целых строк в нем
+        :return: True если удалось считать хотя бы одно значение
+        """
+        while not self._eof:
+            block = self.file.read(self.buffer_size)
+            if block:
+                chunk = self._tail + block
+                if b"\r" in chunk:
+                    chunk = chunk.replace(b"\r\n", b"\n")
+                cut = chunk.rfind(b"\n")
+                if cut == -1:
+                    self._tail = chunk
+                    continue
+                self._tail = chunk[cut + 1:]
+                chunk = chunk[:cut]
+            else:
+                self._eof = True
+                chunk = self._tail.rstrip(b"\r")
+                self._tail = b""
+                if not chunk:
+                    break
 
-                    return self.descr(val)
-                else:
-                    return EOF
-            res.append(char)
+            if self.data_type == "s":
+                lines = chunk.decode().split("\n")
+                stop = "None"
+            else:
+                lines = chunk.split(b"\n")
+                stop = b"None"
+            if stop in lines:
+                lines = lines[:lines.index(stop)]
+                self._eof = True
+            if self.data_type != "s":
+                lines = list(map(self.descr, lines))
+            self._pending, self._pos = lines, 0
+            if lines:
+                return True
+        return False
 
-        return EOF
+    def _fill_csv(self) -> bool:
+        """
+        Считывание и разбор следующей пачки строк csv файла
+        :return: True если удалось считать хотя бы одну строку
+        """
+        header, convert = self.header, self._convert
+        rows = []
+        size = 0
+        for raw in islice(self._csv_rows, CSV_BATCH):
+            if raw:
+                row = dict(zip(header, raw))
+                for col, descr in convert:
+                    row[col] = descr(row[col])
+                rows.append(row)
+                # пачка длинных строк ограничена размером блока
+                size += sum(map(len, raw))
+                if size >= self.buffer_size:
+                    break
+        self._pending, self._pos = rows, 0
+        return bool(rows)
 
-    def _read_csv(self) -> Union[str, CsvRow]:
+    def _fill(self) -> bool:
         """
-        Метод считывания одной строки из csv файла
-        :return: словарь, где ключи - заголовки текущего столбца
+        Пополнение буфера считанных значений
+        :return: True если в буфере появились значения
         """
         if self.mode != "r":
             raise UnsupportedOperation("not readable")
-        try:
-            res = next(self.csv_access)  # noqa
-            res[self.key] = self.descr(res[self.key])
-        except StopIteration:
-            return EOF
-        return res
+        if self.is_bin:
+            return self._fill_bin()
+        if self.is_txt:
+            return self._fill_txt()
+        return self._fill_csv()
 
     def read(self) -> Union[str, int, float, CsvRow]:
         """
         Универсальный метод чтения для любых файлов
         :return: считанное значение
         """
-        if self.is_txt:
-            return self._read_txt()
-        else:
-            return self._read_csv()
-
-    def _is_txt_empty(self) -> bool:
-        """
-        Проверка txt файла на пустоту
-        :return: True если файл пустой, False в противном случае
-        """
-        self.file.seek(0, 0)
-        data = self.file.read()
-        self.file.seek(0, 0)
-        if not data:
-            return True
-        return False
+        if self._pos >= len(self._pending) and not self._fill():
+            return EOF
+        val = self._pending[self._pos]
+        self._pos += 1
+        return val
 
-    def _is_csv_empty(self) -> bool:
+    def read_block(self) -> list[Union[str, int, float, CsvRow], ...]:
         """
-        Проверка txt файла на пустоту
-        :return: True если файл пустой, False в противном случае
+        Метод считывания оставшихся значений текущего блока файла,
+        в отличие от read_buffer объем ограничен размером блока, а не
+        кол-вом записей
+        :return: список значений, пустой в конце файла
         """
-        try:
-            self.file.seek(0, 0)
-            next(self.csv_access)  # noqa
-            next(self.csv_access)  # noqa
-            self.file.seek(0, 0)
-            next(self.csv_access)  # noqa
-
-        except StopIteration:
-            return True
-        return False
+        if self._pos >= len(self._pending) and not self._fill():
+            return []
+        res = self._pending[self._pos:] if self._pos else self._pending
+        self._pending, self._pos = [], 0
+        return res
 
     def is_empty(self) -> bool:
         """
-        Универсальный метод проверки на пустот для txt и csv
+        Универсальный метод проверки на пустоту для txt и csv,
+        после проверки чтение начинается с начала файла
         :return: True если файл пустой, False в противном случае
         """
-        if self.is_txt:
-            return self._is_txt_empty()
-        else:
-            return self._is_csv_empty()
+        self.change_mode(self.mode)
+        res = self.read() == EOF
+        self.change_mode(self.mode)
+        return res
 
     def read_buffer(self, buffer_size: int)\
             -> list[Union[str, int, float, CsvRow], ...]:
@@ -174,75 +335,131 @@ class IO:
         :return: список со строками файла
         """
         res = []
-        for i in range(buffer_size):
-            num = self.read()
-            if num != EOF:
-                res.append(num)
-            else:
+        while len(res) < buffer_size:
+            if self._pos >= len(self._pending) and not self._fill():
                 break
+            end = self._pos + buffer_size - len(res)
+            res.extend(self._pending[self._pos:end])
+            self._pos = min(end, len(self._pending))
         return res
 
+    def flush(self) -> None:
+        """
+        Запись накопленного буфера в файл
+        """
+        if self.mode != "w":
+            return
+        if self.is_bin:
+            if self._out:
+                self._write_frame(self._out)
+                self._out = []
+        elif self.is_txt:
+            if self._out:
+                self._write_raw("".join(self._out).encode())
+                self._out.clear()
+        elif self._csv_text.tell():
+            self._write_raw(self._csv_text.getvalue().encode())
+            self._csv_text.seek(0)
+            self._csv_text.truncate()
+        self._out_size = 0
+
     def change_mode(self, new_mode: str) -> None:
         """
         Метод смены режима файла с чтения на запись и обратно
         :param new_mode: новый режим
         """
-        self.mode = new_mode
+        self.flush()
         self.file.close()
+        self.mode = new_mode
+        self._open()
 
-        if not self.is_txt:
-            self.file = open(self.path, self.mode, newline="")
-            if new_mode == "r":
-                self.csv_access = csv.DictReader(self.file,
-                                                 delimiter=self.delimiter)
-            else:
-                self.csv_access = csv.DictWriter(self.file, self.header,
-                                                 delimiter=self.delimiter)
-                self.csv_access.writeheader()
-        else:
-            self.file = open(self.path, self.mode)
-
-    def _write_txt(self, val: Union[str, int, float]) -> None:
+    def write(self, val: Union[str, int, float, CsvRow]) -> None:
         """
-        Метод для записи значения в txt файл
+        Метод записи значения в файл
         :param val: значение
         """
-        self.file.write(f"{val}\n")
+        if self.is_bin and self.mode == "w" and self._sizeof is not None:
+            self._out.append(val)
+            self._out_size += self._sizeof(val)
+            if self._out_size >= self.buffer_size:
+                self.flush()
+            return
+        self.write_buffer([val])
 
-    def _write_csv(self, row: CsvRow) -> None:
-        """
-        Метод для записи значения в csv файл
-        :param row: значение
-        """
-        self.csv_access.writerow(row)
-
-    def write(self, val: Union[str, int, float, CsvRow]) -> None:
+    def write_buffer(self,
+                     buffer: list[Union[int, float, str, CsvRow], ...],
+                     size: Optional[int] = None) -> None:
         """
-        Метод записи значения в файл
-        :param val: значение
+        Метод записи списка значений в файл
+        :param buffer: список значений
+        :param size: размер значений в памяти, если он уже известен,
+        иначе для .bin он оценивается заново
         """
         if self.mode != "w":
             raise UnsupportedOperation("not writable")
-        if self.is_txt:
-            self._write_txt(val)
+        if not buffer:
+            return
+        if self.is_bin:
+            if size is None:
+                if self._sizeof is None:
+                    self._sizeof = size_func(buffer[0])
+                size = sum(map(self._sizeof, buffer))
+            if self._out_size + size >= 2 * self.buffer_size \
+                    and len(buffer) > 1:
+                # пачка больше кадра делится на кадры по buffer_size байт
+                self.write_iter(buffer)
+                return
+            self._out.extend(buffer)
+            self._out_size += size
+        elif self.is_txt:
+            text = "\n".join(map(str, buffer)) + "\n"
+            self._out.append(text)
+            self._out_size += len(text)
         else:
-            self._write_csv(val)
-
-    def _txt_copy_to(self, out_file) -> None:
-        """
-        Метод копирования текущего txt файла в другой
-        :param out_file: файл, в который копируем
-        """
-        while (char := self.file.read()) != "":
-            out_file.file.write(char)
+            header = self.header
+            self._csv_writer.writerows([[row.get(col) for col in header]
+                                        for row in buffer])
+            self._out_size = self._csv_text.tell()
+        if self._out_size >= self.buffer_size:
+            self.flush()
 
-    def _csv_copy_to(self, out_file) -> None:
+    def write_iter(self, values: Iterable) -> int:
         """
-        Метод копирования текущего csv файла в другой
-        :param out_file: файл, в который копируем
+        Метод записи всех значений итератора, буфер записывается в файл,
+        как только значения в нем займут buffer_size байт, поэтому в памяти
+        не копится пачка длинных записей
+        :param values: итератор значений
+        :return: кол-во записанных значений
         """
-        while (res := self.read()) != EOF:
-            out_file.write(res)
+        if self.mode != "w":
+            raise UnsupportedOperation("not writable")
+        written = 0
+        if not (self.is_bin or self.is_txt):
+            header, text = self.header, self._csv_text
+            writerow = self._csv_writer.writerow
+            for written, row in enumerate(values, 1):
+                writerow([row.get(col) for col in header])
+                if text.tell() >= self.buffer_size:
+                    self.flush()
+            return written
+
+        out, size, limit = self._out, self._out_size, self.buffer_size
+        is_bin, sizeof = self.is_bin, self._sizeof
+        for written, val in enumerate(values, 1):
+            if not is_bin:
+                val = f"{val}\n"
+                size += len(val)
+            else:
+                if sizeof is None:
+                    sizeof = self._sizeof = size_func(val)
+                size += sizeof(val)
+            out.append(val)
+            if size >= limit:
+                self._out_size = size
+                self.flush()
+                out, size = self._out, 0
+        self._out_size = size
+        return written
 
     def copy_to(self, out_file) -> None:
         """
@@ -251,28 +468,33 @@ class IO:
         """
         out_file.change_mode("w")
         self.change_mode("r")
-        if self.is_txt:
-            self._txt_copy_to(out_file)
+        if self.is_txt and out_file.is_txt \
+                and not (self.is_bin or out_file.is_bin):
+            out_file.flush()
+            copyfileobj(self.file, out_file.file, self.buffer_size)
         else:
-            self._csv_copy_to(out_file)
+            while buf := self.read_block():
+                out_file.write_buffer(buf)
+        out_file.flush()
 
-    def write_buffer(self,
-                     buffer: list[Union[int, float, str, CsvRow], ...]) -> None:
+    def close(self) -> None:
         """
-        Метод записи списка значений в файл
-        :param buffer: список значений
+        Запись буфера и закрытие файла
         """
-        for el in buffer:
-            self.write(el)
+        if self.file is not None and not self.file.closed:
+            self.flush()
+            self.file.close()
 
     def __repr__(self) -> str:
         return f"'{self.filename}'(mode: {self.mode}, is_temp: {self.is_temp})"
 
     def __del__(self) -> None:
-        self.file.close()
-        # print("123", self.is_txt)
-        if self.is_temp:
-            os.remove(self.path)
+        self.close()
+        if self.is_temp and not self.keep:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
         try:
             if not os.listdir(TEMP_DIR):
                 os.rmdir(TEMP_DIR)
@@ -280,6 +502,29 @@ class IO:
             pass
 
 
+def read_chunk(inp: IO, chunk_size: int,
+               chunk_memory: Optional[int] = None) -> list:
+    """
+    Считывание куска для внутренней сортировки: chunk_size записей или,
+    при chunk_memory, блоки файла, пока записи вместе с парами ключей
+    не займут chunk_memory байт. Размер замеряется у каждого куска,
+    поэтому следует за длиной записей в любом месте любого файла
+    :param inp: файл в режиме чтения
+    :param chunk_size: кол-во записей в куске
+    :param chunk_memory: память под записи куска в байтах
+    :return: список записей, пустой в конце файла
+    """
+    if chunk_memory is None:
+        return inp.read_buffer(chunk_size)
+    chunk = []
+    size = 0
+    while size < chunk_memory and (block := inp.read_block()):
+        chunk.extend(block)
+        size += sum(map(size_func(block[0]), block)) + \
+            len(block) * HEAP_ENTRY_OVERHEAD
+    return chunk
+
+
 def generate_input(file_name="input.txt"):
     """
     Генерация случайного входного txt файла
@@ -315,7 +560,11 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
             type_data: Optional[str] = None,
             key: Optional[str] = None,
             delimiter: str = ",",
-            bsize=1000) -> None:
+            bsize=1000,
+            io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+            binary_runs: bool = True,
+            memory: Union[str, int, None] = None,
+            codec: Union[str, Codec, None] = None) -> dict[str, int]:
     """
     Функция сортировки, реализующая алгоритм
     сбалансированной двухпутевой сортировки слиянием
@@ -323,26 +572,53 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
     :param output: выходной файл
     :param reverse: флаг сортировки по невозрастанию
     :param type_data: тип считываемых данных
-    :param key: имя столбца по которому производим сортировку для csv
+    :param key: столбец или составной ключ вида "date,id:i:desc" для csv
     :param delimiter: разделитель между столбцами для csv
     :param bsize: размер буфера, для внутренней сортировки
+    :param io_buffer_size: размер блока чтения и записи файлов в байтах
+    :param binary_runs: флаг хранения лент в двоичном формате,
+    иначе ленты пишутся в формате входных файлов
+    :param memory: бюджет памяти (байты или строка вида "512M"),
+    если указан - bsize не используется: кусок набирается, пока его записи
+    не займут свою долю бюджета, а блоки файлов уменьшаются под бюджет
+    :param codec: кодек сжатия двоичных лент ("zlib", "lzma:6", экземпляр Codec)
+    :return: статистика сортировки: кол-во начальных серий, проходов слияния,
+    байт записано во временные ленты и пиковое потребление памяти
     """
     if output == "":
         output = None
 
+    codec = get_codec(codec)
+    if codec is not None and not binary_runs:
+        raise ValueError("compression requires binary runs")
+    stats = {"runs": 0, "passes": 0, "bytes_spilled": 0}
+    chunk_memory = None
+    if memory is not None:
+        memory = parse_size(memory)
+        # вход и четыре ленты держат по блоку сырых байт и разобранных
+        # значений, это не больше половины бюджета
+        io_buffer_size = max(MIN_BUFFER_SIZE,
+                             min(io_buffer_size, memory // (2 * 2 * 5)))
+        # сортировка слиянием держит в памяти кусок, пары с ключами
+        # и копии половин
+        chunk_memory = max(1, (memory - 2 * 5 * io_buffer_size)
+                           // MERGE_SORT_COPIES)
     input_files = []
     if not isinstance(src, str):
         for file in src:
-            input_files.append(IO(file, "r", type_data, delimiter=delimiter))
+            input_files.append(IO(file, "r", type_data, delimiter=delimiter,
+                                  key_val=key, buffer_size=io_buffer_size))
     else:
-        input_files.append(IO(src, "r", type_data, delimiter=delimiter))
+        input_files.append(IO(src, "r", type_data, delimiter=delimiter,
+                              key_val=key, buffer_size=io_buffer_size))
 
     header = None
     if not input_files[0].is_txt:
         header = input_files[0].header
         if key is None:
             key = header[0]
-    file_ext = "txt" if input_files[0].is_txt else "csv"
+    file_ext = "bin" if binary_runs else \
+        ("txt" if input_files[0].is_txt else "csv")
 
     def external_sort(inp: IO, file_num: int = 1):
         """
@@ -356,43 +632,87 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
 
         is_txt = inp.is_txt
         tape1 = IO(f"line1_{file_num}.{file_ext}", "w", type_data,
-                   is_temp=True, header=header, key_val=key, delimiter=delimiter)
+                   is_temp=True, header=header, key_val=key, delimiter=delimiter,
+                   buffer_size=io_buffer_size, stats=stats, codec=codec)
         tape2 = IO(f"line2_{file_num}.{file_ext}", "w", type_data,
-                   is_temp=True, header=header, key_val=key, delimiter=delimiter)
+                   is_temp=True, header=header, key_val=key, delimiter=delimiter,
+                   buffer_size=io_buffer_size, stats=stats, codec=codec)
         tape3 = IO(f"line3_{file_num}.{file_ext}", "w", type_data,
-                   is_temp=True, header=header, key_val=key, delimiter=delimiter)
+                   is_temp=True, header=header, key_val=key, delimiter=delimiter,
+                   buffer_size=io_buffer_size, stats=stats, codec=codec)
         tape4 = IO(f"line4_{file_num}.{file_ext}", "w", type_data,
-                   is_temp=True, header=header, key_val=key, delimiter=delimiter)
+                   is_temp=True, header=header, key_val=key, delimiter=delimiter,
+                   buffer_size=io_buffer_size, stats=stats, codec=codec)
         pass_num = 1
+        keyf, rev = key_func(None if is_txt else key, reverse)
+        if keyf is None:
+            def keyf(val):
+                return val
 
         def cmp(val1, val2):
-            if is_txt:
-                return val1 > val2 if reverse else val1 < val2
-            return val1[key] > val2[key] if reverse else val1[key] < val2[key]
+            return keyf(val1) > keyf(val2) if rev else keyf(val1) < keyf(val2)
+
+        def cmp_keyed(pair1, pair2):
+            return pair1[0] > pair2[0] if rev else pair1[0] < pair2[0]
+
+        # длины серий на каждой ленте в порядке записи
+        run_lens = {tape: [] for tape in (tape1, tape2, tape3, tape4)}
 
         def split():
             """
             Функция предварительного разделения содержимого
-            исходной ленты на две другие ленты, сортирующая серии длины bsize
+            исходной ленты на две другие ленты, сортирующая серии
+            из считанных кусков
             """
             is_tape1 = True
 
-            while True:
-                buf = inp.read_buffer(bsize)
-                merge_sort(buf, cmp=cmp)
-                if is_tape1:
-                    tape1.write_buffer(buf)
-                else:
-                    tape2.write_buffer(buf)
+            while buf := read_chunk(inp, bsize, chunk_memory):
+                keyed = merge_sort(list(zip(map(keyf, buf), buf)),
+                                   cmp=cmp_keyed)
+                buf = [val for _, val in keyed]
+                stats["runs"] += 1
+                tape = tape1 if is_tape1 else tape2
+                tape.write_buffer(buf)
+                run_lens[tape].append(len(buf))
 
                 is_tape1 = not is_tape1
 
-                if len(buf) != bsize:
-                    break
+        def merge_pair(read1: IO, len1: int, read2: IO, len2: int,
+                       write_file: IO) -> None:
+            """
+            Функция слияния серии длины len1 с серией длины len2
+            :param read1: лента первой серии
+            :param len1: длина первой серии
+            :param read2: лента второй серии
+            :param len2: длина второй серии
+            :param write_file: лента, в которую пишется слитая серия
+            """
+            seq1_elem = read1.read() if len1 else None
+            seq2_elem = read2.read() if len2 else None
+            while len1 and len2:
+                # при равенстве первой идет запись первой серии,
+                # которая была раньше во входном файле
+                if cmp(seq2_elem, seq1_elem):
+                    write_file.write(seq2_elem)
+                    len2 -= 1
+                    if len2:
+                        seq2_elem = read2.read()
+                else:
+                    write_file.write(seq1_elem)
+                    len1 -= 1
+                    if len1:
+                        seq1_elem = read1.read()
+
+            for read, elem, rest in ((read1, seq1_elem, len1),
+                                     (read2, seq2_elem, len2)):
+                if rest:
+                    write_file.write(elem)
+                for _ in range(rest - 1):
+                    write_file.write(read.read())
 
         def merge() -> Union[bool, IO]:
             """
-            Функция слияния из двух лент, в другие две поочередно
+            Функция слияния серий из двух лент попарно, в другие две поочередно
             :return: False, если сортировка не закончена,
             файл, с отсортированным значениями в противном случае
             """
@@ -411,71 +731,15 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
                 read1, read2 = tape3, tape4
                 write1, write2 = tape1, tape2
 
-            is_write1 = True
-            writes_count = 0
-            while True:
-
-                write_file = write1 if is_write1 else write2
-
-                seq1_len = 2 ** (pass_num - 1) * bsize
-                seq2_len = 2 ** (pass_num - 1) * bsize
-
-                i = j = 0
-
-                is_seq1_read, is_seq2_read = True, True
-                seq1_elem = seq2_elem = None
-
-                while i < seq1_len and j < seq2_len:
-
-                    if seq1_elem == EOF or seq2_elem == EOF:
-                        break
-
-                    if is_seq1_read:
-                        seq1_elem = read1.read()
-                    if seq1_elem == EOF:
-                        break
-
-                    if is_seq2_read:
-                        seq2_elem = read2.read()
-                    if seq2_elem == EOF:
-                        break
-
-                    if cmp(seq1_elem, seq2_elem):
-                        write_file.write(seq1_elem)
-                        i += 1
-                        is_seq1_read, is_seq2_read = True, False
-
-                    else:
-                        write_file.write(seq2_elem)
-                        j += 1
-                        is_seq1_read, is_seq2_read = False, True
-
-                fix_i, fix_j = i, j
-                for i in range(seq1_len - fix_i):
-                    if seq1_elem == EOF or seq1_elem is None:
-                        # print(seq1_elem, "241 EOF 1")
-                        break
-
-                    write_file.write(seq1_elem)
-                    if i != seq1_len - fix_i - 1:
-                        seq1_elem = read1.read()
-
-                for j in range(seq2_len - fix_j):
-                    if seq2_elem == EOF or seq2_elem is None:
-                        break
-                    write_file.write(seq2_elem)
-                    if j != seq2_len - fix_j - 1:
-                        seq2_elem = read2.read()
-
-                is_write1 = not is_write1
-                if seq1_elem == EOF or seq2_elem == EOF:
-                    break
-
-                writes_count += 1
-            if read1.is_empty() is not read2.is_empty():
-                if not read1.is_empty():
-                    return read1
-                return read2
+            lens1, lens2 = run_lens[read1], run_lens[read2]
+            if not lens2:
+                return read1
+            run_lens[write1], run_lens[write2] = [], []
+            for run_no, len1 in enumerate(lens1):
+                len2 = lens2[run_no] if run_no < len(lens2) else 0
+                write_file = write1 if run_no % 2 == 0 else write2
+                merge_pair(read1, len1, read2, len2, write_file)
+                run_lens[write_file].append(len1 + len2)
             return False
 
         split()
@@ -485,6 +749,8 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
             if result_file:
                 break
             pass_num += 1
+        # последний вызов merge только находит ленту с единственной серией
+        stats["passes"] += pass_num - 1
         return result_file
 
     res_files = []
@@ -495,56 +761,27 @@ def my_sort(src: Union[Iterable, str] = "input.txt",
         for n, file in enumerate(res_files):
             out = input_files[n]
             file.copy_to(out)
+            stats["passes"] += 1
 
     else:
-        out = IO(output, "w", header=header, delimiter=delimiter)
+        out = IO(output, "w", header=header, delimiter=delimiter,
+                 buffer_size=io_buffer_size)
         merge_to_one(res_files, out, reverse)
+        stats["passes"] += 1
+    stats["peak_rss"] = peak_rss()
+    return stats
 
 
 def merge_to_one(src: list[IO, ...], out: IO, reverse=False) -> None:
     """
-    Функция слияния всех файлов в один
+    Функция слияния всех файлов в один при помощи кучи
     :param src: исходные файлы
     :param out: выходной файл
     :param reverse: флаг сортировки по невозразстанию
     """
-    is_read_dict = {i: {"value": file.read(), "is_read": False}
-                    for i, file in enumerate(src)}
-
-    def find_val():
-        """
-        Функция поиска минимального или максимального значения
-        среди словаря элементов каждого файла
-        :return: подходящий эелмент
-        """
-        func = max if reverse else min
-        if src[0].is_txt:
-            return func(is_read_dict.items(),
-                        key=lambda x: x[1]["value"])
-        else:
-            return func(is_read_dict.items(),
-                        key=lambda x: x[1]["value"][src[0].key])
-
-    def dict_upd():
-        """
-        Функция обновления словаря текущих значений
-        """
-        to_del = []
-        for k, v in is_read_dict.items():
-            if v["is_read"] is True:
-                v["value"] = src[k].read()
-                v["is_read"] = False
-
-            if v["value"] == EOF:
-                to_del.append(k)
-        for k in to_del:
-            del is_read_dict[k]
-
-    while is_read_dict:
-        need_val = find_val()
-        out.write(need_val[1]["value"])
-        is_read_dict[need_val[0]]["is_read"] = True
-        dict_upd()
+    from external_two_way_sort.merge import merge_sorted_files
+    merge_sorted_files(src, out, None if src[0].is_txt else src[0].key,
+                       reverse, prefetch=False)
 
 
 def main():
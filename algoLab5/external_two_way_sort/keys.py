@@ -0,0 +1,117 @@
+"""
+Составные ключи сортировки: несколько столбцов csv
+со своим типом и направлением у каждого.
+Формат описания ключа: "date,id:i:desc" - столбцы через запятую,
+после двоеточий необязательные тип (i, s, f) и направление (asc, desc)
+"""
+from operator import itemgetter
+from typing import NamedTuple, Optional, Callable
+
+TYPES = {"i": int, "s": str, "f": float}
+DIRECTIONS = {"asc": False, "desc": True}
+
+
+class KeyColumn(NamedTuple):
+    """
+    Столбец составного ключа
+    """
+    name: str
+    data_type: str
+    reverse: bool
+
+
+class _Desc:
+    """
+    Обертка над ключом, инвертирующая сравнение, для сортировки по невозрастанию
+    """
+    __slots__ = ("val",)
+
+    def __init__(self, val) -> None:
+        self.val = val
+
+    def __lt__(self, other: "_Desc") -> bool:
+        return other.val < self.val
+
+    def __eq__(self, other: "_Desc") -> bool:
+        return self.val == other.val
+
+
+def parse_key(spec: str, data_type: str = "s") -> list[KeyColumn]:
+    """
+    Разбор описания составного ключа
+    :param spec: описание ключа, например "date,id:i:desc"
+    :param data_type: тип столбцов, для которых он не указан
+    :return: список столбцов ключа
+    """
+    columns = []
+    for part in spec.split(","):
+        name, *opts = part.strip().split(":")
+        col_type, reverse = data_type, False
+        for opt in filter(None, opts):
+            if opt in TYPES:
+                col_type = opt
+            elif opt in DIRECTIONS:
+                reverse = DIRECTIONS[opt]
+            else:
+                raise ValueError(f"unknown key option {opt!r} in {spec!r}")
+        if not name:
+            raise ValueError(f"empty column name in key {spec!r}")
+        columns.append(KeyColumn(name, col_type, reverse))
+    return columns
+
+
+def key_converters(spec: str, data_type: str = "s") -> list[tuple[str, Callable]]:
+    """
+    Функции приведения типов столбцов ключа
+    :param spec: описание ключа
+    :param data_type: тип столбцов, для которых он не указан
+    :return: список пар (столбец, функция приведения)
+    """
+    return [(col.name, TYPES[col.data_type]) for col in parse_key(spec, data_type)]
+
+
+def key_func(spec: Optional[str], reverse: bool = False) \
+        -> tuple[Optional[Callable], bool]:
+    """
+    Функция получения ключа записи, вычисляемого один раз на запись.
+    Если все столбцы в одном направлении - ключ это кортеж значений,
+    а направление передается флагом reverse сортировки или слияния
+    :param spec: описание ключа или None для txt
+    :param reverse: флаг сортировки всего ключа по невозрастанию
+    :return: функция от записи (None - сама запись) и флаг reverse
+    """
+    if not spec:
+        return None, reverse
+    columns = parse_key(spec)
+    directions = {col.reverse for col in columns}
+    if len(directions) == 1:
+        return itemgetter(*(col.name for col in columns)), \
+            reverse != directions.pop()
+    desc = [(col.name, col.reverse != reverse) for col in columns]
+
+    def composite(row: dict) -> tuple:
+        """
+        Ключ со смешанными направлениями столбцов
+        :param row: запись csv
+        :return: кортеж, сравниваемый по возрастанию
+        """
+        return tuple(_Desc(row[name]) if rev else row[name]
+                     for name, rev in desc)
+
+    return composite, False
+
+
+def ascending_key(spec: Optional[str], reverse: bool = False) -> Callable:
+    """
+    Функция получения ключа, всегда сравниваемого по возрастанию,
+    для кучи при формировании серий
+    :param spec: описание ключа или None для txt
+    :param reverse: флаг сортировки всего ключа по невозрастанию
+    :return: функция от записи
+    """
+    keyf, rev = key_func(spec, reverse)
+    if keyf is None:
+        return _Desc if rev else (lambda rec: rec)
+    if rev:
+        return lambda rec: _Desc(keyf(rec))
+    return keyf
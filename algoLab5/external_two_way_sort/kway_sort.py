@@ -0,0 +1,448 @@
+"""
+Внешняя сортировка k-путевым слиянием серий,
+полученных методом выбора с замещением
+"""
+import heapq
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from functools import partial
+from itertools import count, islice
+from typing import Optional, Union, Iterable, Callable
+
+from external_two_way_sort.checkpoint import Manifest
+from external_two_way_sort.compression import Codec, get_codec
+from external_two_way_sort.external_sort import IO, DEFAULT_BUFFER_SIZE, \
+    MIN_BUFFER_SIZE
+from external_two_way_sort.keys import ascending_key
+from external_two_way_sort.memory import HEAP_ENTRY_OVERHEAD, \
+    parse_size, peak_rss, record_size
+from external_two_way_sort.merge import WRITE_BATCH, iter_records, \
+    merge_sorted_files
+from external_two_way_sort.parallel import READ_AHEAD_DEPTH, parallel_runs
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESERVED_FDS = 16
+FALLBACK_FD_LIMIT = 512
+FALLBACK_MEMORY = 1 << 30
+MIN_RUN_BUFFER = 16 << 10
+_DONE = object()
+
+
+def available_memory() -> int:
+    """
+    Оценка свободной оперативной памяти
+    :return: кол-во байт
+    """
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return FALLBACK_MEMORY
+
+
+def choose_fan_in(io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+                  memory: Optional[int] = None) -> int:
+    """
+    Выбор кол-ва серий, сливаемых за один проход,
+    исходя из лимита открытых файлов и доступной памяти
+    :param io_buffer_size: размер блока чтения одной серии в байтах
+    :param memory: бюджет памяти в байтах, если указан - блок серии
+    уменьшается под бюджет (см. run_buffer_size) до MIN_RUN_BUFFER,
+    по умолчанию - четверть свободной памяти при блоке io_buffer_size
+    :return: кол-во серий
+    """
+    fd_limit = FALLBACK_FD_LIMIT
+    if resource is not None:
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if soft != resource.RLIM_INFINITY:
+            fd_limit = soft
+        else:
+            fd_limit = 1 << 16
+    if memory is None:
+        by_mem = available_memory() // 4 // (2 * io_buffer_size)
+    else:
+        # блок сырых байт и разобранные значения на каждую серию и на выход
+        by_mem = memory // (2 * min(io_buffer_size, MIN_RUN_BUFFER)) - 1
+    by_fd = fd_limit - RESERVED_FDS
+    return max(2, min(by_fd, by_mem))
+
+
+def run_buffer_size(fan_in: int, io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+                    memory: Optional[int] = None,
+                    prefetch: bool = False) -> int:
+    """
+    Размер блока чтения и записи серий: при бюджете памяти его делят
+    fan_in сливаемых серий и выходная серия, иначе - io_buffer_size
+    :param fan_in: сколько серий сливается за проход
+    :param io_buffer_size: наибольший размер блока в байтах
+    :param memory: бюджет памяти в байтах
+    :param prefetch: флаг упреждающего чтения, при котором у каждой
+    серии в очереди ждут еще READ_AHEAD_DEPTH блоков
+    :return: размер блока в байтах
+    """
+    if memory is None:
+        return io_buffer_size
+    blocks = 2 + READ_AHEAD_DEPTH if prefetch else 2
+    return max(MIN_BUFFER_SIZE,
+               min(io_buffer_size, memory // (blocks * (fan_in + 1))))
+
+
+def heap_memory(memory: Optional[int], io_buffer_size: int) -> Optional[int]:
+    """
+    Память под кучу выбора с замещением: бюджет без входного блока
+    и блока серии, каждый из которых - сырые байты и разобранные значения
+    :param memory: бюджет памяти в байтах
+    :param io_buffer_size: размер блока чтения и записи в байтах
+    :return: кол-во байт или None, если бюджет не задан
+    """
+    if memory is None:
+        return None
+    return max(io_buffer_size, memory - 4 * io_buffer_size)
+
+
+def replacement_selection(records: Iterable, make_run: Callable[[], IO],
+                          heap_size: int, key: Optional[str] = None,
+                          reverse: bool = False,
+                          memory: Optional[int] = None) -> list[IO]:
+    """
+    Формирование начальных серий методом выбора с замещением.
+    На случайных данных серии получаются в среднем вдвое длиннее heap_size
+    :param records: записи входного файла
+    :param make_run: функция создания новой временной серии
+    :param heap_size: сколько записей одновременно держится в памяти
+    :param key: ключ csv или None для txt
+    :param reverse: флаг сортировки по невозрастанию
+    :param memory: бюджет памяти кучи в байтах, если указан - heap_size
+    не используется, куча заполняется до бюджета, а ее размер
+    подстраивается под размер каждой пришедшей и ушедшей записи
+    :return: список закрытых серий
+    """
+    keyf = ascending_key(key, reverse)
+    records = iter(records)
+    seq = count()
+    # элемент кучи: номер серии, ключ, номер записи, запись
+    # и ее размер в памяти (0, если бюджет не задан)
+    used = 0
+    if memory is None:
+        heap = [(0, keyf(rec), next(seq), rec, 0)
+                for rec in islice(records, heap_size)]
+    else:
+        heap = []
+        for rec in records:
+            size = record_size(rec)
+            heap.append((0, keyf(rec), next(seq), rec, size))
+            used += size + HEAP_ENTRY_OVERHEAD
+            if used >= memory:
+                break
+    heapq.heapify(heap)
+
+    runs = []
+    out = None
+    out_buf = []
+    out_size = 0
+    cur_run = -1
+    while heap:
+        run_no, k, _, rec, size = heap[0]
+        if run_no != cur_run:
+            if out is not None:
+                out.write_buffer(out_buf, out_size or None)
+                out.close()
+                out_buf.clear()
+                out_size = 0
+            out = make_run()
+            runs.append(out)
+            cur_run = run_no
+        out_buf.append(rec)
+        out_size += size
+        used -= size + HEAP_ENTRY_OVERHEAD
+        # пачка длинных записей пишется, не дожидаясь WRITE_BATCH
+        if len(out_buf) >= WRITE_BATCH or out_size >= out.buffer_size:
+            out.write_buffer(out_buf, out_size or None)
+            out_buf.clear()
+            out_size = 0
+        if memory is not None and used >= memory:
+            # пришли записи длиннее прежних - куча сжимается
+            heapq.heappop(heap)
+            continue
+
+        nxt = next(records, _DONE)
+        if nxt is _DONE:
+            heapq.heappop(heap)
+            continue
+        n_k = keyf(nxt)
+        size = 0 if memory is None else record_size(nxt)
+        heapq.heapreplace(heap, (run_no + 1 if n_k < k else run_no,
+                                 n_k, next(seq), nxt, size))
+        if memory is None:
+            continue
+        used += size + HEAP_ENTRY_OVERHEAD
+        # записи короче прежних - в освободившееся место идут следующие
+        while used < memory and (nxt := next(records, _DONE)) is not _DONE:
+            n_k = keyf(nxt)
+            size = record_size(nxt)
+            heapq.heappush(heap, (run_no + 1 if n_k < k else run_no,
+                                  n_k, next(seq), nxt, size))
+            used += size + HEAP_ENTRY_OVERHEAD
+    if out is not None:
+        out.write_buffer(out_buf, out_size or None)
+        out.close()
+    return runs
+
+
+def merge_runs(runs: list[IO], out: IO, key: Optional[str] = None,
+               reverse: bool = False, prefetch: bool = False) -> None:
+    """
+    Слияние серий в один файл при помощи кучи
+    :param runs: отсортированные серии
+    :param out: файл в режиме записи
+    :param key: ключ csv или None для txt
+    :param reverse: флаг сортировки по невозрастанию
+    :param prefetch: флаг упреждающего чтения серий в отдельных потоках
+    """
+    for run in runs:
+        run.change_mode("r")
+    merge_sorted_files(runs, out, key, reverse, prefetch=prefetch)
+    for run in runs:
+        run.close()
+
+
+def reduce_runs(runs: list[IO], make_run: Callable[[], IO], fan_in: int,
+                key: Optional[str] = None, reverse: bool = False,
+                prefetch: bool = False,
+                on_pass: Optional[Callable[[list[IO]], None]] = None) \
+        -> tuple[list[IO], int]:
+    """
+    Промежуточные проходы слияния, пока серий больше fan_in
+    :param runs: серии
+    :param make_run: функция создания новой временной серии
+    :param fan_in: сколько серий сливается за проход
+    :param key: ключ csv или None для txt
+    :param reverse: флаг сортировки по невозрастанию
+    :param prefetch: флаг упреждающего чтения серий в отдельных потоках
+    :param on_pass: функция, вызываемая с сериями после каждого прохода
+    :return: не более fan_in серий и кол-во сделанных проходов
+    """
+    passes = 0
+    while len(runs) > fan_in:
+        merged_runs = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i:i + fan_in]
+            if len(group) == 1:
+                merged_runs.append(group[0])
+                continue
+            merged = make_run()
+            merge_runs(group, merged, key, reverse, prefetch)
+            merged.close()
+            merged_runs.append(merged)
+        runs = merged_runs
+        passes += 1
+        if on_pass is not None:
+            on_pass(runs)
+    return runs, passes
+
+
+def kway_sort(src: Union[Iterable, str] = "input.txt",
+              output: Optional[str] = None,
+              reverse: bool = False,
+              type_data: Optional[str] = None,
+              key: Optional[str] = None,
+              delimiter: str = ",",
+              bsize: int = 1000,
+              io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+              fan_in: Optional[int] = None,
+              workers: int = 1,
+              binary_runs: bool = True,
+              memory: Union[str, int, None] = None,
+              codec: Union[str, Codec, None] = None,
+              resume: bool = False) -> dict[str, int]:
+    """
+    Функция внешней сортировки: серии формируются выбором с замещением,
+    затем сливаются кучей по fan_in серий за проход
+    :param src: исходный файл(ы)
+    :param output: выходной файл, если не указан - каждый файл сортируется на месте
+    :param reverse: флаг сортировки по невозрастанию
+    :param type_data: тип считываемых данных
+    :param key: столбец или составной ключ вида "date,id:i:desc" для csv
+    :param delimiter: разделитель между столбцами для csv
+    :param bsize: сколько записей держится в куче при формировании серий
+    :param io_buffer_size: размер блока чтения и записи файлов в байтах
+    :param fan_in: сколько серий сливается за проход,
+    по умолчанию выбирается по лимиту файлов и памяти
+    :param workers: кол-во процессов для сортировки серий, при workers > 1
+    серии длины bsize сортируются параллельно, входные файлы читаются
+    одновременно, а слияние читает серии с упреждением
+    :param binary_runs: флаг хранения серий в двоичном формате,
+    иначе серии пишутся в формате входных файлов
+    :param memory: бюджет памяти (байты или строка вида "512M"), если указан -
+    размер кучи подстраивается под размер записей, а fan_in, размер блоков
+    серий и параллельно сортируемых кусков вычисляются из бюджета
+    :param codec: кодек сжатия двоичных серий ("zlib", "lzma:6", экземпляр Codec)
+    :param resume: флаг возобновляемой сортировки: готовые серии и проходы
+    записываются в манифест в TEMP_DIR и не удаляются при падении,
+    повторный запуск с теми же параметрами продолжает с последней фазы
+    :return: статистика сортировки: кол-во начальных серий, проходов слияния,
+    байт записано во временные серии, пиковое потребление памяти
+    и флаг того, что сортировка была продолжена
+    """
+    if output == "":
+        output = None
+    type_data = type_data or "s"
+    codec = get_codec(codec)
+    if codec is not None and not binary_runs:
+        raise ValueError("compression requires binary runs")
+    memory = None if memory is None else parse_size(memory)
+    fan_in = fan_in or choose_fan_in(io_buffer_size, memory)
+    io_buffer_size = run_buffer_size(fan_in, io_buffer_size, memory,
+                                     workers > 1)
+    names = [src] if isinstance(src, str) else list(src)
+    input_files = [IO(name, "r", type_data, delimiter=delimiter, key_val=key,
+                      buffer_size=io_buffer_size) for name in names]
+    chunk_memory = None
+    if memory is not None and workers > 1:
+        # в полете до 2 * workers кусков на каждый одновременно читаемый файл
+        # плюс читаемый и записываемый куски, читается не больше workers файлов
+        chunk_memory = memory // (min(workers, len(input_files)) *
+                                  (2 * workers + 2))
+
+    header = input_files[0].header
+    key_arg = key
+    key = None if input_files[0].is_txt else input_files[0].key
+    file_ext = "bin" if binary_runs else \
+        ("txt" if input_files[0].is_txt else "csv")
+    stats = {"runs": 0, "passes": 0, "bytes_spilled": 0, "resumed": False}
+    run_num = count()
+
+    manifest = None
+    if resume:
+        manifest = Manifest({"src": list(map(os.path.abspath, names)),
+                             "output": output and os.path.abspath(output),
+                             "reverse": reverse, "type_data": type_data,
+                             "key": key_arg, "delimiter": delimiter,
+                             "file_ext": file_ext, "codec": repr(codec)},
+                            names)
+        manifest.set_format(header, key)
+        header, key = manifest.state["header"], manifest.state["key"]
+        stats["resumed"] = manifest.resumed
+
+    def make_run(run_stats: Optional[dict] = None) -> IO:
+        """
+        Создание новой временной серии
+        :param run_stats: словарь, в который считаются записанные байты,
+        по умолчанию - общая статистика сортировки
+        :return: файл серии в режиме записи
+        """
+        if manifest is None:
+            name = f"run_{next(run_num)}.{file_ext}"
+        else:
+            name = manifest.run_name(file_ext)
+        run = IO(name, "w", type_data, is_temp=True, header=header,
+                 key_val=key, delimiter=delimiter, buffer_size=io_buffer_size,
+                 stats=stats if run_stats is None else run_stats, codec=codec)
+        run.keep = manifest is not None
+        return run
+
+    def open_runs(run_names: list[str]) -> list[IO]:
+        """
+        Открытие серий, сохраненных в манифесте
+        :param run_names: имена серий относительно TEMP_DIR
+        :return: серии в режиме чтения
+        """
+        runs = []
+        for name in run_names:
+            run = IO(name, "r", type_data, is_temp=True, header=header,
+                     key_val=key, delimiter=delimiter,
+                     buffer_size=io_buffer_size, stats=stats, codec=codec)
+            run.keep = True
+            runs.append(run)
+        return runs
+
+    def merge_passes(runs: list[IO],
+                     on_pass: Optional[Callable[[list[IO]], None]] = None) \
+            -> list[IO]:
+        """
+        Промежуточные проходы слияния, пока серий больше fan_in
+        :param runs: серии
+        :param on_pass: функция записи серий в манифест после прохода
+        :return: не более fan_in серий
+        """
+        runs, passes = reduce_runs(runs, make_run, fan_in, key, reverse,
+                                   prefetch, on_pass)
+        stats["passes"] += passes
+        return runs
+
+    def generate(inp: IO, ind: int,
+                 pool: Optional[Executor] = None) -> tuple[list[IO], int]:
+        """
+        Формирование начальных серий одного файла. Файлы читаются
+        в нескольких потоках, поэтому записанные байты считаются отдельно
+        для каждого файла и складываются в stats в основном потоке
+        :param inp: входной файл
+        :param ind: номер входного файла
+        :param pool: пул процессов для параллельной сортировки серий
+        :return: список серий и кол-во записанных в них байт
+        """
+        if manifest is not None:
+            if manifest.is_done(ind) or manifest.merged_runs() is not None:
+                return [], 0
+            if (run_names := manifest.file_runs(ind)) is not None:
+                return open_runs(run_names), 0
+        file_stats = {"bytes_spilled": 0}
+        new_run = partial(make_run, file_stats)
+        if pool is None:
+            runs = replacement_selection(iter_records(inp), new_run, bsize,
+                                         key, reverse,
+                                         heap_memory(memory, io_buffer_size))
+        else:
+            runs = parallel_runs(inp, new_run, pool, bsize, key, reverse,
+                                 depth=2 * workers, chunk_memory=chunk_memory)
+        if output is not None:
+            inp.close()
+        if manifest is not None:
+            manifest.set_file_runs(ind, runs)
+        return runs, file_stats["bytes_spilled"]
+
+    indices = range(len(input_files))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool, \
+                ThreadPoolExecutor(min(workers, len(input_files))) as readers:
+            runs_per_file = list(readers.map(partial(generate, pool=pool),
+                                             input_files, indices))
+    else:
+        runs_per_file = list(map(generate, input_files, indices))
+    prefetch = workers > 1
+
+    all_runs = []
+    for ind, inp, (runs, spilled) in zip(indices, input_files, runs_per_file):
+        stats["runs"] += len(runs)
+        stats["bytes_spilled"] += spilled
+        if output is not None:
+            all_runs.extend(runs)
+        elif runs:
+            runs = merge_passes(runs, manifest and partial(
+                manifest.set_file_runs, ind))
+            inp.change_mode("w")
+            merge_runs(runs, inp, key, reverse, prefetch)
+            inp.close()
+            stats["passes"] += 1
+            if manifest is not None:
+                manifest.set_done(ind)
+
+    if output is not None:
+        if manifest is not None and manifest.merged_runs() is not None:
+            all_runs = open_runs(manifest.merged_runs())
+        out = IO(output, "w", type_data, header=header, delimiter=delimiter,
+                 buffer_size=io_buffer_size)
+        if all_runs:
+            merge_runs(merge_passes(all_runs, manifest and
+                                    manifest.set_merged_runs),
+                       out, key, reverse, prefetch)
+            stats["passes"] += 1
+        out.close()
+    if manifest is not None:
+        manifest.finish()
+    stats["peak_rss"] = peak_rss()
+    return stats
@@ -0,0 +1,85 @@
+"""
+Бюджет памяти сортировки: разбор размера, оценка памяти под записи
+и пиковое потребление памяти процессом
+"""
+import sys
+from typing import Union, Callable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+UNITS = {"": 1, "B": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+# кортеж кучи, номер последовательности, размер записи
+# и ссылка из списка на каждую запись
+HEAP_ENTRY_OVERHEAD = sys.getsizeof((0, 0, 0, 0, 0)) + \
+    2 * sys.getsizeof(1 << 40) + 8
+
+
+def parse_size(text: Union[str, int]) -> int:
+    """
+    Разбор размера вида 512M, 2G, 1.5g или числа байт
+    :param text: строка размера
+    :return: кол-во байт
+    """
+    if isinstance(text, int):
+        return text
+    text = text.strip().upper().removesuffix("IB").removesuffix("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    number = text[:len(text) - len(unit)]
+    try:
+        size = int(float(number) * UNITS[unit])
+    except ValueError:
+        raise ValueError(f"bad memory size {text!r}") from None
+    if size <= 0:
+        raise ValueError(f"memory size must be positive: {text!r}")
+    return size
+
+
+def format_size(size: int) -> str:
+    """
+    Форматирование кол-ва байт в читаемый вид
+    :param size: кол-во байт
+    :return: строка вида 12.3M
+    """
+    for unit in "BKMG":
+        if size < 1024:
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+    return f"{size:.1f}T"
+
+
+def record_size(rec) -> int:
+    """
+    Оценка памяти, занимаемой записью вместе с ее значениями
+    (ключи словаря общие для всех строк csv и не учитываются)
+    :param rec: значение txt, строка csv или кортеж
+    :return: кол-во байт
+    """
+    if isinstance(rec, dict):
+        return sys.getsizeof(rec) + sum(map(sys.getsizeof, rec.values()))
+    if isinstance(rec, tuple):
+        return sys.getsizeof(rec) + sum(map(record_size, rec))
+    return sys.getsizeof(rec)
+
+
+def size_func(rec) -> Callable:
+    """
+    Выбор функции оценки памяти для записей того же типа, что и rec:
+    числа и строки оцениваются sys.getsizeof без лишних проверок
+    :param rec: значение txt, строка csv или кортеж
+    :return: функция от записи, возвращающая кол-во байт
+    """
+    return record_size if isinstance(rec, (dict, tuple)) else sys.getsizeof
+
+
+def peak_rss() -> int:
+    """
+    Пиковое потребление памяти текущим процессом
+    :return: кол-во байт или 0, если оценка недоступна
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
@@ -0,0 +1,75 @@
+"""
+Слияние нескольких отсортированных файлов в один при помощи кучи
+"""
+import heapq
+from typing import Union, Iterable, Iterator, Callable
+
+from external_two_way_sort.external_sort import IO, DEFAULT_BUFFER_SIZE
+from external_two_way_sort.keys import key_func
+from external_two_way_sort.parallel import read_ahead
+
+WRITE_BATCH = 4096
+
+def iter_records(file: IO) -> Iterator:
+    """
+    Генератор записей файла, считываемых блоками по buffer_size байт
+    :param file: файл в режиме чтения
+    :return: записи файла по одной
+    """
+    while buf := file.read_block():
+        yield from buf
+
+
+def merge_sorted_files(sources: Iterable[Union[IO, str]],
+                       out: Union[IO, str],
+                       key: Union[str, Callable, None] = None,
+                       reverse: bool = False,
+                       type_data: str = "s",
+                       delimiter: str = ",",
+                       prefetch: bool = True,
+                       buffer_size: int = DEFAULT_BUFFER_SIZE) -> int:
+    """
+    Слияние отсортированных файлов в один за O(log k) сравнений на запись.
+    Ключ вычисляется один раз на запись, источники читаются блоками
+    (при prefetch - с упреждением в отдельных потоках), выход буферизуется
+    файлом по размеру записей, а не по их кол-ву
+    :param sources: отсортированные файлы - открытые на чтение IO или пути
+    :param out: выходной файл - открытый на запись IO или путь
+    :param key: столбец или составной ключ вида "date,id:i:desc" для csv,
+    функция от записи или None (для csv по умолчанию - первый столбец)
+    :param reverse: флаг того, что источники отсортированы по невозрастанию
+    :param type_data: тип ключевого значения для файлов, заданных путями
+    :param delimiter: разделитель csv для файлов, заданных путями
+    :param prefetch: флаг упреждающего чтения источников в отдельных потоках
+    :param buffer_size: размер блока чтения и записи для файлов, заданных путями
+    :return: кол-во записанных записей
+    """
+    key_col = key if isinstance(key, str) and key else None
+    own = []
+    files = []
+    for src in sources:
+        if not isinstance(src, IO):
+            src = IO(src, "r", type_data, delimiter=delimiter,
+                     key_val=key_col, buffer_size=buffer_size)
+            own.append(src)
+        files.append(src)
+    if not files:
+        return 0
+
+    if isinstance(out, str):
+        out = IO(out, "w", type_data, header=files[0].header,
+                 delimiter=delimiter, buffer_size=buffer_size)
+        own.append(out)
+
+    if not callable(key):
+        key, reverse = key_func(
+            None if files[0].is_txt else key_col or files[0].key, reverse)
+
+    merged = heapq.merge(*map(read_ahead if prefetch else iter_records, files),
+                         key=key, reverse=reverse)
+    written = out.write_iter(merged)
+    out.flush()
+    for file in own:
+        file.close()
+    return written
+
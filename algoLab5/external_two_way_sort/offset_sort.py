@@ -0,0 +1,207 @@
+"""
+Сортировка широких csv в режиме "ключ + смещение строки":
+во временные серии попадают только ключи и смещения строк,
+полные строки собираются из исходных файлов после слияния
+"""
+import csv
+import heapq
+import os
+from itertools import count, islice
+from typing import Optional, Union, Iterable, Iterator, Callable
+
+from external_two_way_sort.compression import Codec, get_codec
+from external_two_way_sort.external_sort import IO, CSV_BATCH, \
+    DEFAULT_BUFFER_SIZE
+from external_two_way_sort.keys import TYPES, _Desc, parse_key
+from external_two_way_sort.kway_sort import choose_fan_in, heap_memory, \
+    replacement_selection, reduce_runs, run_buffer_size
+from external_two_way_sort.memory import parse_size, peak_rss
+from external_two_way_sort.merge import iter_records
+
+
+def iter_raw_records(path: str, buffer_size: int = DEFAULT_BUFFER_SIZE) \
+        -> Iterator[tuple[int, bytes]]:
+    """
+    Генератор сырых записей csv файла вместе с их смещениями,
+    запись может занимать несколько строк, если поле в кавычках содержит перевод строки
+    :param path: путь к файлу
+    :param buffer_size: размер блока чтения в байтах
+    :return: пары (смещение записи в байтах, байты записи)
+    """
+    with open(path, "rb", buffering=buffer_size) as file:
+        offset = 0
+        record = b""
+        for line in file:
+            record = record + line if record else line
+            if record.count(b'"') % 2:
+                continue
+            yield offset, record
+            offset += len(record)
+            record = b""
+        if record:
+            yield offset, record
+
+
+def key_extractor(header: list[str], key: str, type_data: str,
+                  reverse: bool) -> Callable[[list[str]], tuple]:
+    """
+    Функция получения ключа из разобранной строки csv,
+    ключ всегда сравнивается по возрастанию
+    :param header: заголовок csv
+    :param key: столбец или составной ключ вида "date,id:i:desc"
+    :param type_data: тип столбцов, для которых он не указан
+    :param reverse: флаг сортировки всего ключа по невозрастанию
+    :return: функция от списка значений строки
+    """
+    columns = [(header.index(col.name), TYPES[col.data_type],
+                col.reverse != reverse)
+               for col in parse_key(key, type_data)]
+
+    def extract(raw: list[str]) -> tuple:
+        """
+        Приведение типов столбцов ключа и инвертирование убывающих
+        :param raw: значения строки
+        :return: кортеж ключа
+        """
+        vals = []
+        for ind, descr, desc in columns:
+            val = descr(raw[ind])
+            if desc:
+                val = _Desc(val) if descr is str else -val
+            vals.append(val)
+        return tuple(vals)
+
+    return extract
+
+
+def iter_entries(paths: list[str], extract: Callable[[list[str]], tuple],
+                 delimiter: str, buffer_size: int) -> Iterator[tuple]:
+    """
+    Генератор записей индекса: ключ, номер файла, смещение и длина строки
+    :param paths: входные файлы
+    :param extract: функция получения ключа
+    :param delimiter: разделитель между столбцами
+    :param buffer_size: размер блока чтения в байтах
+    :return: кортежи (ключ, номер файла, смещение, длина)
+    """
+    for file_no, path in enumerate(paths):
+        records = iter_raw_records(path, buffer_size)
+        next(records, None)
+        while batch := list(islice(records, CSV_BATCH)):
+            texts = [rec.decode() for _, rec in batch]
+            for (offset, rec), raw in zip(batch, csv.reader(texts,
+                                                            delimiter=delimiter)):
+                if raw:
+                    yield extract(raw), file_no, offset, len(rec)
+
+
+def gather(entries: Iterable[tuple], paths: list[str], header: bytes,
+           output: str, buffer_size: int) -> None:
+    """
+    Сборка выходного файла из полных строк по отсортированному индексу
+    :param entries: отсортированные записи индекса
+    :param paths: входные файлы
+    :param header: байты строки заголовка
+    :param output: выходной файл
+    :param buffer_size: размер блока записи в байтах
+    """
+    sources = [open(path, "rb") for path in paths]
+    try:
+        with open(output, "wb", buffering=buffer_size) as out:
+            out.write(header if header.endswith(b"\n") else header + b"\r\n")
+            for _, file_no, offset, length in entries:
+                src = sources[file_no]
+                src.seek(offset)
+                rec = src.read(length)
+                out.write(rec if rec.endswith(b"\n") else rec + b"\r\n")
+    finally:
+        for src in sources:
+            src.close()
+
+
+def offset_sort(src: Union[Iterable, str] = "input.csv",
+                output: Optional[str] = None,
+                reverse: bool = False,
+                type_data: Optional[str] = None,
+                key: Optional[str] = None,
+                delimiter: str = ",",
+                bsize: int = 1000,
+                io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+                fan_in: Optional[int] = None,
+                memory: Union[str, int, None] = None,
+                codec: Union[str, Codec, None] = None) -> dict[str, int]:
+    """
+    Функция внешней сортировки csv, в которой сортируются только ключи
+    со смещениями строк, а сами строки копируются в выходной файл
+    без разбора за один проход по отсортированному индексу.
+    Уменьшает объем временных серий для широких строк
+    :param src: исходный файл(ы) csv
+    :param output: выходной файл, если не указан - каждый файл сортируется на месте
+    :param reverse: флаг сортировки по невозрастанию
+    :param type_data: тип столбцов ключа, для которых он не указан
+    :param key: столбец или составной ключ вида "date,id:i:desc",
+    по умолчанию - первый столбец
+    :param delimiter: разделитель между столбцами
+    :param bsize: сколько записей индекса держится в куче при формировании серий
+    :param io_buffer_size: размер блока чтения и записи файлов в байтах
+    :param fan_in: сколько серий сливается за проход,
+    по умолчанию выбирается по лимиту файлов и памяти
+    :param memory: бюджет памяти (байты или строка вида "512M"), если указан -
+    размер кучи индекса и fan_in вычисляются из бюджета
+    :param codec: кодек сжатия серий индекса ("zlib", "lzma:6", экземпляр Codec)
+    :return: статистика сортировки: кол-во начальных серий, проходов слияния,
+    байт записано во временные серии и пиковое потребление памяти
+    """
+    if output == "":
+        output = None
+    names = [src] if isinstance(src, str) else list(src)
+    if any(name.endswith(".txt") for name in names):
+        raise ValueError("offset mode supports only csv files")
+    if output is None:
+        stats = {"runs": 0, "passes": 0, "bytes_spilled": 0}
+        for name in names:
+            tmp = name + ".sorting"
+            res = offset_sort(name, tmp, reverse, type_data, key, delimiter,
+                              bsize, io_buffer_size, fan_in, memory, codec)
+            os.replace(tmp, name)
+            stats = {k: stats[k] + res[k] for k in stats}
+        stats["peak_rss"] = peak_rss()
+        return stats
+
+    type_data = type_data or "s"
+    codec = get_codec(codec)
+    memory = None if memory is None else parse_size(memory)
+    fan_in = fan_in or choose_fan_in(io_buffer_size, memory)
+    io_buffer_size = run_buffer_size(fan_in, io_buffer_size, memory)
+    header_raw = next(iter_raw_records(names[0], io_buffer_size), (0, b""))[1]
+    header = next(csv.reader([header_raw.decode()], delimiter=delimiter), [])
+    if not header:
+        open(output, "wb").close()
+        return {"runs": 0, "passes": 0, "bytes_spilled": 0,
+                "peak_rss": peak_rss()}
+    extract = key_extractor(header, key or header[0], type_data, reverse)
+    run_num = count()
+
+    def make_run() -> IO:
+        """
+        Создание новой временной серии индекса
+        :return: файл серии в режиме записи
+        """
+        return IO(f"offsets_{next(run_num)}.bin", "w", is_temp=True,
+                  buffer_size=io_buffer_size, stats=stats, codec=codec)
+
+    stats = {"runs": 0, "passes": 1, "bytes_spilled": 0}
+    runs = replacement_selection(
+        iter_entries(names, extract, delimiter, io_buffer_size),
+        make_run, bsize, memory=heap_memory(memory, io_buffer_size))
+    stats["runs"] = len(runs)
+    runs, passes = reduce_runs(runs, make_run, fan_in)
+    stats["passes"] += passes
+    for run in runs:
+        run.change_mode("r")
+    gather(heapq.merge(*map(iter_records, runs)), names, header_raw, output,
+           io_buffer_size)
+    for run in runs:
+        run.close()
+    stats["peak_rss"] = peak_rss()
+    return stats
@@ -0,0 +1,133 @@
+"""
+Параллельное формирование серий в пуле процессов
+и упреждающее чтение серий при слиянии
+"""
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional, Callable, Iterator
+
+from external_two_way_sort.external_sort import IO, read_chunk
+from external_two_way_sort.keys import key_func
+
+READ_AHEAD_DEPTH = 4
+_STOP = object()
+
+
+def sort_chunk(chunk: list, key: Optional[str], reverse: bool) -> list:
+    """
+    Сортировка куска данных в процессе-воркере
+    :param chunk: список записей
+    :param key: ключ csv или None для txt
+    :param reverse: флаг сортировки по невозрастанию
+    :return: отсортированный список
+    """
+    keyf, reverse = key_func(key, reverse)
+    chunk.sort(key=keyf, reverse=reverse)
+    return chunk
+
+
+def spill(run: IO, chunk: list) -> None:
+    """
+    Запись отсортированного куска в серию
+    :param run: файл серии в режиме записи
+    :param chunk: отсортированный список записей
+    """
+    run.write_buffer(chunk)
+    run.close()
+
+
+def parallel_runs(inp: IO, make_run: Callable[[], IO], pool: Executor,
+                  chunk_size: int, key: Optional[str] = None,
+                  reverse: bool = False, depth: int = 4,
+                  chunk_memory: Optional[int] = None) -> list[IO]:
+    """
+    Конвейерное формирование серий: текущий поток читает куски,
+    пул процессов сортирует их, отдельный поток пишет готовые серии
+    :param inp: входной файл в режиме чтения
+    :param make_run: функция создания новой временной серии
+    :param pool: пул процессов
+    :param chunk_size: кол-во записей в одной серии
+    :param key: ключ csv или None для txt
+    :param reverse: флаг сортировки по невозрастанию
+    :param depth: сколько кусков может одновременно сортироваться или ждать записи
+    :param chunk_memory: память под записи одного куска в байтах,
+    если указана - кусок набирается по размеру записей, а не по chunk_size
+    :return: список закрытых серий в порядке чтения
+    """
+    runs = []
+    sorting = deque()
+    writing = deque()
+    with ThreadPoolExecutor(max_workers=1) as writer:
+
+        def spill_oldest() -> None:
+            """
+            Передача самого старого отсортированного куска на запись
+            """
+            chunk = sorting.popleft().result()
+            run = make_run()
+            runs.append(run)
+            writing.append(writer.submit(spill, run, chunk))
+            if len(writing) > depth:
+                writing.popleft().result()
+
+        while chunk := read_chunk(inp, chunk_size, chunk_memory):
+            sorting.append(pool.submit(sort_chunk, chunk, key, reverse))
+            if len(sorting) >= depth:
+                spill_oldest()
+        while sorting:
+            spill_oldest()
+        while writing:
+            writing.popleft().result()
+    return runs
+
+
+def read_ahead(file: IO, depth: int = READ_AHEAD_DEPTH) -> Iterator:
+    """
+    Генератор записей файла, блоки которых заранее считываются
+    в отдельном потоке, пока слияние занято другими сериями
+    :param file: файл в режиме чтения
+    :param depth: сколько блоков может ждать в очереди
+    :return: записи файла по одной
+    """
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        """
+        Помещение элемента в очередь с проверкой того, что чтение еще нужно
+        :param item: пачка записей, исключение или признак конца файла
+        :return: False если генератор уже закрыт
+        """
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer() -> None:
+        """
+        Фоновое чтение пачек в очередь
+        """
+        try:
+            while buf := file.read_block():
+                if not put(buf):
+                    return
+        except Exception as err:  # noqa
+            put(err)
+            return
+        put(_STOP)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while (buf := batches.get()) is not _STOP:
+            if isinstance(buf, Exception):
+                raise buf
+            yield from buf
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,118 @@
+"""
+Потоковый доступ к результату сортировки без записи выходного файла:
+ленивый итератор по отсортированным записям и первые k записей
+"""
+import heapq
+from itertools import chain, count
+from typing import Optional, Union, Iterable, Iterator
+
+from external_two_way_sort.compression import Codec, get_codec
+from external_two_way_sort.external_sort import IO, DEFAULT_BUFFER_SIZE, \
+    CsvRow
+from external_two_way_sort.keys import key_func
+from external_two_way_sort.kway_sort import choose_fan_in, heap_memory, \
+    reduce_runs, replacement_selection, run_buffer_size
+from external_two_way_sort.memory import parse_size
+from external_two_way_sort.merge import iter_records
+
+Record = Union[str, int, float, CsvRow]
+
+
+def iter_sorted(src: Union[Iterable, str] = "input.txt",
+                key: Optional[str] = None,
+                reverse: bool = False,
+                type_data: Optional[str] = None,
+                delimiter: str = ",",
+                bsize: int = 1000,
+                io_buffer_size: int = DEFAULT_BUFFER_SIZE,
+                fan_in: Optional[int] = None,
+                memory: Union[str, int, None] = None,
+                codec: Union[str, Codec, None] = None) -> Iterator[Record]:
+    """
+    Генератор отсортированных записей: при первом обращении формирует серии
+    и делает промежуточные проходы, а последнее слияние выполняется лениво
+    по мере потребления записей. Временные серии удаляются, когда генератор
+    исчерпан или закрыт
+    :param src: исходный файл(ы)
+    :param key: столбец или составной ключ вида "date,id:i:desc" для csv
+    :param reverse: флаг сортировки по невозрастанию
+    :param type_data: тип считываемых данных
+    :param delimiter: разделитель между столбцами для csv
+    :param bsize: сколько записей держится в куче при формировании серий
+    :param io_buffer_size: размер блока чтения и записи файлов в байтах
+    :param fan_in: сколько серий сливается за проход,
+    по умолчанию выбирается по лимиту файлов и памяти
+    :param memory: бюджет памяти (байты или строка вида "512M")
+    :param codec: кодек сжатия серий ("zlib", "lzma:6", экземпляр Codec)
+    :return: записи в порядке сортировки
+    """
+    type_data = type_data or "s"
+    codec = get_codec(codec)
+    memory = None if memory is None else parse_size(memory)
+    fan_in = fan_in or choose_fan_in(io_buffer_size, memory)
+    io_buffer_size = run_buffer_size(fan_in, io_buffer_size, memory)
+    names = [src] if isinstance(src, str) else list(src)
+    input_files = [IO(name, "r", type_data, delimiter=delimiter, key_val=key,
+                      buffer_size=io_buffer_size) for name in names]
+    header = input_files[0].header
+    key = None if input_files[0].is_txt else input_files[0].key
+    run_num = count()
+
+    def make_run() -> IO:
+        """
+        Создание новой временной серии
+        :return: файл серии в режиме записи
+        """
+        return IO(f"iter_{next(run_num)}.bin", "w", type_data, is_temp=True,
+                  header=header, key_val=key, delimiter=delimiter,
+                  buffer_size=io_buffer_size, codec=codec)
+
+    runs = []
+    for inp in input_files:
+        runs.extend(replacement_selection(iter_records(inp), make_run, bsize,
+                                          key, reverse,
+                                          heap_memory(memory, io_buffer_size)))
+        inp.close()
+    runs, _ = reduce_runs(runs, make_run, fan_in, key, reverse)
+    for run in runs:
+        run.change_mode("r")
+    keyf, reverse = key_func(key, reverse)
+    try:
+        yield from heapq.merge(*map(iter_records, runs), key=keyf,
+                               reverse=reverse)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def top_k(src: Union[Iterable, str], k: int,
+          key: Optional[str] = None,
+          reverse: bool = False,
+          type_data: Optional[str] = None,
+          delimiter: str = ",",
+          io_buffer_size: int = DEFAULT_BUFFER_SIZE) -> list[Record]:
+    """
+    Первые k записей в порядке сортировки за один проход по входным файлам
+    с кучей не больше k элементов, без временных файлов.
+    Результат совпадает с началом полностью отсортированного файла
+    :param src: исходный файл(ы)
+    :param k: кол-во записей
+    :param key: столбец или составной ключ вида "date,id:i:desc" для csv
+    :param reverse: флаг сортировки по невозрастанию (тогда - k наибольших)
+    :param type_data: тип считываемых данных
+    :param delimiter: разделитель между столбцами для csv
+    :param io_buffer_size: размер блока чтения файлов в байтах
+    :return: список из не более чем k записей
+    """
+    type_data = type_data or "s"
+    names = [src] if isinstance(src, str) else list(src)
+    input_files = [IO(name, "r", type_data, delimiter=delimiter, key_val=key,
+                      buffer_size=io_buffer_size) for name in names]
+    key = None if input_files[0].is_txt else input_files[0].key
+    keyf, reverse = key_func(key, reverse)
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    res = select(k, chain.from_iterable(map(iter_records, input_files)),
+                 key=keyf)
+    for inp in input_files:
+        inp.close()
+    return res
@@ -2,10 +2,17 @@
 
 import csv
 import os
+import sys
 import unittest
 import shutil
 
-from external_two_way_sort.external_sort import my_sort  # pylint: disable=E0401
+from external_two_way_sort.external_sort import my_sort, read_chunk, IO, EOF, TEMP_DIR  # pylint: disable=E0401
+from external_two_way_sort.compression import CODECS, Codec, get_codec  # pylint: disable=E0401
+from external_two_way_sort.kway_sort import kway_sort  # pylint: disable=E0401
+from external_two_way_sort.memory import parse_size  # pylint: disable=E0401
+from external_two_way_sort.merge import merge_sorted_files  # pylint: disable=E0401
+from external_two_way_sort.offset_sort import offset_sort  # pylint: disable=E0401
+from external_two_way_sort.stream import iter_sorted, top_k  # pylint: disable=E0401
 
 TEST_NUMBER = [
     [],
@@ -314,4 +321,412 @@ class TestExternalSortTwoFile(unittest.TestCase):
 
     def tearDown(self) -> None:
         """Действия после окончания теста."""
-        shutil.rmtree(self.dir_name)
\ No newline at end of file
+        shutil.rmtree(self.dir_name)
+
+
+class TestBlockIO(unittest.TestCase):
+    """Тест-кейс блочного ввода-вывода IO."""
+
+    def setUp(self) -> None:
+        """Создание папки перед тестом."""
+        self.dir_name = "tests"
+        if not os.path.exists(self.dir_name):
+            os.mkdir(self.dir_name)
+
+    def test_txt_small_buffer(self) -> None:
+        """Тест чтения и записи txt при блоке меньше строки и переводах строк \\r\\n"""
+        file_name = "tests/test_block_io.txt"
+        data = [8, 0, 42, -3, 4, 8, 0, 45, 50, 9999, 7]
+        with open(file_name, "wb") as ptr:
+            ptr.write("\r\n".join(map(str, data)).encode())
+        inp = IO(file_name, "r", "i", buffer_size=3)
+        self.assertEqual(inp.read(), data[0])
+        self.assertEqual(inp.read_buffer(4), data[1:5])
+        self.assertEqual(inp.read_buffer(100), data[5:])
+        self.assertEqual(inp.read(), EOF)
+        inp.close()
+
+        out = IO("tests/test_block_io_out.txt", "w", "i", buffer_size=5)
+        out.write_buffer(data)
+        out.close()
+        with open("tests/test_block_io_out.txt", "r", encoding="utf-8") as ptr:
+            self.assertEqual(list(map(int, ptr.read().split())), data)
+
+    def test_csv_multiline_fields(self) -> None:
+        """Тест чтения csv, в котором поля содержат переводы строк"""
+        file_name = "tests/test_block_io.csv"
+        rows = [{"key": i, "text": f"line\n{i}"} for i in range(50)]
+        with open(file_name, "w", newline="", encoding="utf-8") as ptr:
+            writer = csv.DictWriter(ptr, fieldnames=["key", "text"])
+            writer.writeheader()
+            writer.writerows(rows)
+        inp = IO(file_name, "r", "i", key_val="key", buffer_size=7)
+        self.assertEqual(inp.header, ["key", "text"])
+        self.assertEqual(inp.read_buffer(100), rows)
+        inp.close()
+
+    def test_binary_runs(self) -> None:
+        """Тест двоичного формата: типы и заголовок сохраняются без разбора текста"""
+        for header, data in ((None, [5, -1.5, "a", 7]),
+                             (["key", "text"],
+                              [{"key": i, "text": f"t,{i}"} for i in range(10000)])):
+            with self.subTest(header=header):
+                out = IO("tests/test_block_io.bin", "w", header=header)
+                out.write(data[0])
+                out.write_buffer(data[1:])
+                out.change_mode("r")
+                self.assertEqual(out.header, header)
+                self.assertEqual(out.is_txt, header is None)
+                self.assertEqual(out.read_buffer(len(data) + 1), data)
+                self.assertEqual(out.read(), EOF)
+                out.close()
+
+    def test_binary_frames_by_size(self) -> None:
+        """Тест того, что кадры длинных записей ограничены размером блока"""
+        data = ["a"] * 1000 + ["x" * 5000] * 20 + ["b"] * 10
+        out = IO("tests/test_block_io.bin", "w", buffer_size=16 << 10)
+        out.write_buffer(data[:500])
+        out.write_iter(iter(data[500:1010]))
+        for val in data[1010:]:
+            out.write(val)
+        out.change_mode("r")
+        blocks = []
+        while block := out.read_block():
+            blocks.append(block)
+        out.close()
+        self.assertEqual(sum(blocks, []), data)
+        self.assertGreater(len(blocks), 5)
+        for block in blocks:
+            self.assertLess(sum(map(sys.getsizeof, block)), 2 * (16 << 10))
+
+    def test_read_chunk_by_size(self) -> None:
+        """Тест того, что кусок по бюджету становится короче, когда записи длиннее"""
+        file_name = "tests/test_block_io.txt"
+        data = ["a"] * 2000 + ["x" * 5000] * 100
+        with open(file_name, "w", encoding="utf-8") as ptr:
+            ptr.write("\n".join(data) + "\n")
+        inp = IO(file_name, "r", "s", buffer_size=4 << 10)
+        chunks = []
+        while chunk := read_chunk(inp, 10, 64 << 10):
+            chunks.append(chunk)
+        inp.close()
+        self.assertEqual(sum(chunks, []), data)
+        self.assertGreater(len(chunks[0]), 100)
+        self.assertLess(len(chunks[-2]), 20)
+
+    def tearDown(self) -> None:
+        """Действия после окончания теста."""
+        shutil.rmtree(self.dir_name)
+
+
+class TestKWaySort(unittest.TestCase):
+    """Тест-кейс k-путевой сортировки с выбором с замещением."""
+
+    def setUp(self) -> None:
+        """Создание папки перед тестом."""
+        self.dir_name = "tests"
+        self.file_name = "tests/test_kway.txt"
+        if not os.path.exists(self.dir_name):
+            os.mkdir(self.dir_name)
+
+    def test_sort_number_several_passes(self) -> None:
+        """Тест сортировки txt, когда серий больше чем fan_in"""
+        data = [(i * 7919) % 1000 - 500 for i in range(1000)]
+        for reverse in (False, True):
+            with open(self.file_name, "w", encoding="utf-8") as ptr:
+                for item in data:
+                    ptr.write(str(item) + "\n")
+            with self.subTest(reverse=reverse):
+                stats = kway_sort(self.file_name, reverse=reverse,
+                                  type_data="i", bsize=10, fan_in=3)
+                with open(self.file_name, "r", encoding="utf-8") as ptr:
+                    exit_lst = list(map(int, ptr.read().split()))
+                self.assertEqual(exit_lst, sorted(data, reverse=reverse))
+                self.assertGreater(stats["passes"], 1)
+
+    def test_runs_longer_than_memory(self) -> None:
+        """Тест того, что выбор с замещением дает серии длиннее буфера"""
+        data = [(i * 7919) % 1000 for i in range(1000)]
+        with open(self.file_name, "w", encoding="utf-8") as ptr:
+            for item in data:
+                ptr.write(str(item) + "\n")
+        stats = kway_sort(self.file_name, type_data="i", bsize=50)
+        self.assertLess(stats["runs"], len(data) // 50)
+
+    def test_sort_csv_more_files_with_output(self) -> None:
+        """Тест сортировки нескольких csv файлов с выходным файлом"""
+        key = "sort"
+        files = ["tests/test_kway_1.csv", "tests/test_kway_2.csv"]
+        all_data = []
+        for name, data in zip(files, TEST_MORE_TXT[5]):
+            with open(name, "w", newline="", encoding="utf-8") as ptr:
+                writer = csv.DictWriter(ptr, fieldnames=["id", key])
+                writer.writeheader()
+                for i, item in enumerate(data):
+                    writer.writerow({"id": i, key: item})
+            all_data.extend(data)
+        output = "tests/test_kway_out.csv"
+        kway_sort(files, output=output, reverse=True, type_data="i",
+                  key=key, bsize=2, fan_in=2)
+        with open(output, "r", newline="", encoding="utf-8") as ptr:
+            exit_lst = [int(row[key]) for row in csv.DictReader(ptr)]
+        self.assertEqual(exit_lst, sorted(all_data, reverse=True))
+
+    def test_text_and_binary_runs(self) -> None:
+        """Тест одинакового результата обоих движков с текстовыми и двоичными сериями"""
+        data = [(i * 7919) % 1000 - 500 for i in range(1000)]
+        for engine in (my_sort, kway_sort):
+            for binary_runs in (False, True):
+                with open(self.file_name, "w", encoding="utf-8") as ptr:
+                    for item in data:
+                        ptr.write(str(item) + "\n")
+                with self.subTest(engine=engine.__name__, binary_runs=binary_runs):
+                    engine(self.file_name, type_data="i", bsize=30,
+                           binary_runs=binary_runs)
+                    with open(self.file_name, "r", encoding="utf-8") as ptr:
+                        exit_lst = list(map(int, ptr.read().split()))
+                    self.assertEqual(exit_lst, sorted(data))
+
+    def test_memory_budget(self) -> None:
+        """Тест бюджета памяти, когда записи во второй половине файла длиннее"""
+        self.assertEqual(parse_size("2G"), 2 << 30)
+        self.assertEqual(parse_size("1.5k"), 1536)
+        data = [f"{(i * 7919) % 1000:04}" for i in range(1000)] + \
+               [f"{(i * 7919) % 1000:04}" + "x" * 500 for i in range(1000)]
+        for engine in (my_sort, kway_sort):
+            with open(self.file_name, "w", encoding="utf-8") as ptr:
+                ptr.write("\n".join(data) + "\n")
+            with self.subTest(engine=engine.__name__):
+                stats = engine(self.file_name, type_data="s", memory="64K")
+                with open(self.file_name, "r", encoding="utf-8") as ptr:
+                    exit_lst = ptr.read().split()
+                self.assertEqual(exit_lst, sorted(data))
+                self.assertGreater(stats["runs"], 2)
+                self.assertGreater(stats["bytes_spilled"], 0)
+                self.assertGreater(stats["peak_rss"], 0)
+
+    def test_compressed_runs(self) -> None:
+        """Тест сортировки со сжатием серий каждым кодеком"""
+        data = [(i * 7919) % 1000 - 500 for i in range(1000)]
+        for codec in CODECS:
+            for engine in (my_sort, kway_sort):
+                with open(self.file_name, "w", encoding="utf-8") as ptr:
+                    for item in data:
+                        ptr.write(str(item) + "\n")
+                with self.subTest(codec=codec, engine=engine.__name__):
+                    stats = engine(self.file_name, type_data="i", bsize=30,
+                                   codec=codec)
+                    with open(self.file_name, "r", encoding="utf-8") as ptr:
+                        exit_lst = list(map(int, ptr.read().split()))
+                    self.assertEqual(exit_lst, sorted(data))
+                    self.assertGreater(stats["bytes_spilled"], 0)
+        self.assertEqual(get_codec("zlib:9").level, 9)
+        self.assertIsNone(get_codec("none"))
+        with self.assertRaises(ValueError):
+            kway_sort(self.file_name, type_data="i", codec="zlib",
+                      binary_runs=False)
+
+    def test_resume_after_crash(self) -> None:
+        """Тест продолжения сортировки после падения во время проходов слияния"""
+
+        class FlakyCodec(Codec):
+            """Кодек, падающий на заданном по счету кадре"""
+            name = "flaky"
+
+            def __init__(self, fail_at: int) -> None:
+                self.fail_at = fail_at
+                self.calls = 0
+
+            def compress(self, data: bytes) -> bytes:
+                self.calls += 1
+                if self.calls == self.fail_at:
+                    raise OSError("disk failure")
+                return data
+
+        data = [(i * 7919) % 1000 - 500 for i in range(1000)]
+        with open(self.file_name, "w", encoding="utf-8") as ptr:
+            for item in data:
+                ptr.write(str(item) + "\n")
+        output = "tests/test_kway_out.txt"
+        # 53 серии по два кадра, затем проходы по 18, 6 и 2 серии:
+        # падение во втором проходе, после записи в манифест первого
+        with self.assertRaises(OSError):
+            kway_sort(self.file_name, output, type_data="i", bsize=10,
+                      fan_in=3, codec=FlakyCodec(150), resume=True)
+        job_dirs = [name for name in os.listdir(TEMP_DIR)
+                    if name.startswith("job_")]
+        self.assertEqual(len(job_dirs), 1)
+
+        stats = kway_sort(self.file_name, output, type_data="i", bsize=10,
+                          fan_in=3, codec=FlakyCodec(0), resume=True)
+        self.assertTrue(stats["resumed"])
+        self.assertEqual(stats["runs"], 0)
+        self.assertEqual(stats["passes"], 3)
+        with open(output, "r", encoding="utf-8") as ptr:
+            exit_lst = list(map(int, ptr.read().split()))
+        self.assertEqual(exit_lst, sorted(data))
+        self.assertFalse(os.path.exists(os.path.join(TEMP_DIR, job_dirs[0])))
+
+    def test_sort_parallel_more_files(self) -> None:
+        """Тест параллельного формирования серий для нескольких txt файлов"""
+        files = ["tests/test_kway_1.txt", "tests/test_kway_2.txt"]
+        all_data = []
+        for name, data in zip(files, TEST_MORE_TXT[6]):
+            with open(name, "w", encoding="utf-8") as ptr:
+                for item in data:
+                    ptr.write(str(item) + "\n")
+            all_data.extend(data)
+        output = "tests/test_kway_out.txt"
+        stats = kway_sort(files, output=output, type_data="i", bsize=2,
+                          fan_in=2, workers=2)
+        with open(output, "r", encoding="utf-8") as ptr:
+            exit_lst = list(map(int, ptr.read().split()))
+        self.assertEqual(exit_lst, sorted(all_data))
+        self.assertGreater(stats["bytes_spilled"], 0)
+
+    def tearDown(self) -> None:
+        """Действия после окончания теста."""
+        shutil.rmtree(self.dir_name)
+
+
+class TestMergeSortedFiles(unittest.TestCase):
+    """Тест-кейс слияния отсортированных файлов."""
+
+    def setUp(self) -> None:
+        """Создание папки перед тестом."""
+        self.dir_name = "tests"
+        if not os.path.exists(self.dir_name):
+            os.mkdir(self.dir_name)
+
+    def test_merge_txt_paths(self) -> None:
+        """Тест слияния txt файлов, заданных путями"""
+        output = "tests/test_merge_out.txt"
+        for reverse in (False, True):
+            for prefetch in (False, True):
+                for ind, case in enumerate(TEST_MORE_TXT):
+                    files = [f"tests/test_merge_{i}.txt" for i in range(len(case))]
+                    for name, data in zip(files, case):
+                        with open(name, "w", encoding="utf-8") as ptr:
+                            for item in sorted(data, reverse=reverse):
+                                ptr.write(str(item) + "\n")
+                    with self.subTest(reverse=reverse, prefetch=prefetch, case=ind):
+                        written = merge_sorted_files(files, output,
+                                                     reverse=reverse,
+                                                     type_data="i",
+                                                     prefetch=prefetch)
+                        with open(output, "r", encoding="utf-8") as ptr:
+                            exit_lst = list(map(int, ptr.read().split()))
+                        expected = sorted(sum(case, []), reverse=reverse)
+                        self.assertEqual(exit_lst, expected)
+                        self.assertEqual(written, len(expected))
+
+    def test_merge_csv_key_and_callable(self) -> None:
+        """Тест слияния csv по столбцу и по функции от записи"""
+        key = "sort"
+        files = ["tests/test_merge_1.csv", "tests/test_merge_2.csv"]
+        all_data = []
+        for name, data in zip(files, TEST_MORE_TXT[6]):
+            with open(name, "w", newline="", encoding="utf-8") as ptr:
+                writer = csv.DictWriter(ptr, fieldnames=["id", key])
+                writer.writeheader()
+                for i, item in enumerate(sorted(data)):
+                    writer.writerow({"id": i, key: item})
+            all_data.extend(data)
+        output = "tests/test_merge_out.csv"
+        merge_sorted_files(files, output, key=key, type_data="i")
+        with open(output, "r", newline="", encoding="utf-8") as ptr:
+            exit_lst = [int(row[key]) for row in csv.DictReader(ptr)]
+        self.assertEqual(exit_lst, sorted(all_data))
+
+        sources = [IO(name, "r", "i", key_val=key) for name in files]
+        out = IO(output, "w", header=sources[0].header)
+        merge_sorted_files(sources, out, key=lambda row: row[key])
+        out.close()
+        with open(output, "r", newline="", encoding="utf-8") as ptr:
+            exit_lst = [int(row[key]) for row in csv.DictReader(ptr)]
+        self.assertEqual(exit_lst, sorted(all_data))
+
+    def tearDown(self) -> None:
+        """Действия после окончания теста."""
+        shutil.rmtree(self.dir_name)
+
+
+class TestCompositeKey(unittest.TestCase):
+    """Тест-кейс составных ключей и режима "ключ + смещение"."""
+
+    def setUp(self) -> None:
+        """Создание папки и csv с несколькими столбцами ключа."""
+        self.dir_name = "tests"
+        self.file_name = "tests/test_composite.csv"
+        if not os.path.exists(self.dir_name):
+            os.mkdir(self.dir_name)
+        self.rows = [{"date": f"2023-0{i % 3 + 1}-01", "id": str((i * 37) % 50),
+                      "text": f"row, {i}\nwide"} for i in range(200)]
+        self.expected = sorted(sorted(self.rows, key=lambda r: -int(r["id"])),
+                               key=lambda r: r["date"])
+
+    def write_rows(self) -> None:
+        """Запись исходного csv"""
+        with open(self.file_name, "w", newline="", encoding="utf-8") as ptr:
+            writer = csv.DictWriter(ptr, fieldnames=["date", "id", "text"])
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def read_keys(self, name: str) -> list[tuple]:
+        """
+        Чтение ключей из выходного csv
+        :param name: путь к файлу
+        :return: список пар (date, id)
+        """
+        with open(name, "r", newline="", encoding="utf-8") as ptr:
+            return [(row["date"], int(row["id"])) for row in csv.DictReader(ptr)]
+
+    def test_mixed_directions(self) -> None:
+        """Тест сортировки по дате по возрастанию, затем по id по убыванию"""
+        expected = [(row["date"], int(row["id"])) for row in self.expected]
+        for engine in (my_sort, kway_sort, offset_sort):
+            self.write_rows()
+            with self.subTest(engine=engine.__name__):
+                engine(self.file_name, type_data="s", key="date,id:i:desc",
+                       bsize=16)
+                self.assertEqual(self.read_keys(self.file_name), expected)
+
+    def test_iter_sorted_and_top_k(self) -> None:
+        """Тест ленивого итератора и первых k записей по составному ключу"""
+        self.write_rows()
+        key = "date,id:i:desc"
+        result = list(iter_sorted(self.file_name, key=key, bsize=8, fan_in=2))
+        self.assertEqual(result, self.expected_rows())
+        for k in (0, 1, 17, 500):
+            with self.subTest(k=k):
+                self.assertEqual(top_k(self.file_name, k, key=key),
+                                 self.expected_rows()[:k])
+
+        partial = iter_sorted(self.file_name, key=key, bsize=8, fan_in=2)
+        self.assertEqual(next(partial), self.expected_rows()[0])
+        partial.close()
+        self.assertFalse(os.path.exists(TEMP_DIR))
+
+    def expected_rows(self) -> list[dict]:
+        """
+        Ожидаемые строки в том виде, в каком их возвращает IO
+        :return: строки с целым id
+        """
+        return [dict(row, id=int(row["id"])) for row in self.expected]
+
+    def test_offsets_keep_rows_and_reverse(self) -> None:
+        """Тест того, что режим смещений копирует строки без изменений"""
+        self.write_rows()
+        output = "tests/test_composite_out.csv"
+        stats = offset_sort(self.file_name, output, reverse=True,
+                            key="date,id:i:desc", bsize=8, fan_in=2)
+        self.assertGreater(stats["passes"], 1)
+        with open(output, "r", newline="", encoding="utf-8") as ptr:
+            result = list(csv.DictReader(ptr))
+        expected = sorted(sorted(self.rows, key=lambda r: int(r["id"])),
+                          key=lambda r: r["date"], reverse=True)
+        self.assertEqual(result, expected)
+
+    def tearDown(self) -> None:
+        """Действия после окончания теста."""
+        shutil.rmtree(self.dir_name)
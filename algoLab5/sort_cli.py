@@ -1,6 +1,7 @@
 import argparse
 
 import external_two_way_sort as ext
+from external_two_way_sort.memory import format_size
 
 
 def main():
@@ -8,7 +9,7 @@ def main():
     Точка входа CLI
     """
     parser = argparse.ArgumentParser(description="Внешняя сортировка "
-                                                 "методом двухпутевого сбалансированного слияния")
+                                                 "k-путевым слиянием серий")
     parser.add_argument("-src", dest="src", type=str, nargs="+",
                         help="Список исходных файлов")
     parser.add_argument("--output", "-out", dest="output", type=str, default=None,
@@ -19,18 +20,63 @@ def main():
                         action=argparse.BooleanOptionalAction,
                         help="Если указано - сортирует по невозрастанию")
     parser.add_argument("-key", dest="key", default=None, type=str,
-                        help="Ключ столбца для csv файла")
+                        help="Ключ csv: столбец или составной ключ вида "
+                             "\"date,id:i:desc\"")
     parser.add_argument("--delimiter", "-d", dest="delimiter", default=",",
                         help="Разделитель для csv файла")
+    parser.add_argument("--io_buffer", "-iob", dest="io_buffer", type=int,
+                        default=ext.external_sort.DEFAULT_BUFFER_SIZE,
+                        help="Размер блока чтения и записи файлов в байтах")
+    parser.add_argument("--engine", "-e", dest="engine", default="kway",
+                        choices=("kway", "two_way", "offsets"),
+                        help="kway - выбор с замещением и k-путевое слияние, "
+                             "two_way - двухпутевое сбалансированное слияние, "
+                             "offsets - сортировка ключей со смещениями строк csv")
+    parser.add_argument("--workers", "-w", dest="workers", type=int, default=1,
+                        help="Кол-во процессов для формирования серий (только kway)")
+    parser.add_argument("--binary_runs", "-bin", dest="binary_runs", default=True,
+                        action=argparse.BooleanOptionalAction,
+                        help="Хранить временные серии в двоичном формате")
+    parser.add_argument("--bsize", "-b", dest="bsize", type=int, default=1000,
+                        help="Кол-во записей в памяти при формировании серий")
+    parser.add_argument("--memory", "-m", dest="memory", type=str, default=None,
+                        help="Бюджет памяти, например 512M или 2G, "
+                             "если указан - заменяет --bsize")
+    parser.add_argument("--codec", "-c", dest="codec", type=str, default=None,
+                        help="Сжатие временных серий: zlib, bz2, lzma, "
+                             "с уровнем - zlib:6")
+    parser.add_argument("--resume", dest="resume", default=False,
+                        action=argparse.BooleanOptionalAction,
+                        help="Сохранять готовые серии в манифест и продолжать "
+                             "прерванную сортировку с теми же параметрами "
+                             "(только kway)")
     args = parser.parse_args()
     res = {"src": args.src,
            "output": args.output,
            "type_data": args.type_data,
            "reverse": args.reverse,
            "key": args.key,
-           "delimiter": args.delimiter
+           "delimiter": args.delimiter,
+           "io_buffer_size": args.io_buffer,
+           "binary_runs": args.binary_runs,
+           "bsize": args.bsize,
+           "memory": args.memory,
+           "codec": args.codec
            }
-    ext.sort(**res)
+    if args.resume and args.engine != "kway":
+        parser.error("--resume is supported only by the kway engine")
+    if args.workers != 1 and args.engine != "kway":
+        parser.error("--workers is supported only by the kway engine")
+    if args.engine == "kway":
+        stats = ext.sort(**res, workers=args.workers, resume=args.resume)
+    elif args.engine == "offsets":
+        del res["binary_runs"]
+        stats = ext.offset_sort(**res)
+    else:
+        stats = ext.two_way_sort(**res)
+    print(f"Проходов: {stats['passes']}, серий: {stats['runs']}, "
+          f"записано во временные файлы: {format_size(stats['bytes_spilled'])}, "
+          f"пик памяти: {format_size(stats['peak_rss'])}")
 
 def for_tests():
     filenames_txt = []
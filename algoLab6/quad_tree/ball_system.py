@@ -0,0 +1,440 @@
+"""
+Файл с векторизованной системой шариков:
+позиции, скорости, радиусы и массы хранятся в непрерывных массивах NumPy,
+движение, отскоки от стенок и столкновения считаются пакетно.
+BallView - тонкое представление шарика системы с интерфейсом Ball
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pygame as pg
+
+import quad_tree.consts as c
+from quad_tree.figures import Ball, Vec2
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# смещения соседних ячеек сетки, половина окрестности,
+# чтобы пара соседних ячеек просматривалась один раз
+NEIGHBOURS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+# до какого кол-ва ячеек на шарик сетка хранится плотной таблицей
+DENSE_CELLS_PER_BALL = 16
+
+
+def grid_pairs(pos: np.ndarray, radius: np.ndarray,
+               cell_size: float = None) -> np.ndarray:
+    """
+    Широкая фаза на равномерной сетке без циклов по шарикам:
+    шарик попадает в ячейку своего центра, пары ищутся в той же
+    и в соседних ячейках. При стороне ячейки не меньше наибольшего
+    диаметра каждая касающаяся пара попадает в список ровно один раз
+    :param pos: массив позиций (n, 2)
+    :param radius: массив радиусов
+    :param cell_size: сторона ячейки, по умолчанию - наибольший диаметр
+    :return: массив пар индексов (m, 2)
+    """
+    if len(pos) < 2:
+        return np.empty((0, 2), dtype=np.intp)
+    if cell_size is None:
+        cell_size = max(2 * float(radius.max()), 1.)
+    cells = np.floor(pos / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = int(cells[:, 0].max()) + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    # таблица начала и размера каждой ячейки, если сетка не слишком
+    # разреженная, иначе соседи ищутся двоичным поиском
+    n_cells = (int(cells[:, 1].max()) + 2) * width
+    dense = n_cells <= DENSE_CELLS_PER_BALL * len(keys)
+    if dense:
+        cell_count = np.bincount(keys, minlength=n_cells)
+        cell_start = np.cumsum(cell_count) - cell_count
+
+    pairs = []
+    shift = 1
+    while shift < len(sorted_keys):
+        same = np.nonzero(sorted_keys[shift:] == sorted_keys[:-shift])[0]
+        if not len(same):
+            break
+        pairs.append(np.stack((order[same], order[same + shift]), axis=1))
+        shift += 1
+
+    for d_x, d_y in NEIGHBOURS:
+        target = sorted_keys + (d_y * width + d_x)
+        if dense:
+            start, count = cell_start[target], cell_count[target]
+        else:
+            start = np.searchsorted(sorted_keys, target, "left")
+            count = np.searchsorted(sorted_keys, target, "right") - start
+        for k in range(int(count.max())):
+            ind = np.nonzero(count > k)[0]
+            pairs.append(np.stack((order[ind], order[start[ind] + k]), axis=1))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.intp)
+    return np.concatenate(pairs)
+
+
+def _collide_loop(pos: np.ndarray, vel: np.ndarray, radius: np.ndarray,
+                  mass: np.ndarray, collisions: np.ndarray,
+                  pairs: np.ndarray, sign: int) -> int:
+    """
+    Последовательная обработка пар, повторяющая Ball.collide,
+    компилируется numba, если он установлен
+    :return: кол-во касаний
+    """
+    contacts = 0
+    for k in range(pairs.shape[0]):
+        i, j = pairs[k, 0], pairs[k, 1]
+        d_x = pos[i, 0] - pos[j, 0]
+        d_y = pos[i, 1] - pos[j, 1]
+        dist = (d_x * d_x + d_y * d_y) ** 0.5
+        r_sum = radius[i] + radius[j]
+        if dist > r_sum or dist == 0:
+            continue
+        contacts += 1
+        overlap = (dist - r_sum) * 0.5
+        x_over = overlap * d_x / dist
+        y_over = overlap * d_y / dist
+        pos[i, 0] -= x_over
+        pos[i, 1] -= y_over
+        pos[j, 0] += x_over
+        pos[j, 1] += y_over
+
+        norm_x = -d_x / dist
+        norm_y = -d_y / dist
+        norm_i = vel[i, 0] * norm_x + vel[i, 1] * norm_y
+        norm_j = vel[j, 0] * norm_x + vel[j, 1] * norm_y
+        m_i, m_j = mass[i], mass[j]
+        new_i = (norm_i * (m_i - m_j) + 2 * m_j * norm_j) / (m_i + m_j)
+        new_j = (norm_j * (m_j - m_i) + 2 * m_i * norm_i) / (m_i + m_j)
+        vel[i, 0] += (new_i - norm_i) * norm_x
+        vel[i, 1] += (new_i - norm_i) * norm_y
+        vel[j, 0] += (new_j - norm_j) * norm_x
+        vel[j, 1] += (new_j - norm_j) * norm_y
+        collisions[i] += sign
+        collisions[j] += sign
+    return contacts
+
+
+_collide_jit = njit(cache=True)(_collide_loop) if njit is not None else None
+
+
+class BallSystem:
+    def __init__(self, width: float, height: float, capacity: int = 64) -> None:
+        """
+        Класс системы шариков, хранящей состояние в массивах NumPy
+        :param width: ширина поля
+        :param height: высота поля
+        :param capacity: начальная емкость массивов
+        """
+        self.bounds = np.array((width, height), dtype=np.float64)
+        self.count = 0
+        self._pos = np.zeros((capacity, 2))
+        self._vel = np.zeros((capacity, 2))
+        self._radius = np.zeros(capacity)
+        self._mass = np.zeros(capacity)
+        self._collisions = np.zeros(capacity, dtype=np.int64)
+        self.b_ids: List[int] = []
+        self.views: List["BallView"] = []
+        # кол-во пар широкой фазы и касаний на последнем шаге
+        self.candidates = 0
+        self.contacts = 0
+        self.use_numba = _collide_jit is not None
+
+    @property
+    def pos(self) -> np.ndarray:
+        return self._pos[:self.count]
+
+    @property
+    def vel(self) -> np.ndarray:
+        return self._vel[:self.count]
+
+    @property
+    def radius(self) -> np.ndarray:
+        return self._radius[:self.count]
+
+    @property
+    def mass(self) -> np.ndarray:
+        return self._mass[:self.count]
+
+    @property
+    def collisions(self) -> np.ndarray:
+        return self._collisions[:self.count]
+
+    def _grow(self, capacity: int) -> None:
+        """
+        Увеличение емкости массивов
+        :param capacity: новая емкость
+        """
+        for name in ("_pos", "_vel", "_radius", "_mass", "_collisions"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, pos_x: float, pos_y: float, vel_x: float, vel_y: float,
+            radius: float, b_id: int = 0) -> int:
+        """
+        Добавление шарика в систему
+        :param pos_x: позиция центра по x
+        :param pos_y: позиция центра по y
+        :param vel_x: скорость по x
+        :param vel_y: скорость по y
+        :param radius: радиус
+        :param b_id: айди шарика
+        :return: индекс шарика в массивах
+        """
+        if self.count == len(self._radius):
+            self._grow(2 * len(self._radius))
+        ind = self.count
+        self._pos[ind] = pos_x, pos_y
+        self._vel[ind] = vel_x, vel_y
+        self._radius[ind] = radius
+        self._mass[ind] = radius * 10
+        self._collisions[ind] = 0
+        self.b_ids.append(b_id)
+        self.count += 1
+        return ind
+
+    def remove(self, ind: int) -> None:
+        """
+        Удаление шарика: на его место переносится последний шарик,
+        индекс его представления обновляется
+        :param ind: индекс удаляемого шарика
+        """
+        last = self.count - 1
+        for arr in (self._pos, self._vel, self._radius, self._mass,
+                    self._collisions):
+            arr[ind] = arr[last]
+        self.b_ids[ind] = self.b_ids[last]
+        self.b_ids.pop()
+        if self.views:
+            self.views[ind] = self.views[last]
+            self.views[ind].index = ind
+            self.views.pop()
+        self.count = last
+
+    @classmethod
+    def from_balls(cls, balls: List[Ball], width: float,
+                   height: float) -> "BallSystem":
+        """
+        Перенос списка обычных шариков в систему
+        :param balls: шарики
+        :param width: ширина поля
+        :param height: высота поля
+        :return: система шариков
+        """
+        system = cls(width, height, max(len(balls), 64))
+        for ball in balls:
+            system.add(ball.pos_x, ball.pos_y, ball.velocity.x, ball.velocity.y,
+                       ball.radius, ball.b_id)
+            system._collisions[system.count - 1] = ball.collisions_count
+        return system
+
+    def make_views(self, screen: pg.display) -> List["BallView"]:
+        """
+        Создание представлений всех шариков для отрисовки
+        :param screen: экран, куда рисуются шарики
+        :return: список представлений
+        """
+        self.views = [BallView(self, ind, screen) for ind in range(self.count)]
+        return self.views
+
+    def move(self, time_speed: float = None, index: int = None) -> None:
+        """
+        Движение шариков и отскок от стенок, как в Ball.step
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
+        :param index: индекс одного шарика, по умолчанию двигаются все
+        """
+        time_speed = c.TIME_SPEED if time_speed is None else time_speed
+        part = slice(None) if index is None else slice(index, index + 1)
+        pos, vel = self.pos[part], self.vel[part]
+        radius = self.radius[part, None]
+        pos += vel * time_speed
+        low = pos < radius
+        high = pos > self.bounds - radius
+        hit = low | high
+        np.copyto(pos, radius, where=low)
+        np.copyto(pos, self.bounds - radius, where=high)
+        vel[hit] *= -1
+        collisions = self.collisions[part]
+        collisions += (1 if time_speed > 0 else -1) * hit.sum(axis=1)
+
+    def _resolve(self, pairs: np.ndarray, sign: int) -> int:
+        """
+        Пакетная обработка пар, в которых каждый шарик встречается
+        не больше одного раза, результат совпадает с Ball.collide
+        :param pairs: массив пар индексов (m, 2)
+        :param sign: +1 или -1 к счетчику столкновений
+        :return: кол-во касаний
+        """
+        pos, vel, radius, mass = self.pos, self.vel, self.radius, self.mass
+        first, second = pairs[:, 0], pairs[:, 1]
+        delta = pos[second] - pos[first]
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        r_sum = radius[first] + radius[second]
+        hit = (dist <= r_sum) & (dist > 0)
+        first, second = first[hit], second[hit]
+        dist, r_sum = dist[hit], r_sum[hit]
+        norm = delta[hit] / dist[:, None]
+
+        shift = norm * ((r_sum - dist) * 0.5)[:, None]
+        pos[first] -= shift
+        pos[second] += shift
+
+        vel_1 = np.einsum("ij,ij->i", vel[first], norm)
+        vel_2 = np.einsum("ij,ij->i", vel[second], norm)
+        m_1, m_2 = mass[first], mass[second]
+        new_1 = (vel_1 * (m_1 - m_2) + 2 * m_2 * vel_2) / (m_1 + m_2)
+        new_2 = (vel_2 * (m_2 - m_1) + 2 * m_1 * vel_1) / (m_1 + m_2)
+        vel[first] += norm * (new_1 - vel_1)[:, None]
+        vel[second] += norm * (new_2 - vel_2)[:, None]
+        self.collisions[first] += sign
+        self.collisions[second] += sign
+        return len(first)
+
+    def collide(self, pairs: np.ndarray, time_speed: float = None) -> int:
+        """
+        Упругие столкновения пар из широкой фазы. С numba пары обрабатываются
+        последовательно, как в Ball.collide. Без него касающиеся пары делятся
+        на раунды, в каждом из которых шарик встречается не больше одного раза,
+        и раунд считается одним пакетом - импульс и энергия сохраняются так же,
+        как при последовательной обработке
+        :param pairs: массив пар индексов (m, 2)
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
+        :return: кол-во касаний
+        """
+        time_speed = c.TIME_SPEED if time_speed is None else time_speed
+        self.candidates = len(pairs)
+        self.contacts = self.resolve(self.select(pairs),
+                                     1 if time_speed > 0 else -1)
+        return self.contacts
+
+    def select(self, pairs: np.ndarray) -> np.ndarray:
+        """
+        Отбор пар для resolve: без numba остаются только пары, касающиеся
+        в начале обработки, с numba касание проверяется при обработке пары
+        :param pairs: массив пар индексов (m, 2)
+        :return: массив пар индексов
+        """
+        if self.use_numba or not len(pairs):
+            return pairs
+        pos, radius = self.pos, self.radius
+        delta = pos[pairs[:, 1]] - pos[pairs[:, 0]]
+        r_sum = radius[pairs[:, 0]] + radius[pairs[:, 1]]
+        return pairs[np.einsum("ij,ij->i", delta, delta) <= r_sum * r_sum]
+
+    def resolve(self, pairs: np.ndarray, sign: int) -> int:
+        """
+        Обработка отобранных пар. Пары каждого шарика обрабатываются в порядке
+        списка, поэтому результат зависит только от этого порядка, и пары
+        с непересекающимися наборами шариков можно обрабатывать раздельно
+        :param pairs: пары из select
+        :param sign: +1 или -1 к счетчику столкновений
+        :return: кол-во касаний
+        """
+        if not len(pairs):
+            return 0
+        if self.use_numba:
+            return _collide_jit(self.pos, self.vel, self.radius, self.mass,
+                                self.collisions, pairs, sign)
+        contacts = 0
+        remaining = pairs
+        while len(remaining):
+            flat = remaining.ravel()
+            is_first = np.zeros(len(flat), dtype=bool)
+            is_first[np.unique(flat, return_index=True)[1]] = True
+            chosen = is_first.reshape(-1, 2).all(axis=1)
+            contacts += self._resolve(remaining[chosen], sign)
+            remaining = remaining[~chosen]
+        return contacts
+
+    def step(self, time_speed: float = None,
+             pairs: Optional[np.ndarray] = None) -> Tuple[int, int]:
+        """
+        Шаг симуляции: движение, широкая фаза на сетке и столкновения
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
+        :param pairs: готовый список пар, если широкая фаза внешняя
+        :return: кол-во пар широкой фазы и касаний
+        """
+        self.move(time_speed)
+        if pairs is None:
+            pairs = grid_pairs(self.pos, self.radius)
+        self.collide(pairs, time_speed)
+        return self.candidates, self.contacts
+
+
+class BallView(Ball):
+    def __init__(self, system: BallSystem, index: int,
+                 screen: pg.display) -> None:
+        """
+        Тонкое представление шарика системы с интерфейсом Ball:
+        все свойства читаются и пишутся в массивы системы,
+        поэтому представление можно передавать в квадродерево и сетку
+        :param system: система шариков
+        :param index: индекс шарика в массивах
+        :param screen: экран, куда рисуется шарик
+        """
+        self.system = system
+        self.index = index
+        self.screen = screen
+        self.max_x, self.max_y = self.screen.get_size()
+        self.color_progress = .0
+        self.is_collided = False
+
+    @property
+    def b_id(self) -> int:
+        return self.system.b_ids[self.index]
+
+    @property
+    def pos_x(self) -> float:
+        return float(self.system.pos[self.index, 0])
+
+    @pos_x.setter
+    def pos_x(self, value: float) -> None:
+        self.system.pos[self.index, 0] = value
+
+    @property
+    def pos_y(self) -> float:
+        return float(self.system.pos[self.index, 1])
+
+    @pos_y.setter
+    def pos_y(self, value: float) -> None:
+        self.system.pos[self.index, 1] = value
+
+    @property
+    def velocity(self) -> Vec2:
+        return Vec2(*self.system.vel[self.index])
+
+    @velocity.setter
+    def velocity(self, value: Vec2) -> None:
+        self.system.vel[self.index] = value.x, value.y
+
+    @property
+    def radius(self) -> float:
+        return float(self.system.radius[self.index])
+
+    @property
+    def mass(self) -> float:
+        return float(self.system.mass[self.index])
+
+    @property
+    def collisions_count(self) -> int:
+        return int(self.system.collisions[self.index])
+
+    @collisions_count.setter
+    def collisions_count(self, value: int) -> None:
+        self.system.collisions[self.index] = value
+
+    def step(self, time_speed: float = None) -> None:
+        """
+        Шаг одного шарика средствами системы: скорость представления -
+        копия, поэтому отскок в Ball.step не записался бы в массив
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
+        """
+        self.system.move(time_speed, self.index)
@@ -8,10 +8,15 @@ from quad_tree.figures import Ball, Vec2
 import random as rand
 from math import pi, sin, cos
 
+import numpy as np
+
+from quad_tree.ball_system import BallSystem
+
 
 def generate_balls(screen, ball_count: int,
                    min_size: int, max_size: int,
-                   min_velocity: int, max_velocity: int) -> List[Ball]:
+                   min_velocity: int, max_velocity: int,
+                   seed: int = None) -> List[Ball]:
     """
     Функция генерации списка шарика с заданными параметрами
     :param screen: экран, на который рисуются шарики
@@ -20,8 +25,12 @@ def generate_balls(screen, ball_count: int,
     :param max_size: максимальный радиус шарика
     :param min_velocity: минимальная скорость шарика
     :param max_velocity: максимальная скорость шарика
+    :param seed: зерно собственного генератора, без него используется
+    общий генератор модуля random
     :return: список сгенерированных шариков
     """
+    rng = rand if seed is None else rand.Random(seed)
+
     def generate_random_ball(b_id):
         """
         Внутренняя функция генерации шарика, генерирует шарик с заданными параметрами
@@ -29,13 +38,48 @@ def generate_balls(screen, ball_count: int,
         :return: готовый шарик
         """
         width, height = screen.get_size()
-        radius = rand.randint(min_size, max_size)
-        b_x = rand.randint(radius, width - radius)
-        b_y = rand.randint(radius, height - radius)
-        r_angle = rand.uniform(0, 2 * pi)
-        d_x = cos(r_angle) * rand.uniform(min_velocity, max_velocity)
-        d_y = sin(r_angle) * rand.uniform(min_velocity, max_velocity)
+        radius = rng.randint(min_size, max_size)
+        b_x = rng.randint(radius, width - radius)
+        b_y = rng.randint(radius, height - radius)
+        r_angle = rng.uniform(0, 2 * pi)
+        d_x = cos(r_angle) * rng.uniform(min_velocity, max_velocity)
+        d_y = sin(r_angle) * rng.uniform(min_velocity, max_velocity)
         vel = Vec2(d_x, d_y)
         return Ball(screen, b_x, b_y, vel, radius, b_id)
 
     return [generate_random_ball(i) for i in range(ball_count)]
+
+
+def generate_system(width: int, height: int, ball_count: int,
+                    min_size: int, max_size: int,
+                    min_velocity: int, max_velocity: int,
+                    seed: int = None) -> BallSystem:
+    """
+    Функция генерации системы шариков с теми же распределениями,
+    что и generate_balls, но без создания объектов Ball
+    :param width: ширина поля
+    :param height: высота поля
+    :param ball_count: кол-во шариков
+    :param min_size: минимальный радиус шарика
+    :param max_size: максимальный радиус шарика
+    :param min_velocity: минимальная скорость шарика
+    :param max_velocity: максимальная скорость шарика
+    :param seed: зерно генератора
+    :return: система шариков
+    """
+    rng = np.random.default_rng(seed)
+    radius = rng.integers(min_size, max_size, ball_count, endpoint=True)
+    b_x = rng.integers(radius, width - radius, endpoint=True)
+    b_y = rng.integers(radius, height - radius, endpoint=True)
+    r_angle = rng.uniform(0, 2 * pi, ball_count)
+    d_x = np.cos(r_angle) * rng.uniform(min_velocity, max_velocity, ball_count)
+    d_y = np.sin(r_angle) * rng.uniform(min_velocity, max_velocity, ball_count)
+
+    system = BallSystem(width, height, max(ball_count, 64))
+    system.count = ball_count
+    system.pos[:, 0], system.pos[:, 1] = b_x, b_y
+    system.vel[:, 0], system.vel[:, 1] = d_x, d_y
+    system.radius[:] = radius
+    system.mass[:] = radius * 10
+    system.b_ids = list(range(ball_count))
+    return system
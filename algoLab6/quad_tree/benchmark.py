@@ -0,0 +1,576 @@
+"""
+Бенчмарки симуляции без окна (pygame рисует в поверхность в памяти)
+
+Запуск: python -m quad_tree.benchmark broad --counts 100 1000 10000 100000
+        python -m quad_tree.benchmark system --counts 1000 10000 50000
+        python -m quad_tree.benchmark render --counts 1000 10000
+        python -m quad_tree.benchmark ccd --dts 0.25 1 4
+        python -m quad_tree.benchmark index --counts 1000 10000 100000
+        python -m quad_tree.benchmark config --counts 1000 10000
+"""
+import argparse
+import os
+import random as rand
+import tempfile
+from time import perf_counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame as pg
+
+import quad_tree.consts as c
+from quad_tree.ball_system import grid_pairs
+from quad_tree.balls_generator import generate_balls, generate_system
+from quad_tree.configer import Config, ConfigManager, ConfigWatcher
+from quad_tree.figures import Ball, Box, Circle, Vec2
+from quad_tree.simulation import Simulation, field_size
+from quad_tree.spatial_hash import BROAD_PHASES, make_broad_phase
+from quad_tree.sprites import ball_sprite, color_step, draw_balls, step_color
+from quad_tree.tree import QuadTree
+
+
+def make_scene(count: int, min_radius: int, max_radius: int,
+               seed: int) -> tuple:
+    """
+    Создание поля и шариков с постоянной плотностью. Размеры поля
+    и шариков попадают только в снимок конфигурации, модуль consts
+    не меняется
+    :param count: кол-во шариков
+    :param min_radius: минимальный радиус
+    :param max_radius: максимальный радиус
+    :param seed: зерно генератора, одинаковое для всех структур
+    :return: поверхность поля, список шариков и снимок конфигурации
+    """
+    width, height = field_size(count)
+    config = Config().replace(width=width, height=height,
+                              ball_min_radius=min_radius,
+                              ball_max_radius=max_radius)
+    screen = pg.Surface((config.width, config.height))
+    balls = generate_balls(screen, count, config.ball_min_radius,
+                           config.ball_max_radius, config.ball_min_velocity,
+                           config.ball_max_velocity, seed)
+    return screen, balls, config
+
+
+def bench_broad(counts: list[int], frames: int, min_radius: int,
+                max_radius: int, budget: float, seed: int) -> list[dict]:
+    """
+    Время кадра для квадродерева и равномерной сетки.
+    Кадр - движение и отрисовка шариков, перестроение структуры
+    и обработка столкновений, как в main_func.run.
+    Также выводится среднее за кадр кол-во проверенных пар и касаний
+    :param counts: кол-ва шариков
+    :param frames: кол-во замеряемых кадров
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :param budget: лимит времени на замер одной структуры в секундах,
+    после него кадры больше не считаются (но хотя бы один будет)
+    :param seed: зерно генератора шариков
+    :return: список результатов
+    """
+    pg.init()
+    results = []
+    for count in counts:
+        for name in BROAD_PHASES:
+            screen, balls, config = make_scene(count, min_radius, max_radius,
+                                               seed)
+            broad_phase = make_broad_phase(screen, name, config)
+            broad_time = 0.
+            candidates = contacts = 0
+            done = 0
+            start = perf_counter()
+            while done < frames and (not done or perf_counter() - start < budget):
+                for ball in balls:
+                    ball.move()
+                broad_start = perf_counter()
+                broad_phase.upd(balls)
+                broad_phase.find_intersections()
+                broad_time += perf_counter() - broad_start
+                candidates += broad_phase.candidates
+                contacts += broad_phase.contacts
+                done += 1
+            elapsed = perf_counter() - start
+            results.append({
+                "balls": count,
+                "broad_phase": name,
+                "frames": done,
+                "frame_ms": round(elapsed / done * 1000, 2),
+                "broad_ms": round(broad_time / done * 1000, 2),
+                "pairs": candidates // done,
+                "contacts": contacts // done,
+            })
+    pg.quit()
+    return results
+
+
+def bench_system(counts: list[int], frames: int, min_radius: int,
+                 max_radius: int, seed: int) -> list[dict]:
+    """
+    Время шага векторизованной системы шариков без отрисовки
+    при той же плотности, что и в bench_broad
+    :param counts: кол-ва шариков
+    :param frames: кол-во замеряемых шагов
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :param seed: зерно генератора шариков
+    :return: список результатов
+    """
+    results = []
+    for count in counts:
+        system = generate_system(*field_size(count), count,
+                                 min_radius, max_radius,
+                                 c.BALL_MIN_VELOCITY, c.BALL_MAX_VELOCITY, seed)
+        # первый шаг компилирует numba, если он есть
+        system.step(1)
+        move_time = broad_time = collide_time = 0.
+        start = perf_counter()
+        for _ in range(frames):
+            stage = perf_counter()
+            system.move(1)
+            move_time += perf_counter() - stage
+            stage = perf_counter()
+            pairs = grid_pairs(system.pos, system.radius)
+            broad_time += perf_counter() - stage
+            stage = perf_counter()
+            system.collide(pairs, 1)
+            collide_time += perf_counter() - stage
+        elapsed = perf_counter() - start
+        results.append({
+            "balls": count,
+            "backend": "numba" if system.use_numba else "numpy",
+            "step_ms": round(elapsed / frames * 1000, 2),
+            "fps": round(frames / elapsed, 1),
+            "move_ms": round(move_time / frames * 1000, 2),
+            "broad_ms": round(broad_time / frames * 1000, 2),
+            "collide_ms": round(collide_time / frames * 1000, 2),
+            "pairs": system.candidates,
+            "contacts": system.contacts,
+        })
+    return results
+
+
+def bench_render(counts: list[int], frames: int, min_radius: int,
+                 max_radius: int, seed: int) -> list[dict]:
+    """
+    Время отрисовки кадра: круг на каждый шарик через pg.draw.circle
+    против кэшированных спрайтов, выводимых одним Surface.blits
+    :param counts: кол-ва шариков
+    :param frames: кол-во замеряемых кадров
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :param seed: зерно генератора шариков
+    :return: список результатов
+    """
+    pg.init()
+    results = []
+    for count in counts:
+        screen, balls, _ = make_scene(count, min_radius, max_radius, seed)
+        start = perf_counter()
+        for _ in range(frames):
+            screen.fill((0, 0, 0))
+            for ball in balls:
+                color = step_color(color_step(ball.collisions_count))
+                pg.draw.circle(screen, color, (ball.pos_x, ball.pos_y),
+                               ball.radius)
+        circles = perf_counter() - start
+        # первый кадр заполняет кэш спрайтов
+        draw_balls(screen, balls)
+        start = perf_counter()
+        for _ in range(frames):
+            screen.fill((0, 0, 0))
+            draw_balls(screen, balls)
+        blits = perf_counter() - start
+        results.append({
+            "balls": count,
+            "circles_ms": round(circles / frames * 1000, 2),
+            "blits_ms": round(blits / frames * 1000, 2),
+            "speedup": round(circles / blits, 2),
+        })
+    pg.quit()
+    return results
+
+
+def bench_ccd(dts: list[float], rows: int, speed: float, radius: float,
+              engine: str, seed: int) -> list[dict]:
+    """
+    Пролет шариков друг сквозь друга при большой скорости времени.
+    В каждом ряду два шарика летят навстречу и должны столкнуться,
+    симулируется одно и то же время с разной скоростью времени за шаг.
+    Ряд считается пролетевшим, если в конце шарики поменялись местами
+    :param dts: скорости времени за шаг
+    :param rows: кол-во рядов
+    :param speed: средняя скорость шариков
+    :param radius: радиус шариков
+    :param engine: "quadtree", "grid" или "vector"
+    :param seed: зерно генератора скоростей
+    :return: список результатов
+    """
+    pg.init()
+    gap = 200
+    # время, за которое самая медленная пара сближается и разлетается,
+    # но не долетает до стенок
+    duration = 1.6 * gap / speed
+    size = (4 * gap, int(rows * 4 * radius) + 20)
+    results = []
+    for dt in dts:
+        steps = max(round(duration / dt), 1)
+        for ccd in (False, True):
+            rand.seed(seed)
+            screen = pg.Surface(size)
+            balls = []
+            for row in range(rows):
+                pos_y = 10 + 4 * radius * (row + .5)
+                vel = rand.uniform(.75, 1.25) * speed
+                balls.append(Ball(screen, 1.5 * gap, pos_y, Vec2(vel, 0),
+                                  radius, 2 * row))
+                balls.append(Ball(screen, 2.5 * gap, pos_y, Vec2(-vel, 0),
+                                  radius, 2 * row + 1))
+            sim = Simulation(screen, balls, engine, dt, ccd=ccd)
+            start = perf_counter()
+            sim.run(steps)
+            elapsed = perf_counter() - start
+            balls = sim.balls
+            tunnelled = sum(balls[2 * row].pos_x > balls[2 * row + 1].pos_x
+                            for row in range(rows))
+            results.append({
+                "dt": dt,
+                "ccd": ccd,
+                "steps": steps,
+                "tunnelled": tunnelled,
+                "step_ms": round(elapsed / steps * 1000, 2),
+                "total_ms": round(elapsed * 1000, 2),
+            })
+    pg.quit()
+    return results
+
+
+def bench_index(counts: list[int], queries: int, size: float, k: int,
+                seed: int) -> list[dict]:
+    """
+    Квадродерево как пространственный индекс: построение вставками и
+    массовой загрузкой, запросы прямоугольником, кругом и k ближайших
+    против полного перебора в Python и в NumPy. Результаты запросов
+    сверяются с перебором
+    :param counts: кол-ва объектов
+    :param queries: кол-во запросов каждого вида
+    :param size: сторона квадрата и диаметр круга запроса
+    :param k: кол-во соседей
+    :param seed: зерно генератора
+    :return: список результатов
+    """
+    results = []
+    for count in counts:
+        width, height = field_size(count)
+        rand.seed(seed)
+        items = [Circle(rand.uniform(0, width), rand.uniform(0, height),
+                        rand.uniform(0, 5), i) for i in range(count)]
+        xs = np.array([item.pos_x for item in items])
+        ys = np.array([item.pos_y for item in items])
+        rs = np.array([item.radius for item in items])
+        points = [(rand.uniform(0, width), rand.uniform(0, height))
+                  for _ in range(queries)]
+
+        start = perf_counter()
+        tree = QuadTree.bulk_load(items)
+        bulk_time = perf_counter() - start
+        start = perf_counter()
+        inserted = QuadTree(box=tree.root_node.box)
+        for item in items:
+            inserted.insert(item)
+        insert_time = perf_counter() - start
+
+        half = size / 2
+        searches = {
+            "rect": (
+                lambda x, y: tree.query_rect(x - half, y - half, size, size),
+                lambda x, y: (lambda box: [item for item in items
+                                           if item in box])(
+                    Box(x - half, y - half, size, size)),
+                lambda x, y: np.flatnonzero(np.hypot(
+                    np.maximum(np.abs(xs - x) - half, 0),
+                    np.maximum(np.abs(ys - y) - half, 0)) <= rs),
+            ),
+            "circle": (
+                lambda x, y: tree.query_circle(x, y, half),
+                lambda x, y: [item for item in items if
+                              item.distance(x, y) <= half],
+                lambda x, y: np.flatnonzero(
+                    np.hypot(xs - x, ys - y) - rs <= half),
+            ),
+            "nearest": (
+                lambda x, y: tree.nearest(k, (x, y)),
+                lambda x, y: sorted(items,
+                                    key=lambda item: item.distance(x, y))[:k],
+                lambda x, y: np.argsort(
+                    np.hypot(xs - x, ys - y) - rs, kind="stable")[:k],
+            ),
+        }
+        for kind, (by_tree, by_scan, by_numpy) in searches.items():
+            timings = []
+            same = True
+            for search in (by_tree, by_scan, by_numpy):
+                start = perf_counter()
+                found = [search(x, y) for x, y in points]
+                timings.append(perf_counter() - start)
+                if search is by_tree:
+                    expected = found
+                elif search is by_scan:
+                    same &= all(
+                        sorted(item.payload for item in got) ==
+                        sorted(item.payload for item in want)
+                        if kind != "nearest" else
+                        [round(item.distance(x, y), 9) for item in got] ==
+                        [round(item.distance(x, y), 9) for item in want]
+                        for got, want, (x, y) in zip(found, expected, points))
+            results.append({
+                "objects": count,
+                "query": kind,
+                "bulk_ms": round(bulk_time * 1000, 1),
+                "insert_ms": round(insert_time * 1000, 1),
+                "tree_us": round(timings[0] / queries * 1e6, 1),
+                "scan_us": round(timings[1] / queries * 1e6, 1),
+                "numpy_us": round(timings[2] / queries * 1e6, 1),
+                "same": same,
+            })
+    return results
+
+
+def _draw_balls_consts(screen: pg.Surface, balls: list) -> list[pg.Rect]:
+    """
+    Отрисовка шариков с чтением констант из модуля consts на каждый шарик,
+    как до появления снимков конфигурации. Нужна только для сравнения
+    :param screen: поверхность
+    :param balls: шарики
+    :return: прямоугольники нарисованных шариков
+    """
+    seq = []
+    for ball in balls:
+        count = ball.collisions_count
+        if not 0 <= count <= c.MAX_COLLISIONS:
+            count = min(max(count, 0), c.MAX_COLLISIONS)
+            ball.collisions_count = count
+        sprite = ball_sprite(ball.radius, color_step(count),
+                             (c.BALL_COLOR, c.BALL_COLOR_INV))
+        half = sprite.get_width() / 2
+        seq.append((sprite, (ball.pos_x - half, ball.pos_y - half)))
+    return screen.blits(seq)
+
+
+def bench_config(counts: list[int], frames: int, min_radius: int,
+                 max_radius: int, seed: int) -> list[dict]:
+    """
+    Цена чтения конфига в горячих циклах: обработка касаний и отрисовка
+    с чтением констант из модуля consts на каждый шарик и пару против
+    значений снимка, один раз привязанных к локальным переменным.
+    Оба варианта считают одинаковые кадры одной и той же сцены.
+    Также замеряется проверка файла конфигов на изменения и полная
+    перезагрузка снимка с перестроением широкой фазы
+    :param counts: кол-ва шариков
+    :param frames: кол-во замеряемых кадров
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :param seed: зерно генератора шариков
+    :return: список результатов
+    """
+    pg.init()
+    results = []
+    for count in counts:
+        timings = {}
+        for mode in ("consts", "snapshot"):
+            screen, balls, config = make_scene(count, min_radius, max_radius,
+                                               seed)
+            sim = Simulation(screen, balls, "grid", 1., config=config)
+            time_speed = config.time_speed
+            # первый кадр заполняет кэш спрайтов
+            draw_balls(screen, balls, config)
+            narrow = render = 0.
+            for _ in range(frames):
+                for ball in balls:
+                    ball.step(time_speed)
+                sim.broad_phase.upd(balls)
+                pairs = sim.broad_phase.find_pairs()
+                start = perf_counter()
+                if mode == "consts":
+                    for ball1, ball2 in pairs:
+                        ball1.collide(ball2)
+                else:
+                    for ball1, ball2 in pairs:
+                        ball1.collide(ball2, time_speed)
+                render_start = perf_counter()
+                if mode == "consts":
+                    _draw_balls_consts(screen, balls)
+                else:
+                    draw_balls(screen, balls, config)
+                end = perf_counter()
+                narrow += render_start - start
+                render += end - render_start
+            timings[mode] = narrow, render
+
+        # проверка неизменного файла и перезагрузка измененного
+        manager = ConfigManager()
+        manager.set_default()
+        with tempfile.TemporaryDirectory() as folder:
+            manager.file = f"{folder}/config.ini"
+            manager.save_to_file()
+            watcher = ConfigWatcher(manager.file, interval=0)
+            start = perf_counter()
+            for _ in range(frames):
+                watcher.poll()
+            poll_time = perf_counter() - start
+            start = perf_counter()
+            sim.set_config(watcher.load().replace(
+                node_capacity=config.node_capacity + 1))
+            reload_time = perf_counter() - start
+
+        (consts_narrow, consts_render), (snap_narrow, snap_render) = \
+            timings["consts"], timings["snapshot"]
+        saved = consts_narrow + consts_render - snap_narrow - snap_render
+        results.append({
+            "balls": count,
+            "consts_narrow_ms": round(consts_narrow / frames * 1000, 3),
+            "snap_narrow_ms": round(snap_narrow / frames * 1000, 3),
+            "consts_render_ms": round(consts_render / frames * 1000, 3),
+            "snap_render_ms": round(snap_render / frames * 1000, 3),
+            "saved_ms": round(saved / frames * 1000, 3),
+            "poll_us": round(poll_time / frames * 1e6, 1),
+            "reload_ms": round(reload_time * 1000, 2),
+        })
+    pg.quit()
+    return results
+
+
+def print_table(results: list[dict]) -> None:
+    """
+    Вывод результатов замеров в виде таблицы
+    :param results: список словарей с одинаковыми ключами
+    """
+    if not results:
+        return
+    cols = list(results[0])
+    widths = [max(len(col), *(len(str(res[col])) for res in results))
+              for col in cols]
+    print("  ".join(col.ljust(w) for col, w in zip(cols, widths)))
+    for res in results:
+        print("  ".join(str(res[col]).ljust(w) for col, w in zip(cols, widths)))
+
+
+def main():
+    """
+    Точка входа CLI бенчмарков
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарки симуляции")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    broad_parser = sub.add_parser("broad", help="Время кадра: квадродерево "
+                                                "против равномерной сетки")
+    broad_parser.add_argument("--counts", type=int, nargs="+",
+                              default=[100, 1000, 10000, 100000],
+                              help="Кол-ва шариков")
+    broad_parser.add_argument("--frames", type=int, default=20,
+                              help="Кол-во замеряемых кадров")
+    broad_parser.add_argument("--min_radius", type=int, default=2,
+                              help="Минимальный радиус шарика")
+    broad_parser.add_argument("--max_radius", type=int, default=5,
+                              help="Максимальный радиус шарика")
+    broad_parser.add_argument("--budget", type=float, default=30,
+                              help="Лимит времени на одну структуру в секундах")
+    broad_parser.add_argument("--seed", type=int, default=0,
+                              help="Зерно генератора шариков")
+
+    system_parser = sub.add_parser("system", help="Время шага векторизованной "
+                                                  "системы шариков")
+    system_parser.add_argument("--counts", type=int, nargs="+",
+                               default=[1000, 10000, 50000],
+                               help="Кол-ва шариков")
+    system_parser.add_argument("--frames", type=int, default=120,
+                               help="Кол-во замеряемых шагов")
+    system_parser.add_argument("--min_radius", type=int, default=2,
+                               help="Минимальный радиус шарика")
+    system_parser.add_argument("--max_radius", type=int, default=5,
+                               help="Максимальный радиус шарика")
+    system_parser.add_argument("--seed", type=int, default=0,
+                               help="Зерно генератора шариков")
+
+    render_parser = sub.add_parser("render", help="Время отрисовки: круги "
+                                                  "против кэша спрайтов")
+    render_parser.add_argument("--counts", type=int, nargs="+",
+                               default=[1000, 10000],
+                               help="Кол-ва шариков")
+    render_parser.add_argument("--frames", type=int, default=30,
+                               help="Кол-во замеряемых кадров")
+    render_parser.add_argument("--min_radius", type=int, default=2,
+                               help="Минимальный радиус шарика")
+    render_parser.add_argument("--max_radius", type=int, default=5,
+                               help="Максимальный радиус шарика")
+    render_parser.add_argument("--seed", type=int, default=0,
+                               help="Зерно генератора шариков")
+
+    ccd_parser = sub.add_parser("ccd", help="Пролет шариков сквозь друг друга "
+                                            "без CCD и с ним")
+    ccd_parser.add_argument("--dts", type=float, nargs="+",
+                            default=[0.25, 0.5, 1, 2, 4],
+                            help="Скорости времени за шаг")
+    ccd_parser.add_argument("--rows", type=int, default=200,
+                            help="Кол-во пар шариков")
+    ccd_parser.add_argument("--speed", type=float, default=20,
+                            help="Средняя скорость шариков")
+    ccd_parser.add_argument("--radius", type=float, default=2,
+                            help="Радиус шариков")
+    ccd_parser.add_argument("--engine", default="grid",
+                            choices=(*BROAD_PHASES, "vector"),
+                            help="Широкая фаза")
+    ccd_parser.add_argument("--seed", type=int, default=0,
+                            help="Зерно генератора скоростей")
+
+    index_parser = sub.add_parser("index", help="Запросы к квадродереву "
+                                                "против полного перебора")
+    index_parser.add_argument("--counts", type=int, nargs="+",
+                              default=[1000, 10000, 100000],
+                              help="Кол-ва объектов")
+    index_parser.add_argument("--queries", type=int, default=100,
+                              help="Кол-во запросов каждого вида")
+    index_parser.add_argument("--size", type=float, default=40,
+                              help="Сторона квадрата и диаметр круга запроса")
+    index_parser.add_argument("--k", type=int, default=10,
+                              help="Кол-во ближайших соседей")
+    index_parser.add_argument("--seed", type=int, default=0,
+                              help="Зерно генератора объектов")
+
+    config_parser = sub.add_parser("config", help="Чтение констант из модуля "
+                                                  "против снимка конфига")
+    config_parser.add_argument("--counts", type=int, nargs="+",
+                               default=[1000, 10000],
+                               help="Кол-ва шариков")
+    config_parser.add_argument("--frames", type=int, default=60,
+                               help="Кол-во замеряемых кадров")
+    config_parser.add_argument("--min_radius", type=int, default=2,
+                               help="Минимальный радиус шарика")
+    config_parser.add_argument("--max_radius", type=int, default=5,
+                               help="Максимальный радиус шарика")
+    config_parser.add_argument("--seed", type=int, default=0,
+                               help="Зерно генератора шариков")
+
+    args = parser.parse_args()
+    if args.bench == "broad":
+        print_table(bench_broad(args.counts, args.frames, args.min_radius,
+                                args.max_radius, args.budget, args.seed))
+    elif args.bench == "system":
+        print_table(bench_system(args.counts, args.frames, args.min_radius,
+                                 args.max_radius, args.seed))
+    elif args.bench == "render":
+        print_table(bench_render(args.counts, args.frames, args.min_radius,
+                                 args.max_radius, args.seed))
+    elif args.bench == "ccd":
+        print_table(bench_ccd(args.dts, args.rows, args.speed, args.radius,
+                              args.engine, args.seed))
+    elif args.bench == "index":
+        print_table(bench_index(args.counts, args.queries, args.size, args.k,
+                                args.seed))
+    elif args.bench == "config":
+        print_table(bench_config(args.counts, args.frames, args.min_radius,
+                                 args.max_radius, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Файл с непрерывным обнаружением столкновений (CCD): для пар широкой фазы
+и для стенок считается время касания, а события внутри шага обрабатываются
+по порядку времени. Шарики не пролетают друг сквозь друга даже при большой
+скорости времени, поэтому шагов на секунду симуляции нужно меньше
+"""
+import heapq
+from math import floor, inf, sqrt
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from quad_tree.ball_system import grid_pairs
+
+# предел событий на шарик за шаг: если шарик зажат между стенкой и другими
+# шариками, события могут идти без конца, после предела остаток шага
+# проходится без столкновений
+MAX_EVENTS_PER_BALL = 8
+# события стенок в очереди отмечаются отрицательным номером второго шарика
+WALL_X = -1
+WALL_Y = -2
+
+
+def swept_pairs(pos: np.ndarray, vel: np.ndarray, radius: np.ndarray,
+                time_speed: float) -> np.ndarray:
+    """
+    Широкая фаза для CCD: путь шарика за шаг, в том числе с отскоками
+    от стенок, накрывается кругом с центром в начальной позиции и радиусом
+    r + |v| * dt, из пар сетки остаются пары с пересекающимися кругами.
+    Если столкновение разгонит шарик за пределы его круга, advance
+    сама найдет для него новые пары
+    :param pos: массив позиций (n, 2)
+    :param vel: массив скоростей (n, 2)
+    :param radius: массив радиусов
+    :param time_speed: скорость времени за шаг
+    :return: массив пар индексов (m, 2)
+    """
+    reach = radius + np.hypot(vel[:, 0], vel[:, 1]) * abs(time_speed)
+    pairs = grid_pairs(pos, reach)
+    delta = pos[pairs[:, 1]] - pos[pairs[:, 0]]
+    r_sum = reach[pairs[:, 0]] + reach[pairs[:, 1]]
+    return pairs[np.einsum("ij,ij->i", delta, delta) <= r_sum * r_sum]
+
+
+def first_contacts(pos: np.ndarray, vel: np.ndarray, radius: np.ndarray,
+                   pairs: np.ndarray) -> np.ndarray:
+    """
+    Время касания для всех пар сразу, как pair_toi
+    :param pos: массив позиций (n, 2)
+    :param vel: массив скоростей (n, 2)
+    :param radius: массив радиусов
+    :param pairs: массив пар индексов (m, 2)
+    :return: массив времен, inf для пар, которые не сблизятся
+    """
+    first, second = pairs[:, 0], pairs[:, 1]
+    delta = pos[second] - pos[first]
+    d_vel = vel[second] - vel[first]
+    r_sum = radius[first] + radius[second]
+    approach = np.einsum("ij,ij->i", delta, d_vel)
+    gap = np.einsum("ij,ij->i", delta, delta) - r_sum * r_sum
+    disc = approach * approach - np.einsum("ij,ij->i", d_vel, d_vel) * gap
+    toi = np.full(len(pairs), inf)
+    hit = (approach < 0) & (disc > 0)
+    toi[hit] = gap[hit] / (np.sqrt(disc[hit]) - approach[hit])
+    toi[(approach < 0) & (gap <= 0)] = 0.
+    return toi
+
+
+def pair_toi(d_x: float, d_y: float, dv_x: float, dv_y: float,
+             r_sum: float) -> float:
+    """
+    Время касания двух равномерно движущихся кругов
+    :param d_x: разность позиций по x (второй минус первый)
+    :param d_y: разность позиций по y
+    :param dv_x: разность скоростей по x
+    :param dv_y: разность скоростей по y
+    :param r_sum: сумма радиусов
+    :return: время до касания, 0 для уже пересекающихся сближающихся
+    кругов, inf если круги не сблизятся
+    """
+    approach = d_x * dv_x + d_y * dv_y
+    if approach >= 0:
+        return inf
+    gap = d_x * d_x + d_y * d_y - r_sum * r_sum
+    if gap <= 0:
+        return 0.
+    disc = approach * approach - (dv_x * dv_x + dv_y * dv_y) * gap
+    if disc <= 0:
+        return inf
+    # меньший корень квадратного уравнения без потери точности
+    return gap / (sqrt(disc) - approach)
+
+
+def wall_toi(pos: float, vel: float, radius: float, size: float) -> float:
+    """
+    Время касания стенки по одной оси
+    :param pos: позиция центра
+    :param vel: скорость
+    :param radius: радиус
+    :param size: размер поля по оси
+    :return: время до касания, inf если шарик стоит по этой оси
+    """
+    if vel > 0:
+        return max((size - radius - pos) / vel, 0.)
+    if vel < 0:
+        return max((radius - pos) / vel, 0.)
+    return inf
+
+
+def advance(pos: np.ndarray, vel: np.ndarray, radius: np.ndarray,
+            mass: np.ndarray, collisions: np.ndarray, bounds: tuple,
+            pairs: np.ndarray, time_speed: float) -> int:
+    """
+    Шаг с событиями: у каждого шарика свое локальное время, из очереди
+    берется ближайшее касание пары или стенки, участники доводятся до него,
+    их скорости меняются как в Ball.collide, и для них заново считаются
+    будущие касания. Устаревшие события отсеиваются по номеру версии шарика.
+    Путь каждого шарика накрыт кругом, как в swept_pairs; если после
+    столкновения остаток пути выходит за круг, для шарика строится новый
+    круг и ищутся пары с кругами всех шариков, поэтому разогнанный шарик
+    не пролетает сквозь шарики, которых не было в pairs.
+    Массивы меняются на месте
+    :param pos: массив позиций (n, 2)
+    :param vel: массив скоростей (n, 2)
+    :param radius: массив радиусов
+    :param mass: массив масс
+    :param collisions: массив счетчиков столкновений
+    :param bounds: ширина и высота поля
+    :param pairs: пары из swept_pairs
+    :param time_speed: скорость времени за шаг, может быть отрицательной
+    :return: кол-во столкновений шариков
+    """
+    count = len(pos)
+    if not count or time_speed == 0:
+        return 0
+    sign = 1 if time_speed > 0 else -1
+    duration = abs(time_speed)
+    width, height = float(bounds[0]), float(bounds[1])
+    p_x, p_y = pos[:, 0].tolist(), pos[:, 1].tolist()
+    # при обратном ходе времени шарики движутся против своих скоростей
+    v_x, v_y = (vel[:, 0] * sign).tolist(), (vel[:, 1] * sign).tolist()
+    rad, masses = radius.tolist(), mass.tolist()
+    hits = [0] * count
+    local = [0.] * count
+    version = [0] * count
+    neighbours: List[Set[int]] = [set() for _ in range(count)]
+    queue = []
+    # последний круг, которым накрыт путь шарика до конца шага
+    reach = (radius + np.hypot(vel[:, 0], vel[:, 1]) * duration).tolist()
+    start_x, start_y = list(p_x), list(p_y)
+    cover_x, cover_y, cover_r = list(p_x), list(p_y), list(reach)
+    # сетка кругов строится только при первом выходе шарика за свой круг
+    circles: Dict[Tuple[int, int], List[Tuple[int, float, float, float]]] = {}
+    cell = 1.
+
+    def push_pair(i: int, j: int) -> None:
+        start = max(local[i], local[j])
+        d_x = (p_x[j] + v_x[j] * (start - local[j])) - \
+              (p_x[i] + v_x[i] * (start - local[i]))
+        d_y = (p_y[j] + v_y[j] * (start - local[j])) - \
+              (p_y[i] + v_y[i] * (start - local[i]))
+        time = start + pair_toi(d_x, d_y, v_x[j] - v_x[i], v_y[j] - v_y[i],
+                                rad[i] + rad[j])
+        if time <= duration:
+            heapq.heappush(queue, (time, i, j, version[i], version[j]))
+
+    def push_walls(i: int) -> None:
+        t_x = wall_toi(p_x[i], v_x[i], rad[i], width)
+        t_y = wall_toi(p_y[i], v_y[i], rad[i], height)
+        time, wall = (t_x, WALL_X) if t_x <= t_y else (t_y, WALL_Y)
+        time += local[i]
+        if time <= duration:
+            heapq.heappush(queue, (time, i, wall, version[i], 0))
+
+    def move_to(i: int, time: float) -> None:
+        p_x[i] += v_x[i] * (time - local[i])
+        p_y[i] += v_y[i] * (time - local[i])
+        local[i] = time
+
+    def cells_of(c_x: float, c_y: float, size: float) -> List[Tuple[int, int]]:
+        x_0, x_1 = floor((c_x - size) / cell), floor((c_x + size) / cell)
+        y_0, y_1 = floor((c_y - size) / cell), floor((c_y + size) / cell)
+        return [(x, y) for x in range(x_0, x_1 + 1)
+                for y in range(y_0, y_1 + 1)]
+
+    def add_circle(i: int, c_x: float, c_y: float, size: float) -> None:
+        for key in cells_of(c_x, c_y, size):
+            circles.setdefault(key, []).append((i, c_x, c_y, size))
+
+    def recover(i: int) -> None:
+        nonlocal cell
+        left = duration - local[i]
+        size = rad[i] + sqrt(v_x[i] * v_x[i] + v_y[i] * v_y[i]) * left
+        for c_x, c_y, c_r in ((start_x[i], start_y[i], reach[i]),
+                              (cover_x[i], cover_y[i], cover_r[i])):
+            d_x, d_y = p_x[i] - c_x, p_y[i] - c_y
+            if sqrt(d_x * d_x + d_y * d_y) + size <= c_r:
+                return
+        if not circles:
+            cell = max(2 * sum(reach) / count, 1.)
+            for k in range(count):
+                add_circle(k, start_x[k], start_y[k], reach[k])
+        c_x, c_y = p_x[i], p_y[i]
+        found = set()
+        for key in cells_of(c_x, c_y, size):
+            for j, o_x, o_y, o_size in circles.get(key, ()):
+                if j != i and j not in neighbours[i] and \
+                        (o_x - c_x) ** 2 + (o_y - c_y) ** 2 <= \
+                        (o_size + size) ** 2:
+                    found.add(j)
+        for j in found:
+            neighbours[i].add(j)
+            neighbours[j].add(i)
+        cover_x[i], cover_y[i], cover_r[i] = c_x, c_y, size
+        add_circle(i, c_x, c_y, size)
+
+    for i, j in pairs.tolist():
+        neighbours[i].add(j)
+        neighbours[j].add(i)
+    # первые касания пар считаются сразу для всех, в очередь попадают
+    # только те, что случатся в этом шаге
+    toi = first_contacts(pos, vel * sign, radius, pairs)
+    soon = np.nonzero(toi <= duration)[0]
+    queue = [(time, i, j, 0, 0) for time, (i, j) in
+             zip(toi[soon].tolist(), pairs[soon].tolist())]
+    heapq.heapify(queue)
+    for i in range(count):
+        push_walls(i)
+
+    contacts = 0
+    events_left = MAX_EVENTS_PER_BALL * count
+    while queue and events_left:
+        time, i, j, ver_i, ver_j = heapq.heappop(queue)
+        if ver_i != version[i] or j >= 0 and ver_j != version[j]:
+            continue
+        events_left -= 1
+        move_to(i, time)
+        if j == WALL_X:
+            p_x[i] = min(max(p_x[i], rad[i]), width - rad[i])
+            v_x[i] = -v_x[i]
+            touched = (i,)
+        elif j == WALL_Y:
+            p_y[i] = min(max(p_y[i], rad[i]), height - rad[i])
+            v_y[i] = -v_y[i]
+            touched = (i,)
+        else:
+            move_to(j, time)
+            d_x, d_y = p_x[j] - p_x[i], p_y[j] - p_y[i]
+            dist = sqrt(d_x * d_x + d_y * d_y)
+            if dist > 0:
+                norm_x, norm_y = d_x / dist, d_y / dist
+                vel_i = v_x[i] * norm_x + v_y[i] * norm_y
+                vel_j = v_x[j] * norm_x + v_y[j] * norm_y
+                m_i, m_j = masses[i], masses[j]
+                new_i = (vel_i * (m_i - m_j) + 2 * m_j * vel_j) / (m_i + m_j)
+                new_j = (vel_j * (m_j - m_i) + 2 * m_i * vel_i) / (m_i + m_j)
+                v_x[i] += norm_x * (new_i - vel_i)
+                v_y[i] += norm_y * (new_i - vel_i)
+                v_x[j] += norm_x * (new_j - vel_j)
+                v_y[j] += norm_y * (new_j - vel_j)
+                contacts += 1
+            touched = (i, j)
+        for k in touched:
+            hits[k] += 1
+            version[k] += 1
+        for k in touched:
+            recover(k)
+            push_walls(k)
+            for other in neighbours[k]:
+                push_pair(k, other)
+
+    for i in range(count):
+        move_to(i, duration)
+        # после предела событий шарик мог выйти за стенку
+        p_x[i] = min(max(p_x[i], rad[i]), width - rad[i])
+        p_y[i] = min(max(p_y[i], rad[i]), height - rad[i])
+    pos[:, 0], pos[:, 1] = p_x, p_y
+    vel[:, 0] = np.multiply(v_x, sign)
+    vel[:, 1] = np.multiply(v_y, sign)
+    collisions += sign * np.array(hits, dtype=collisions.dtype)
+    return contacts
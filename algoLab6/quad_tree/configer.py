@@ -1,14 +1,21 @@
 """
-Файл с менеджером конфигов
+Файл с менеджером конфигов, неизменяемым снимком конфигурации
+и слежением за файлом конфигов
 """
 
 
+import ast
+import dataclasses
 import os
-from configparser import ConfigParser
-from typing import Optional
+from configparser import ConfigParser, Error as ParserError
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Optional, Tuple
 
 from quad_tree import consts as c
 
+Color = Tuple[int, int, int]
+
 
 def find_file(filename, search_path='.') -> Optional[str]:
     """
@@ -23,6 +30,87 @@ def find_file(filename, search_path='.') -> Optional[str]:
     return None
 
 
+@dataclass(frozen=True, slots=True)
+class Config:
+    """
+    Неизменяемый снимок конфигурации. Симуляция получает его при создании
+    и читает значения из слотов снимка, а не из модуля consts; при изменении
+    конфигов создается новый снимок, который подменяет старый между кадрами
+    """
+    width: int = c.WIDTH
+    height: int = c.HEIGHT
+    ball_radius: float = c.BALL_RADIUS
+    fps_limit: int = c.FPS_LIMIT
+    time_speed: float = c.TIME_SPEED
+    node_capacity: int = c.NODE_CAPACITY
+    is_render_nums: bool = c.IS_RENDER_NUMS
+    ball_color: Color = c.BALL_COLOR
+    ball_color_inv: Color = c.BALL_COLOR_INV
+    is_gen: bool = c.IS_GEN
+    balls_count: int = c.BALLS_COUNT
+    ball_min_radius: int = c.BALL_MIN_RADIUS
+    ball_max_radius: int = c.BALL_MAX_RADIUS
+    ball_min_velocity: int = c.BALL_MIN_VELOCITY
+    ball_max_velocity: int = c.BALL_MAX_VELOCITY
+    max_collisions: int = c.MAX_COLLISIONS
+    broad_phase: str = c.BROAD_PHASE
+    physics_rate: int = c.PHYSICS_RATE
+    max_steps_per_frame: int = c.MAX_STEPS_PER_FRAME
+    ccd: bool = c.CCD
+    seed: Optional[int] = c.SEED
+
+    def __post_init__(self) -> None:
+        """
+        Проверка значений, при ошибках - ValueError со списком всех ошибок
+        """
+        errors = []
+        for name in ("width", "height", "fps_limit", "node_capacity",
+                     "max_collisions", "physics_rate", "max_steps_per_frame"):
+            if getattr(self, name) < 1:
+                errors.append(f"{name} должен быть больше 0")
+        if self.ball_radius <= 0 or self.ball_min_radius <= 0:
+            errors.append("радиус шарика должен быть больше 0")
+        if self.ball_min_radius > self.ball_max_radius:
+            errors.append("ball_min_radius больше ball_max_radius")
+        if self.ball_min_velocity > self.ball_max_velocity:
+            errors.append("ball_min_velocity больше ball_max_velocity")
+        if self.balls_count < 0:
+            errors.append("balls_count не может быть отрицательным")
+        for name in ("ball_color", "ball_color_inv"):
+            color = getattr(self, name)
+            if not (isinstance(color, tuple) and len(color) == 3 and
+                    all(isinstance(part, int) and 0 <= part <= 255
+                        for part in color)):
+                errors.append(f"{name} должен быть тройкой чисел от 0 до 255")
+        if errors:
+            raise ValueError("Неверный конфиг: " + "; ".join(errors))
+
+    @classmethod
+    def from_consts(cls) -> "Config":
+        """
+        Снимок текущих значений модуля consts
+        :return: снимок конфигурации
+        """
+        return cls(**{field.name: getattr(c, field.name.upper())
+                      for field in dataclasses.fields(cls)})
+
+    def replace(self, **changes) -> "Config":
+        """
+        Новый снимок с измененными значениями, сам снимок не меняется
+        :param changes: новые значения по именам полей
+        :return: снимок конфигурации
+        """
+        return dataclasses.replace(self, **changes)
+
+    def to_consts(self) -> None:
+        """
+        Запись значений снимка в модуль consts для кода,
+        который читает константы напрямую
+        """
+        for field in dataclasses.fields(self):
+            setattr(c, field.name.upper(), getattr(self, field.name))
+
+
 class ConfigManager:
     default_config = {
         'WIDTH': '800',
@@ -40,7 +128,12 @@ class ConfigManager:
         'BALL_MAX_RADIUS': '50',
         'BALL_MIN_VELOCITY': '1',
         'BALL_MAX_VELOCITY': '5',
-        'MAX_COLLISIONS': '50'
+        'MAX_COLLISIONS': '50',
+        'BROAD_PHASE': 'quadtree',
+        'PHYSICS_RATE': '60',
+        'MAX_STEPS_PER_FRAME': '5',
+        'CCD': 'False',
+        'SEED': ''
     }
 
     def __init__(self, config_path=find_file('config.ini')) -> None:
@@ -72,26 +165,49 @@ class ConfigManager:
         self.config.read(self.file)
         self.deserialize()
 
+    def snapshot(self) -> Config:
+        """
+        Снимок конфигурации из парсера с проверкой значений
+        :return: снимок конфигурации
+        """
+        section = self.config['DEFAULT']
+        # пустое зерно - каждый запуск со своими шариками
+        seed = section.get('SEED', fallback='').strip()
+        try:
+            return Config(
+                width=section.getint('WIDTH'),
+                height=section.getint('HEIGHT'),
+                ball_radius=section.getint('BALL_RADIUS'),
+                fps_limit=section.getint('FPS_LIMIT'),
+                time_speed=section.getfloat('TIME_SPEED'),
+                node_capacity=section.getint('NODE_CAPACITY'),
+                is_render_nums=section.getboolean('IS_RENDER_NUMS'),
+                ball_color=ast.literal_eval(section.get('BALL_COLOR')),
+                ball_color_inv=ast.literal_eval(section.get('BALL_COLOR_INV')),
+                is_gen=section.getboolean('IS_GEN'),
+                balls_count=section.getint('BALLS_COUNT'),
+                ball_min_radius=section.getint('BALL_MIN_RADIUS'),
+                ball_max_radius=section.getint('BALL_MAX_RADIUS'),
+                ball_min_velocity=section.getint('BALL_MIN_VELOCITY'),
+                ball_max_velocity=section.getint('BALL_MAX_VELOCITY'),
+                max_collisions=section.getint('MAX_COLLISIONS'),
+                broad_phase=section.get('BROAD_PHASE',
+                                        fallback=c.BROAD_PHASE),
+                physics_rate=section.getint('PHYSICS_RATE',
+                                            fallback=c.PHYSICS_RATE),
+                max_steps_per_frame=section.getint(
+                    'MAX_STEPS_PER_FRAME', fallback=c.MAX_STEPS_PER_FRAME),
+                ccd=section.getboolean('CCD', fallback=c.CCD),
+                seed=int(seed) if seed else None,
+            )
+        except (TypeError, SyntaxError) as exc:
+            raise ValueError(f"Неверный конфиг: {exc}") from exc
+
     def set_consts(self) -> None:
         """
         Установка значений констант файла consts
         """
-        c.WIDTH = self.config.getint('DEFAULT', 'WIDTH')
-        c.HEIGHT = self.config.getint('DEFAULT', 'HEIGHT')
-        c.BALL_RADIUS = self.config.getint('DEFAULT', 'BALL_RADIUS')
-        c.FPS_LIMIT = self.config.getint('DEFAULT', 'FPS_LIMIT')
-        c.TIME_SPEED = self.config.getfloat('DEFAULT', 'TIME_SPEED')
-        c.NODE_CAPACITY = self.config.getint('DEFAULT', 'NODE_CAPACITY')
-        c.IS_RENDER_NUMS = self.config.getboolean('DEFAULT', 'IS_RENDER_NUMS')
-        c.BALL_COLOR = eval(self.config.get('DEFAULT', 'BALL_COLOR'))
-        c.BALL_COLOR_INV = eval(self.config.get('DEFAULT', 'BALL_COLOR_INV'))
-        c.IS_GEN = self.config.getboolean('DEFAULT', 'IS_GEN')
-        c.BALLS_COUNT = self.config.getint('DEFAULT', 'BALLS_COUNT')
-        c.BALL_MIN_RADIUS = self.config.getint('DEFAULT', 'BALL_MIN_RADIUS')
-        c.BALL_MAX_RADIUS = self.config.getint('DEFAULT', 'BALL_MAX_RADIUS')
-        c.BALL_MIN_VELOCITY = self.config.getint('DEFAULT', 'BALL_MIN_VELOCITY')
-        c.BALL_MAX_VELOCITY = self.config.getint('DEFAULT', 'BALL_MAX_VELOCITY')
-        c.MAX_COLLISIONS = self.config.getint('DEFAULT', 'MAX_COLLISIONS')
+        self.snapshot().to_consts()
 
     def set_default(self) -> None:
         """
@@ -116,6 +232,67 @@ class ConfigManager:
             self.config.write(file)
 
 
+class ConfigWatcher:
+    def __init__(self, path: str, interval: float = 0.5) -> None:
+        """
+        Класс слежения за файлом конфигов: не чаще раза в interval секунд
+        сравнивает время изменения и размер файла, при изменении читает
+        новый снимок. Проверка вызывается из главного цикла между кадрами,
+        поэтому снимок меняется целиком и никогда посреди шага
+        :param path: путь до файла с конфигами
+        :param interval: период проверки файла в секундах
+        """
+        self.path = path
+        self.interval = interval
+        # текст последней ошибки чтения, None если файл прочитан
+        self.error: Optional[str] = None
+        self._stamp = self._file_stamp()
+        self._checked = perf_counter()
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        """
+        Время изменения и размер файла
+        :return: пара чисел или None, если файла нет
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> Config:
+        """
+        Чтение снимка конфигурации из файла
+        :return: снимок конфигурации
+        """
+        manager = ConfigManager(self.path)
+        manager.load_from_file()
+        return manager.snapshot()
+
+    def poll(self) -> Optional[Config]:
+        """
+        Проверка файла на изменения. Если новый файл не читается или
+        значения в нем неверные, остается старый снимок, а текст ошибки
+        сохраняется в error
+        :return: новый снимок или None, если файл не менялся
+        """
+        now = perf_counter()
+        if now - self._checked < self.interval:
+            return None
+        self._checked = now
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            config = self.load()
+        except (ValueError, ParserError) as exc:
+            self.error = str(exc)
+            return None
+        self.error = None
+        return config
+
+
 if __name__ == '__main__':
     # config = ConfigParser()
     # config['DEFAULT'] = {
@@ -19,5 +19,10 @@ BALL_MAX_RADIUS = 30
 BALL_MIN_VELOCITY = 1
 BALL_MAX_VELOCITY = 5
 MAX_COLLISIONS = 50
+BROAD_PHASE = "quadtree"
+PHYSICS_RATE = 60
+MAX_STEPS_PER_FRAME = 5
+CCD = False
+SEED = None
 
 
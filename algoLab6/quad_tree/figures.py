@@ -2,6 +2,7 @@
 Файл с примитивами
 Vec2 - двумерный вектор
 Ball - класс шарика
+Circle - ограничивающий круг с произвольной нагрузкой для квадродерева
 Box - класс ограничивающего прямоугольника для ноды квадродерева
 TextBlock - блок текст для отрисовки в pygame
 """
@@ -11,6 +12,8 @@ import pygame as pg
 from pygame.math import Vector2
 
 import quad_tree.consts as c
+from quad_tree.sprites import ball_label, ball_sprite, color_step, \
+    config_colors, COLOR_STEPS
 
 
 class Vec2(Vector2):
@@ -69,8 +72,6 @@ class Ball:
         self.max_x, self.max_y = self.screen.get_size()
         self.b_id = b_id
         self.mass = self.radius * 10
-        self.text = pg.font.SysFont("Comic Sans", 12) \
-            .render(str(self.b_id), True, (0, 0, 0))
         self.collisions_count = 0
         self.color_progress = .0
 
@@ -78,11 +79,20 @@ class Ball:
 
     def move(self) -> None:
         """
-        Движения шарика с учетом глобальной скорости времени.
+        Движения шарика с учетом глобальной скорости времени и его отрисовка
+        """
+        self.step()
+        self.render()
+
+    def step(self, time_speed: float = None) -> None:
+        """
+        Движение шарика на один шаг без отрисовки.
         Обрабатывает столкновения со стенками
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
         """
-        self.pos_x += self.velocity.x * c.TIME_SPEED
-        self.pos_y += self.velocity.y * c.TIME_SPEED
+        time_speed = c.TIME_SPEED if time_speed is None else time_speed
+        self.pos_x += self.velocity.x * time_speed
+        self.pos_y += self.velocity.y * time_speed
 
         if not self.radius <= self.pos_x <= self.max_x - self.radius:
             if (dif := self.pos_x - self.radius) < 0:
@@ -90,7 +100,7 @@ class Ball:
             elif self.pos_x + self.radius > self.max_x:
                 self.pos_x -= self.radius - (self.max_x - self.pos_x)
             self.is_collided = not self.is_collided
-            if c.TIME_SPEED > 0:
+            if time_speed > 0:
                 self.collisions_count += 1
             else:
                 self.collisions_count -= 1
@@ -102,40 +112,46 @@ class Ball:
             elif self.pos_y + self.radius > self.max_y:
                 self.pos_y -= self.radius - (self.max_y - self.pos_y)
             self.is_collided = not self.is_collided
-            if c.TIME_SPEED > 0:
+            if time_speed > 0:
                 self.collisions_count += 1
             else:
                 self.collisions_count -= 1
             self.velocity.invert_y()
-        self.render()
 
-    def render(self) -> None:
+    def render(self, config=None) -> None:
         """
         Функция отрисовки шарика, изменяет его цвет
         в зависимости от кол-ва столкновений
+        :param config: снимок конфигурации, по умолчанию значения из consts
         """
+        if config is None:
+            max_collisions, is_render_nums = c.MAX_COLLISIONS, c.IS_RENDER_NUMS
+        else:
+            max_collisions = config.max_collisions
+            is_render_nums = config.is_render_nums
         if self.collisions_count < 0:
             self.collisions_count = 0
-        if self.collisions_count > c.MAX_COLLISIONS:
-            self.collisions_count = c.MAX_COLLISIONS
-
-        self.color_progress = min(self.collisions_count / c.MAX_COLLISIONS, 1.0)
+        if self.collisions_count > max_collisions:
+            self.collisions_count = max_collisions
 
-        r = int((1 - self.color_progress) * c.BALL_COLOR[0] +
-                self.color_progress * c.BALL_COLOR_INV[0])
-        g = int((1 - self.color_progress) * c.BALL_COLOR[1] +
-                self.color_progress * c.BALL_COLOR_INV[1])
-        b = int((1 - self.color_progress) * c.BALL_COLOR[2] +
-                self.color_progress * c.BALL_COLOR_INV[2])
+        step = color_step(self.collisions_count, max_collisions)
+        self.color_progress = step / COLOR_STEPS
 
-        color = (r, g, b)
-
-        ball_rect = pg.draw.circle(self.screen, color, (self.pos_x, self.pos_y),
-                                   self.radius)
-        if c.IS_RENDER_NUMS:
+        sprite = ball_sprite(self.radius, step, config_colors(config))
+        half = sprite.get_width() / 2
+        ball_rect = self.screen.blit(sprite, (self.pos_x - half,
+                                              self.pos_y - half))
+        if is_render_nums:
             text_rect = self.text.get_rect(center=ball_rect.center)
             self.screen.blit(self.text, text_rect)
 
+    @property
+    def text(self) -> pg.Surface:
+        """
+        Подпись с айди шарика, общая для шариков с одинаковым айди
+        """
+        return ball_label(self.b_id)
+
     def __repr__(self) -> str:
         """
         Тектовое представление шарика
@@ -160,16 +176,19 @@ class Ball:
         """
         return hash(self.b_id)
 
-    def collide(self, other: "Ball") -> None:
+    def collide(self, other: "Ball", time_speed: float = None) -> bool:
         """
         Метод обработки столкновения с другим шариком, производит столкновение
         с учетом закона сохранения импульса
         :param other: другой шарик
+        :param time_speed: скорость времени, по ее знаку счетчики столкновений
+        растут или уменьшаются, по умолчанию c.TIME_SPEED
+        :return: True, если шарики касались и столкновение произошло
         """
         dist = ((self.pos_x - other.pos_x) ** 2 +
                 (self.pos_y - other.pos_y) ** 2) ** 0.5
         if dist > self.radius + other.radius or dist == 0:
-            return
+            return False
 
         # remove_overlap
         overlap = (dist - self.radius - other.radius) * 0.5
@@ -212,13 +231,14 @@ class Ball:
 
         self.is_collided = not self.is_collided
         other.is_collided = not other.is_collided
-        if c.TIME_SPEED > 0:
+        if (c.TIME_SPEED if time_speed is None else time_speed) > 0:
             self.collisions_count += 1
             other.collisions_count += 1
 
         else:
             self.collisions_count -= 1
             other.collisions_count -= 1
+        return True
         #
         # distance = ((self.pos_x - other.pos_x) ** 2 + (
         #         self.pos_y - other.pos_y) ** 2) ** 0.5
@@ -254,6 +274,43 @@ class Ball:
         #         other.pos_y -= dif_y
 
 
+class Circle:
+    __slots__ = ("pos_x", "pos_y", "radius", "payload")
+
+    def __init__(self, pos_x: float, pos_y: float, radius: float = 0,
+                 payload=None) -> None:
+        """
+        Класс ограничивающего круга: квадродерево хранит его так же,
+        как шарик, а нагрузка может быть любым объектом.
+        Точка - круг нулевого радиуса
+        :param pos_x: позиция центра по x
+        :param pos_y: позиция центра по y
+        :param radius: радиус
+        :param payload: хранимый объект
+        """
+        self.pos_x = pos_x
+        self.pos_y = pos_y
+        self.radius = radius
+        self.payload = payload
+
+    def distance(self, x: float, y: float) -> float:
+        """
+        Расстояние от точки до круга, 0 если точка внутри
+        :param x: координата точки по x
+        :param y: координата точки по y
+        :return: расстояние
+        """
+        return max(((self.pos_x - x) ** 2 + (self.pos_y - y) ** 2) ** 0.5 -
+                   self.radius, 0.)
+
+    def __repr__(self) -> str:
+        """
+        Текстовое представление круга
+        """
+        return f"Circle({self.pos_x}, {self.pos_y}, {self.radius}, " \
+               f"{self.payload!r})"
+
+
 class Box:
     def __init__(self, x, y, box_width, box_height) -> None:
         """
@@ -271,7 +328,7 @@ class Box:
         """
         Проверка на то, что шарик пересекается с боксом
         с учетом всей площади шарика
-        :param ball: проверяемый шарик
+        :param ball: проверяемый шарик или Circle
         :return: True/False в зависимости от вердикта
         """
         x_dist = abs(ball.pos_x - (self.x + self.width / 2))
@@ -288,6 +345,52 @@ class Box:
                 y_dist - self.height / 2) ** 2
         return corner_dist_sq <= (ball.radius ** 2)
 
+    def encloses(self, ball: Ball) -> bool:
+        """
+        Проверка на то, что шарик целиком лежит внутри бокса
+        :param ball: проверяемый шарик или Circle
+        :return: True/False в зависимости от вердикта
+        """
+        return self.x <= ball.pos_x - ball.radius and \
+            ball.pos_x + ball.radius <= self.x + self.width and \
+            self.y <= ball.pos_y - ball.radius and \
+            ball.pos_y + ball.radius <= self.y + self.height
+
+    def intersects(self, x, y, box_width, box_height) -> bool:
+        """
+        Проверка на пересечение с другим прямоугольником
+        :param x: позиция левого верхнего угла по x
+        :param y: позиция левого верхнего угла по y
+        :param box_width: ширина
+        :param box_height: высота
+        :return: True/False в зависимости от вердикта
+        """
+        return self.x <= x + box_width and x <= self.x + self.width and \
+            self.y <= y + box_height and y <= self.y + self.height
+
+    def distance(self, x: float, y: float) -> float:
+        """
+        Расстояние от точки до бокса, 0 если точка внутри
+        :param x: координата точки по x
+        :param y: координата точки по y
+        :return: расстояние
+        """
+        d_x = max(self.x - x, 0, x - self.x - self.width)
+        d_y = max(self.y - y, 0, y - self.y - self.height)
+        return (d_x * d_x + d_y * d_y) ** 0.5
+
+    def reset(self, x, y, box_width, box_height) -> None:
+        """
+        Переиспользование бокса с новыми координатами и размерами
+        :param x: позиция левого верхнего угла по x
+        :param y: позиция левого верхнего угла по y
+        :param box_width: ширина
+        :param box_height: высота
+        """
+        self.x, self.y = x, y
+        self.width, self.height = box_width, box_height
+        self.max_side = max(self.width, self.height)
+
     def render(self, screen: pg.display) -> None:
         """
         Рендер коробки
@@ -312,11 +415,12 @@ class TextBlock:
         self.font_size = 20
         self.font = pg.font.SysFont("Comic Sans", self.font_size)
 
-    def render(self, display, text: List[str]) -> None:
+    def render(self, display, text: List[str]) -> List[pg.Rect]:
         """
         Рисует текст на определенный дисплей
         :param display: дисплей, куда рисуем
         :param text: рисуемый текст
+        :return: прямоугольники нарисованных строк
         """
         rendered_text = [
             self.font.render("FPS: " + str(round(self.clock.get_fps(), 2)),
@@ -325,12 +429,13 @@ class TextBlock:
         for line in text:
             rendered_text.append(self.font.render(line, True, (255, 255, 255)))
 
-        for pos_y, line in enumerate(rendered_text):
-            display.blit(line, (10, (10 + self.font_size) * pos_y))
+        return [display.blit(line, (10, (10 + self.font_size) * pos_y))
+                for pos_y, line in enumerate(rendered_text)]
 
-    def tick(self, fps) -> None:
+    def tick(self, fps) -> int:
         """
         Задержка для фпс
         :param fps: значение фпс
+        :return: сколько миллисекунд прошло с прошлого кадра
         """
-        self.clock.tick(fps)
+        return self.clock.tick(fps)
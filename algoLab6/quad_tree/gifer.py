@@ -3,8 +3,10 @@
 """
 
 import os
+import queue
+import threading
 
-from PIL import Image
+from PIL import Image, GifImagePlugin
 
 
 def mk_dir(directory):
@@ -14,75 +16,110 @@ def mk_dir(directory):
 
 class GifSaver:
     """
-    Класс, сохраняющий гифки
+    Класс, сохраняющий гифки.
+    Кадры кодируются в фоновом потоке и дописываются в один файл,
+    при переполнении очереди кадры отбрасываются, а не тормозят симуляцию
     """
 
-    def __init__(self, directory, screen_width, screen_height) -> None:
-        # TODO: Починить создание папки для файлов
+    def __init__(self, directory, screen_width, screen_height,
+                 queue_size: int = 64, duration: int = 20,
+                 colors: int = 256) -> None:
         """
         Конструктор сохранялки гифок
         :param directory: путь к директории с результирующей гифкой
         :param screen_width: ширина экрана
         :param screen_height: высота экрана
+        :param queue_size: максимальное кол-во кадров, ожидающих кодирования
+        :param duration: длительность кадра в мс
+        :param colors: кол-во цветов палитры кадра
         """
         self.gif_dir = directory
         mk_dir(self.gif_dir)
         index = len(list(filter(lambda x: x.startswith("res"), os.listdir(self.gif_dir))))
-        self.res_gif_path = self.gif_dir + f"\\res{index}.gif"
-        self.frames = []
-        self.frames_count = 0
+        self.res_gif_path = os.path.join(self.gif_dir, f"res{index}.gif")
         self.size = (screen_width, screen_height)
-        self.gif_num = 1
+        self.duration = duration
+        self.colors = colors
+        self.frames_count = 0
+        self.dropped_count = 0
+        self.received_count = 0
+
+        self._file = None
+        self._closed = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = threading.Thread(target=self._encode_loop, daemon=True)
+        self._worker.start()
 
     def add_img(self, data) -> None:
         """
-        Метод добавления кадра к гифке
+        Метод добавления кадра к гифке, не блокирует вызывающий поток.
+        Если очередь заполнена больше чем наполовину - берется каждый второй кадр,
+        если заполнена полностью - кадр отбрасывается
         :param data: bytearray картинки
         """
-        img = Image.frombytes("RGBA", self.size, data)
-        self.frames_count += 1
-        self.frames.append(img)
+        if self._closed:
+            return
+        self.received_count += 1
+        if self._queue.qsize() > self._queue.maxsize // 2 \
+                and self.received_count % 2:
+            self.dropped_count += 1
+            return
+        try:
+            self._queue.put_nowait(bytes(data))
+        except queue.Full:
+            self.dropped_count += 1
 
-        if self.frames_count > 10:
-            self.save_to_gif()
+    def _encode_loop(self) -> None:
+        """
+        Цикл фонового потока, кодирующий кадры из очереди
+        """
+        try:
+            while (data := self._queue.get()) is not None:
+                self._write_frame(data)
+        finally:
+            if self._file is not None:
+                self._file.write(b";")
+                self._file.close()
 
-    def save_to_gif(self) -> None:
+    def _write_frame(self, data: bytes) -> None:
         """
-        Метод сохранения гифки в директорию
+        Метод квантования кадра и дописывания его в файл. У каждого кадра
+        своя палитра, иначе цвета, которых не было в первом кадре, теряются
+        :param data: байты кадра в формате RGBA
         """
-        self.frames[0].save(f"{self.gif_dir}\\part_gif{self.gif_num}.gif",
-                            save_all=True,
-                            append_images=self.frames[1:],
-                            optimize=True,
-                            duration=20,
-                            loop=1)
+        img = Image.frombytes("RGBA", self.size, data).convert("RGB")
+        frame = img.quantize(colors=self.colors)
+        if self._file is None:
+            header, _ = GifImagePlugin.getheader(
+                frame, info={"loop": 0, "duration": self.duration})
+            self._file = open(self.res_gif_path, "wb")
+            self._file.writelines(header)
+        self._file.writelines(GifImagePlugin.getdata(
+            frame, duration=self.duration, include_color_table=True))
+        self.frames_count += 1
 
-        self.frames[0].close()
-        self.frames.clear()
-        self.frames_count = 0
-        self.gif_num += 1
+    def close(self) -> None:
+        """
+        Метод завершения записи, дожидается кодирования всех кадров из очереди
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # если фоновый поток упал, очередь может быть заполнена навсегда
+        while self._worker.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._worker.join()
+        if self.frames_count:
+            print(f"Гифка сохранена по адресу {self.res_gif_path} "
+                  f"(кадров: {self.frames_count}, пропущено: {self.dropped_count})")
 
     def __del__(self) -> None:
         """
         Метод, вызываемый при удалении экземпляра GifSaver,
-        закрывает все открытые доступы к temp гифкам и удаляет их,
-        оставляя только результирующую гифку
+        завершает запись гифки
         """
-        gif_paths_list = list(map(lambda y: self.gif_dir + f"\\{y}",
-                                  filter(lambda x: x.startswith("part_gif"),
-                                         os.listdir(self.gif_dir))))
-        gif_paths_list.sort(key=lambda x: int(x.split("\\")[-1][8:].split(".")[0]))
-        gif_list = list(map(lambda x: Image.open(x), gif_paths_list))
-        if not gif_list:
-            return
-        gif_list[0].save(self.res_gif_path,
-                         save_all=True,
-                         append_images=gif_list[1:],
-                         optimize=True,
-                         duration=20,
-                         loop=0)
-        for gif in gif_list:
-            gif.close()
-        for gif in gif_paths_list:
-            os.remove(gif)
-        print(f"Гифка сохранена по адресу {self.res_gif_path}")
+        self.close()
@@ -9,41 +9,56 @@ import pygame as pg
 import random as rand
 
 from quad_tree.gifer import GifSaver
-import quad_tree.consts as c
-from quad_tree.figures import Ball, Vec2, TextBlock
-from quad_tree.tree import QuadTree
+from quad_tree.configer import Config, ConfigWatcher, find_file
+from quad_tree.figures import Vec2, TextBlock
+from quad_tree.simulation import Simulation
 from quad_tree.balls_generator import generate_balls
 
 
 # def set_consts_from_file()
 
 
-def run():
+def run(config: Config = None, config_path: str = None):
     """
     Функция, в которой все и происходит
+    :param config: снимок конфигурации, по умолчанию значения из consts
+    :param config_path: файл конфигов, изменения которого применяются
+    на ходу, по умолчанию config.ini, если он найден
     """
+    config = config or Config.from_consts()
+    config_path = config_path or find_file('config.ini')
+    watcher = ConfigWatcher(config_path) if config_path else None
+
     pg.init()
-    screen = pg.display.set_mode((c.WIDTH, c.HEIGHT))
+    screen = pg.display.set_mode((config.width, config.height))
     pg.display.set_caption("Симуляция столкновений")
-    gifer = GifSaver("images", c.WIDTH, c.HEIGHT)
+    gifer = GifSaver("images", config.width, config.height)
     text_block = TextBlock()
     balls = []
 
-    q_tree = QuadTree(screen)
-    if c.IS_GEN:
+    if config.is_gen:
         balls = generate_balls(screen,
-                               c.BALLS_COUNT,
-                               c.BALL_MIN_RADIUS,
-                               c.BALL_MAX_RADIUS,
-                               c.BALL_MIN_VELOCITY,
-                               c.BALL_MAX_VELOCITY)
+                               config.balls_count,
+                               config.ball_min_radius,
+                               config.ball_max_radius,
+                               config.ball_min_velocity,
+                               config.ball_max_velocity,
+                               config.seed)
+    sim = Simulation(screen, balls, config=config)
+    balls = sim.balls
+    # время, накопленное для шагов физики с фиксированной частотой
+    step_time = 0.
+    frame_ms = 0
+    # прямоугольники, нарисованные на прошлом кадре, и был ли он полным
+    dirty = []
+    was_full = True
 
     is_recording = False
     is_tree_render = True
 
     start_pos = None, None
     finish_pos = None, None
-    spawn_radius = c.BALL_RADIUS
+    spawn_radius = config.ball_radius
     cur_pos = None
 
     none_point = None, None
@@ -52,9 +67,14 @@ def run():
     while True:
 
         b_len = len(balls)
+        # новый снимок из файла подменяет старый целиком между кадрами
+        if watcher is not None and (new_config := watcher.poll()) is not None:
+            config = new_config
+            sim.set_config(config)
 
         for event in pg.event.get():
             if event.type == pg.QUIT:
+                gifer.close()
                 pg.quit()
                 sys.exit()
 
@@ -69,8 +89,7 @@ def run():
                     start_pos = event.pos
 
                 if event.button == pg.BUTTON_RIGHT:
-                    if balls:
-                        balls.pop()
+                    sim.pop_ball()
 
             if event.type == pg.MOUSEBUTTONUP:
 
@@ -79,10 +98,11 @@ def run():
 
             if event.type == pg.MOUSEWHEEL:
                 if start_pos == none_point:
-                    if mods & pg.KMOD_SHIFT:
-                        c.TIME_SPEED += event.y / 100
-                    else:
-                        c.TIME_SPEED += event.y / 10
+                    delta = event.y / 100 if mods & pg.KMOD_SHIFT \
+                        else event.y / 10
+                    config = config.replace(
+                        time_speed=config.time_speed + delta)
+                    sim.set_config(config)
                 else:
                     spawn_radius += event.y * 1.5
 
@@ -95,66 +115,79 @@ def run():
                 if event.key == pg.K_t:
                     is_tree_render = not is_tree_render
 
+                if event.key == pg.K_c:
+                    sim.ccd = not sim.ccd
+
                 if event.key == pg.K_UP:
-                    c.BALL_RADIUS += 5
+                    config = config.replace(ball_radius=config.ball_radius + 5)
+                    sim.set_config(config)
 
-                if event.key == pg.K_DOWN:
-                    c.BALL_RADIUS -= 5
+                if event.key == pg.K_DOWN and config.ball_radius > 5:
+                    config = config.replace(ball_radius=config.ball_radius - 5)
+                    sim.set_config(config)
 
         if is_recording:
             gifer.add_img(pg.image.tostring(screen, "RGBA"))
 
-        screen.fill((0, 0, 0))
+        # целиком экран перерисовывается, только если рисуется дерево
+        # или новый шарик, иначе стираются и обновляются прямоугольники
+        # прошлого кадра
+        is_full = is_tree_render or start_pos != none_point
+        if is_full or was_full:
+            screen.fill((0, 0, 0))
+        else:
+            for rect in dirty:
+                screen.fill((0, 0, 0), rect)
 
         # Определяем новый шарик
         if start_pos != none_point and \
                 finish_pos == none_point and \
                 event.type != pg.WINDOWLEAVE:
 
-            pg.draw.line(screen, c.BALL_COLOR_INV, start_pos,
+            pg.draw.line(screen, config.ball_color_inv, start_pos,
                          event.pos if hasattr(event, "pos") else cur_pos)
             pg.draw.circle(screen,
-                           color=c.BALL_COLOR,
+                           color=config.ball_color,
                            center=start_pos,
                            radius=spawn_radius,
                            width=1)
 
         # запускаем шарик
         if start_pos != none_point and finish_pos != none_point:
-            vel = Vec2((finish_pos[0] - start_pos[0]) / (c.WIDTH // 10),
-                       (finish_pos[1] - start_pos[1]) / (c.HEIGHT // 10))
+            vel = Vec2((finish_pos[0] - start_pos[0]) / (config.width // 10),
+                       (finish_pos[1] - start_pos[1]) / (config.height // 10))
             b_x, b_y = start_pos
-            balls.append(Ball(screen, b_x, b_y, vel, radius=spawn_radius, b_id=len(balls)))
+            sim.add_ball(b_x, b_y, vel, spawn_radius)
 
             start_pos, finish_pos = none_point, none_point
 
+        # физика шагает с частотой physics_rate независимо от фпс отрисовки
         if do_time:
-            for ball in balls:
-                ball.move()
+            step_dt = 1 / config.physics_rate
+            step_time = min(step_time + frame_ms / 1000,
+                            config.max_steps_per_frame * step_dt)
+            while step_time >= step_dt:
+                sim.step()
+                step_time -= step_dt
+        elif len(balls) != b_len:
+            sim.sync()
+
+        rects = sim.render(is_tree_render)
+        lines = [f"Balls count: {len(balls)}",
+                 f"Time speed: {config.time_speed * 10:.1f}",
+                 f"Pairs checked: {sim.candidates}",
+                 f"Contacts: {sim.contacts}",
+                 f"CCD: {'on' if sim.ccd else 'off'}"]
+        if watcher is not None and watcher.error:
+            lines.append(watcher.error)
+        rects += text_block.render(screen, lines)
+
+        if is_full or was_full:
+            pg.display.update()
         else:
-            for ball in balls:
-                ball.render()
-
-        if len(balls) != b_len:
-            q_tree.upd(balls)
-            # q_tree.print_nodes()
-
-        if do_time:
-            q_tree.upd(balls)
-            q_tree.find_intersections()
-
-        if is_tree_render:
-            q_tree.render()
-
-        text_block.render(screen, [f"Balls count: {len(balls)}",
-                                   f"Time speed: {c.TIME_SPEED * 10:.1f}"])
-
-        for ball in balls:
-            if ball.color_progress == 1:
-                ball.color_progress = .0
-
-        pg.display.update()
-        text_block.tick(c.FPS_LIMIT)
+            pg.display.update(dirty + rects)
+        dirty, was_full = rects, is_full
+        frame_ms = text_block.tick(config.fps_limit)
 
 
 if __name__ == '__main__':
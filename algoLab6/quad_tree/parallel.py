@@ -0,0 +1,319 @@
+"""
+Файл с расчетом шагов большой системы шариков в нескольких процессах.
+Поле делится на вертикальные полосы, массивы системы лежат в общей памяти.
+Пары, оба шарика которых не имеют пар в других полосах, обрабатываются
+пулом процессов по полосам, остальные пары - вторым этапом в главном процессе.
+Все пары шарика попадают в один этап, наборы шариков полос и второго этапа
+не пересекаются, а пары каждого шарика обрабатываются в порядке списка
+широкой фазы, поэтому результат не зависит от кол-ва процессов и полос
+и побитово совпадает с однопоточным BallSystem.step
+
+Запуск: python -m quad_tree.parallel --balls 100000 --workers 1 2 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import quad_tree.consts as c
+from quad_tree.ball_system import BallSystem, grid_pairs
+from quad_tree.balls_generator import generate_system
+from quad_tree.benchmark import print_table
+from quad_tree.simulation import field_size
+
+# массивы системы, которые переносятся в общую память
+SHARED_ARRAYS = ("_pos", "_vel", "_radius", "_mass", "_collisions")
+# полос на процесс: полосы с разным кол-вом пар выравнивают нагрузку
+STRIPS_PER_WORKER = 4
+
+# системы и пары, подключенные к общей памяти в процессе пула
+_attached: Dict[tuple, tuple] = {}
+
+
+def tile_schedule(pairs: np.ndarray, pos_x: np.ndarray, width: float,
+                  tiles: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Разбиение пар на полосы: шарик, у которого есть пара в другой полосе,
+    считается пограничным, и все его пары уходят на второй этап. Шарики
+    этих пар тоже становятся пограничными, пока все пары каждого шарика
+    не окажутся в одном этапе. Внутри полосы и на втором этапе сохраняется
+    исходный порядок пар, поэтому порядок пар каждого шарика не меняется
+    :param pairs: массив пар индексов (m, 2)
+    :param pos_x: позиции шариков по x
+    :param width: ширина поля
+    :param tiles: кол-во полос
+    :return: пары полос подряд, границы полос в этом массиве (tiles + 1)
+    и пары второго этапа
+    """
+    tile = np.clip((pos_x * (tiles / width)).astype(np.int64), 0, tiles - 1)
+    first, second = tile[pairs[:, 0]], tile[pairs[:, 1]]
+    border = np.zeros(len(pos_x), dtype=bool)
+    border[pairs[first != second].ravel()] = True
+    is_border = border[pairs[:, 0]] | border[pairs[:, 1]]
+    while not border[pairs[is_border].ravel()].all():
+        border[pairs[is_border].ravel()] = True
+        is_border = border[pairs[:, 0]] | border[pairs[:, 1]]
+    inner = np.nonzero(~is_border)[0]
+    inner = inner[np.argsort(first[inner], kind="stable")]
+    bounds = np.zeros(tiles + 1, dtype=np.int64)
+    np.cumsum(np.bincount(first[inner], minlength=tiles), out=bounds[1:])
+    return pairs[inner], bounds, pairs[is_border]
+
+
+def _attach(layout: tuple) -> tuple:
+    """
+    Подключение процесса пула к общей памяти главного процесса
+    :param layout: имена блоков, емкость массивов шариков, имя и емкость
+    массива пар и признак numba
+    :return: система поверх общей памяти, массив пар и блоки памяти
+    """
+    if layout in _attached:
+        return _attached[layout]
+    for _, _, blocks in _attached.values():
+        for block in blocks:
+            block.close()
+    _attached.clear()
+    names, capacity, pairs_name, pairs_capacity, use_numba = layout
+    system = BallSystem(1, 1, 1)
+    system.use_numba = use_numba
+    blocks = []
+    for attr, name in zip(SHARED_ARRAYS, names):
+        block = shared_memory.SharedMemory(name)
+        blocks.append(block)
+        old = getattr(system, attr)
+        setattr(system, attr, np.ndarray((capacity,) + old.shape[1:],
+                                         dtype=old.dtype, buffer=block.buf))
+    block = shared_memory.SharedMemory(pairs_name)
+    blocks.append(block)
+    pairs = np.ndarray((pairs_capacity, 2), dtype=np.intp, buffer=block.buf)
+    _attached[layout] = system, pairs, blocks
+    return _attached[layout]
+
+
+def _tile_task(layout: tuple, count: int, start: int, end: int,
+               sign: int) -> int:
+    """
+    Задача процесса пула: обработка пар одной полосы
+    :param layout: описание общей памяти для _attach
+    :param count: кол-во шариков
+    :param start: начало пар полосы
+    :param end: конец пар полосы
+    :param sign: +1 или -1 к счетчику столкновений
+    :return: кол-во касаний
+    """
+    system, pairs, _ = _attach(layout)
+    system.count = count
+    return system.resolve(pairs[start:end], sign)
+
+
+class TiledStepper:
+    def __init__(self, system: BallSystem, workers: int,
+                 tiles: int = None) -> None:
+        """
+        Класс пошагового расчета системы шариков в нескольких процессах.
+        Массивы системы переносятся в общую память, система остается рабочей
+        и после close возвращается к обычным массивам
+        :param system: система шариков
+        :param workers: кол-во процессов, при 1 полосы считаются в главном
+        :param tiles: кол-во полос, по умолчанию STRIPS_PER_WORKER на процесс
+        """
+        self.system = system
+        self.workers = workers
+        self.tiles = tiles or max(workers * STRIPS_PER_WORKER, 1)
+        self.blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.pairs_block: Optional[shared_memory.SharedMemory] = None
+        self.pairs = np.empty((0, 2), dtype=np.intp)
+        # кол-во пар полос и второго этапа на последнем шаге
+        self.inner = 0
+        self.border = 0
+        self._share()
+        self.pool = mp.Pool(workers) if workers > 1 else None
+
+    def _share(self) -> None:
+        """
+        Перенос массивов системы в новые блоки общей памяти
+        """
+        old_blocks = list(self.blocks.values())
+        for attr in SHARED_ARRAYS:
+            arr = getattr(self.system, attr)
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(arr.nbytes, 1))
+            shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+            shared[:] = arr
+            setattr(self.system, attr, shared)
+            self.blocks[attr] = block
+            self.arrays[attr] = shared
+        for block in old_blocks:
+            block.close()
+            block.unlink()
+
+    def _pairs_buffer(self, size: int) -> np.ndarray:
+        """
+        Массив пар в общей памяти, растет вдвое при нехватке места
+        :param size: нужное кол-во пар
+        :return: массив пар емкостью не меньше size
+        """
+        if self.pairs_block is None or len(self.pairs) < size:
+            if self.pairs_block is not None:
+                self.pairs_block.close()
+                self.pairs_block.unlink()
+            capacity = max(2 * size, 1024)
+            self.pairs_block = shared_memory.SharedMemory(
+                create=True, size=capacity * 2 * np.dtype(np.intp).itemsize)
+            self.pairs = np.ndarray((capacity, 2), dtype=np.intp,
+                                    buffer=self.pairs_block.buf)
+        return self.pairs
+
+    def step(self, time_speed: float = None) -> Tuple[int, int]:
+        """
+        Шаг: движение и широкая фаза в главном процессе, пары полос
+        в пуле, пограничные пары после них в главном процессе
+        :param time_speed: скорость времени, по умолчанию c.TIME_SPEED
+        :return: кол-во пар широкой фазы и касаний
+        """
+        time_speed = c.TIME_SPEED if time_speed is None else time_speed
+        sign = 1 if time_speed > 0 else -1
+        system = self.system
+        # при добавлении шариков система могла заменить массивы
+        if any(getattr(system, attr) is not shared
+               for attr, shared in self.arrays.items()):
+            self._share()
+
+        system.move(time_speed)
+        pairs = grid_pairs(system.pos, system.radius)
+        system.candidates = len(pairs)
+        inner, bounds, border = tile_schedule(system.select(pairs),
+                                              system.pos[:, 0],
+                                              float(system.bounds[0]),
+                                              self.tiles)
+        self.inner, self.border = len(inner), len(border)
+        contacts = 0
+        if self.pool is None:
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                contacts += system.resolve(inner[start:end], sign)
+        elif len(inner):
+            self._pairs_buffer(len(inner))[:len(inner)] = inner
+            layout = (tuple(self.blocks[attr].name for attr in SHARED_ARRAYS),
+                      len(system._radius), self.pairs_block.name,
+                      len(self.pairs), system.use_numba)
+            tasks = [(layout, system.count, int(start), int(end), sign)
+                     for start, end in zip(bounds[:-1], bounds[1:])
+                     if end > start]
+            contacts += sum(self.pool.starmap(_tile_task, tasks))
+        contacts += system.resolve(border, sign)
+        system.contacts = contacts
+        return system.candidates, contacts
+
+    def close(self) -> None:
+        """
+        Остановка пула и возврат системы к обычным массивам
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for attr, block in self.blocks.items():
+            setattr(self.system, attr, np.array(getattr(self.system, attr)))
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        self.arrays = {}
+        if self.pairs_block is not None:
+            self.pairs = np.empty((0, 2), dtype=np.intp)
+            self.pairs_block.close()
+            self.pairs_block.unlink()
+            self.pairs_block = None
+
+    def __enter__(self) -> "TiledStepper":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def scaling(count: int, steps: int, workers_list: list[int], tiles: int,
+            seed: int, min_radius: int = 2, max_radius: int = 5) -> list[dict]:
+    """
+    Замер шага на разном кол-ве процессов и проверка, что после всех шагов
+    позиции, скорости и счетчики побитово совпадают с BallSystem.step.
+    Если не совпадают, max_dev - наибольшее расхождение позиций
+    :param count: кол-во шариков
+    :param steps: кол-во шагов
+    :param workers_list: кол-ва процессов
+    :param tiles: кол-во полос, одинаковое для всех замеров
+    :param seed: зерно генератора шариков
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :return: список результатов
+    """
+    def make() -> BallSystem:
+        return generate_system(*field_size(count), count, min_radius,
+                               max_radius, c.BALL_MIN_VELOCITY,
+                               c.BALL_MAX_VELOCITY, seed)
+
+    reference = make()
+    start = perf_counter()
+    for _ in range(steps):
+        reference.step(1)
+    base = perf_counter() - start
+    results = [{"workers": 0, "tiles": tiles, "cpus": os.cpu_count(),
+                "step_ms": round(base / steps * 1000, 2), "speedup": 1.0,
+                "border_share": "-", "identical": True, "max_dev": 0.}]
+
+    for workers in workers_list:
+        system = make()
+        with TiledStepper(system, workers, tiles) as stepper:
+            # первый шаг запускает процессы пула и подключает их к памяти
+            stepper.step(1)
+            start = perf_counter()
+            for _ in range(steps - 1):
+                stepper.step(1)
+            elapsed = (perf_counter() - start) * steps / max(steps - 1, 1)
+            border_share = stepper.border / max(stepper.inner + stepper.border, 1)
+        identical = all(np.array_equal(getattr(system, name),
+                                       getattr(reference, name))
+                        for name in ("pos", "vel", "collisions"))
+        max_dev = float(np.abs(system.pos - reference.pos).max(initial=0.))
+        results.append({
+            "workers": workers,
+            "tiles": tiles,
+            "cpus": os.cpu_count(),
+            "step_ms": round(elapsed / steps * 1000, 2),
+            "speedup": round(base / elapsed, 2),
+            "border_share": round(border_share, 3),
+            "identical": identical,
+            "max_dev": round(max_dev, 6),
+        })
+    return results
+
+
+def main():
+    """
+    Точка входа CLI замера масштабирования
+    """
+    parser = argparse.ArgumentParser(description="Расчет шагов в нескольких "
+                                                 "процессах")
+    parser.add_argument("--balls", type=int, default=100000,
+                        help="Кол-во шариков")
+    parser.add_argument("--steps", type=int, default=20,
+                        help="Кол-во шагов")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Кол-ва процессов")
+    parser.add_argument("--tiles", type=int, default=None,
+                        help="Кол-во полос, по умолчанию "
+                             "STRIPS_PER_WORKER * наибольшее кол-во процессов")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Зерно генератора шариков")
+    args = parser.parse_args()
+    tiles = args.tiles or STRIPS_PER_WORKER * max(args.workers)
+    print_table(scaling(args.balls, args.steps, args.workers, tiles,
+                        args.seed))
+
+
+if __name__ == '__main__':
+    main()
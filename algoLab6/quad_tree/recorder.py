@@ -0,0 +1,254 @@
+"""
+Файл с записью траекторий шариков в компактный двоичный файл
+и их чтением для воспроизведения без расчета физики.
+
+Формат: заголовок (MAGIC, версия, длина метаданных), метаданные JSON,
+затем кадры: тип, кол-во шариков, длина данных и сами данные.
+Опорный кадр хранит радиусы, позиции и счетчики столкновений,
+обычный - позиции и счетчики, разностный - XOR битов позиций и счетчиков
+с прошлым кадром: у соседних кадров совпадают знак, порядок и старшие биты
+мантиссы, поэтому после XOR остаются в основном нулевые байты, а кадр
+восстанавливается без потерь. Позиции и радиусы хранятся во float32,
+счетчики в uint16.
+Опорный кадр пишется в начале, при смене шариков и раз в KEYFRAME_EVERY кадров
+"""
+import json
+import queue
+import struct
+import threading
+import zlib
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"QTRJ"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")
+FRAME = struct.Struct("<BII")
+KEY = 0
+POS = 1
+DELTA = 2
+KEYFRAME_EVERY = 120
+
+
+def _shuffle(data: np.ndarray) -> bytes:
+    """
+    Перестановка байтов float32: сначала все первые байты чисел, потом
+    вторые и т.д. Похожие числа дают длинные одинаковые участки,
+    которые zlib сжимает намного лучше
+    :param data: массив float32
+    :return: переставленные байты
+    """
+    return data.view(np.uint8).reshape(-1, 4).T.tobytes()
+
+
+def _unshuffle(data: bytes, count: int) -> np.ndarray:
+    """
+    Обратная перестановка байтов float32
+    :param data: переставленные байты
+    :param count: кол-во чисел
+    :return: массив float32
+    """
+    raw = np.frombuffer(data, dtype=np.uint8, count=4 * count)
+    return raw.reshape(4, count).T.copy().view(np.float32).ravel()
+
+
+class TrajectoryRecorder:
+    """
+    Класс записи траекторий. Кадры кодируются и пишутся в фоновом потоке,
+    в отличие от GifSaver кадры не отбрасываются: при переполнении очереди
+    add_frame ждет, иначе воспроизведение разойдется с симуляцией.
+    Ошибка фонового потока (нет места на диске и т.п.) сохраняется
+    и выбрасывается из add_frame и close
+    """
+
+    def __init__(self, path: str, meta: dict = None, delta: bool = True,
+                 compress: bool = True, queue_size: int = 256) -> None:
+        """
+        Конструктор записи траекторий
+        :param path: путь к файлу записи
+        :param meta: метаданные сценария (кол-во шариков, зерно и т.п.)
+        :param delta: хранить XOR с прошлым кадром вместо самих позиций
+        :param compress: сжимать кадры zlib
+        :param queue_size: максимальное кол-во кадров, ожидающих записи
+        """
+        self.path = path
+        self.delta = delta
+        self.compress = compress
+        self.meta = dict(meta or {}, delta=delta, compress=compress)
+        self.frames_count = 0
+        self.bytes_written = 0
+
+        self._prev: Optional[np.ndarray] = None
+        self._prev_collisions: Optional[np.ndarray] = None
+        self._radius: Optional[np.ndarray] = None
+        self._since_key = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._file = open(path, "wb")
+        meta_bytes = json.dumps(self.meta).encode()
+        self._write(HEADER.pack(MAGIC, VERSION, len(meta_bytes)) + meta_bytes)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = threading.Thread(target=self._write_loop, daemon=True)
+        self._worker.start()
+
+    def add_frame(self, pos: np.ndarray, radius: np.ndarray,
+                  collisions: np.ndarray) -> None:
+        """
+        Метод добавления кадра, копирует массивы и отдает их фоновому потоку
+        :param pos: массив позиций (n, 2)
+        :param radius: массив радиусов
+        :param collisions: массив счетчиков столкновений
+        """
+        if self._closed:
+            return
+        if self._error is not None:
+            raise self._error
+        self._queue.put((np.asarray(pos, dtype=np.float32).reshape(-1, 2).copy(),
+                         np.asarray(radius, dtype=np.float32).copy(),
+                         np.clip(collisions, 0, 65535).astype(np.uint16)))
+
+    def _write(self, data: bytes) -> None:
+        """
+        Запись байтов в файл с подсчетом размера
+        :param data: байты
+        """
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def _write_loop(self) -> None:
+        """
+        Цикл фонового потока, кодирующий кадры из очереди
+        """
+        try:
+            while (item := self._queue.get()) is not None:
+                self._write_frame(*item)
+        except Exception as error:
+            self._error = error
+            # очередь дочитывается, чтобы add_frame и close не ждали вечно
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._file.close()
+
+    def _write_frame(self, pos: np.ndarray, radius: np.ndarray,
+                     collisions: np.ndarray) -> None:
+        """
+        Метод кодирования одного кадра
+        :param pos: позиции float32 (n, 2)
+        :param radius: радиусы float32
+        :param collisions: счетчики столкновений uint16
+        """
+        if self._radius is None or self._since_key >= KEYFRAME_EVERY or \
+                not np.array_equal(radius, self._radius):
+            kind, floats = KEY, np.concatenate((radius, pos.ravel()))
+            self._radius = radius
+            self._since_key = 0
+        elif self.delta:
+            kind = DELTA
+            floats = (pos.view(np.uint32) ^
+                      self._prev.view(np.uint32)).view(np.float32).ravel()
+            collisions, self._prev_collisions = \
+                collisions ^ self._prev_collisions, collisions
+            self._since_key += 1
+        else:
+            kind, floats = POS, pos.ravel()
+            self._since_key += 1
+        self._prev = pos
+        if kind != DELTA:
+            self._prev_collisions = collisions
+
+        if self.compress:
+            payload = zlib.compress(_shuffle(floats) + collisions.tobytes(), 1)
+        else:
+            payload = floats.tobytes() + collisions.tobytes()
+        self._write(FRAME.pack(kind, len(radius), len(payload)) + payload)
+        self.frames_count += 1
+
+    def close(self) -> None:
+        """
+        Метод завершения записи, дожидается записи всех кадров из очереди
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "TrajectoryRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        """
+        Метод, вызываемый при удалении экземпляра, завершает запись
+        """
+        # если open в конструкторе упал, очереди и потока нет
+        if getattr(self, "_queue", None) is not None:
+            self.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path: str) -> None:
+        """
+        Класс чтения записанных траекторий
+        :param path: путь к файлу записи
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, meta_len = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} не является записью траекторий")
+        if version != VERSION:
+            raise ValueError(f"Неподдерживаемая версия записи {version}")
+        self.meta = json.loads(self._file.read(meta_len))
+        self._frames_start = self._file.tell()
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Последовательное чтение кадров с начала записи
+        :return: итератор позиций (n, 2), радиусов и счетчиков столкновений
+        """
+        self._file.seek(self._frames_start)
+        compress = self.meta.get("compress", False)
+        pos = radius = prev_collisions = None
+        while len(head := self._file.read(FRAME.size)) == FRAME.size:
+            kind, count, length = FRAME.unpack(head)
+            payload = self._file.read(length)
+            if compress:
+                payload = zlib.decompress(payload)
+            n_floats = (3 if kind == KEY else 2) * count
+            if compress:
+                floats = _unshuffle(payload, n_floats)
+            else:
+                floats = np.frombuffer(payload, dtype=np.float32,
+                                       count=n_floats)
+            collisions = np.frombuffer(payload, dtype=np.uint16,
+                                       offset=4 * n_floats, count=count)
+            if kind == KEY:
+                radius = floats[:count]
+                pos = floats[count:].reshape(-1, 2)
+            elif kind == DELTA:
+                pos = (pos.view(np.uint32) ^ floats.view(np.uint32).reshape(-1, 2)
+                       ).view(np.float32)
+                collisions = collisions ^ prev_collisions
+            else:
+                pos = floats.reshape(-1, 2)
+            prev_collisions = collisions
+            yield pos, radius, collisions
+
+    def close(self) -> None:
+        """
+        Закрытие файла записи
+        """
+        self._file.close()
+
+    def __enter__(self) -> "TrajectoryReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,159 @@
+"""
+Файл с воспроизведением записанных траекторий: шарики рисуются прямо
+из записи, физика не считается. Сценарий из метаданных записи можно
+повторить на других широких фазах и сравнить их скорость и траектории
+
+Запуск: python -m quad_tree.replay run.qtrj
+        python -m quad_tree.replay run.qtrj --compare quadtree grid vector
+        python -m quad_tree.replay run.qtrj --window --fps 60
+"""
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame as pg
+
+import quad_tree.consts as c
+from quad_tree.figures import TextBlock
+from quad_tree.recorder import TrajectoryReader
+from quad_tree.simulation import ENGINES, Simulation
+from quad_tree.sprites import draw_arrays
+
+
+def replay_headless(path: str) -> dict:
+    """
+    Воспроизведение записи в поверхность в памяти с замером
+    времени чтения и отрисовки кадров
+    :param path: путь к файлу записи
+    :return: словарь результатов
+    """
+    pg.init()
+    with TrajectoryReader(path) as reader:
+        screen = pg.Surface(reader.meta.get("field", (c.WIDTH, c.HEIGHT)))
+        frames = 0
+        decode_time = render_time = 0.
+        start = perf_counter()
+        for pos, radius, collisions in reader:
+            render_start = perf_counter()
+            decode_time += render_start - start
+            screen.fill((0, 0, 0))
+            draw_arrays(screen, pos, radius, collisions)
+            start = perf_counter()
+            render_time += start - render_start
+            frames += 1
+    pg.quit()
+    return {
+        "frames": frames,
+        "balls": reader.meta.get("balls"),
+        "file_bytes": os.path.getsize(path),
+        "decode_ms": round(decode_time / max(frames, 1) * 1000, 3),
+        "render_ms": round(render_time / max(frames, 1) * 1000, 3),
+        "replay_fps": round(frames / max(decode_time + render_time, 1e-9), 1),
+    }
+
+
+def compare(path: str, engines: list[str]) -> list[dict]:
+    """
+    Повтор сценария записи на каждой широкой фазе: замер шагов и
+    наибольшее отклонение позиций от записи
+    :param path: путь к файлу записи
+    :param engines: широкие фазы
+    :return: список результатов
+    """
+    results = []
+    with TrajectoryReader(path) as reader:
+        meta = reader.meta
+        for engine in engines:
+            sim = Simulation.generate(meta["balls"], engine, meta["dt"],
+                                      meta["seed"], meta["min_radius"],
+                                      meta["max_radius"],
+                                      tuple(meta["field"]), meta["ccd"])
+            frames = iter(reader)
+            # первый кадр записи - состояние до первого шага
+            next(frames, None)
+            steps = 0
+            max_dev = 0.
+            elapsed = 0.
+            for pos, _, _ in frames:
+                start = perf_counter()
+                sim.step()
+                elapsed += perf_counter() - start
+                steps += 1
+                max_dev = max(max_dev, float(np.abs(
+                    sim.snapshot()[0] - pos).max(initial=0.)))
+            results.append({
+                "broad_phase": engine,
+                "steps": steps,
+                "steps_per_s": round(steps / max(elapsed, 1e-9), 2),
+                "max_dev": round(max_dev, 4),
+            })
+    return results
+
+
+def replay_window(path: str, fps: int) -> None:
+    """
+    Воспроизведение записи в окне, пробел - пауза
+    :param path: путь к файлу записи
+    :param fps: кол-во кадров в секунду
+    """
+    pg.init()
+    with TrajectoryReader(path) as reader:
+        width, height = reader.meta.get("field", (c.WIDTH, c.HEIGHT))
+        screen = pg.display.set_mode((width, height))
+        pg.display.set_caption("Воспроизведение записи")
+        text_block = TextBlock()
+        paused = False
+        frames = iter(reader)
+        frame = next(frames, None)
+        number = 0
+        while frame is not None:
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    pg.quit()
+                    return
+                if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+                    paused = not paused
+            screen.fill((0, 0, 0))
+            draw_arrays(screen, *frame)
+            text_block.render(screen, [f"Frame: {number}",
+                                       f"Balls count: {len(frame[0])}"])
+            pg.display.update()
+            text_block.tick(fps)
+            if not paused:
+                frame = next(frames, None)
+                number += 1
+    pg.quit()
+
+
+def main():
+    """
+    Точка входа CLI воспроизведения
+    """
+    parser = argparse.ArgumentParser(description="Воспроизведение траекторий")
+    parser.add_argument("path", help="Файл записи")
+    parser.add_argument("--compare", nargs="+", choices=ENGINES,
+                        help="Повторить сценарий на широких фазах")
+    parser.add_argument("--window", action="store_true",
+                        help="Показать запись в окне")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="Кадров в секунду в окне")
+    args = parser.parse_args()
+    if args.window:
+        replay_window(args.path, args.fps)
+        return
+    result = replay_headless(args.path)
+    if args.compare:
+        result["compare"] = compare(args.path, args.compare)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    if "--window" not in sys.argv:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    main()
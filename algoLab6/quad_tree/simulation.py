@@ -0,0 +1,400 @@
+"""
+Файл с ядром симуляции, независимым от окна и часов pygame:
+шаг с фиксированной скоростью времени, широкая и узкая фазы
+с замером времени. При запуске как модуля - бенчмарк с выводом JSON
+
+Запуск: python -m quad_tree.simulation --balls 10000 --steps 100 --broad_phase grid
+        python -m quad_tree.simulation --balls 1000 --record run.qtrj
+"""
+import argparse
+import json
+import math
+import os
+from time import perf_counter
+from typing import List, Optional
+
+# приветствие pygame печатается в stdout и ломает JSON бенчмарка
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame as pg
+
+import quad_tree.consts as c
+from quad_tree.ball_system import BallSystem, BallView, grid_pairs
+from quad_tree.balls_generator import generate_balls
+from quad_tree.ccd import advance, swept_pairs
+from quad_tree.configer import Config
+from quad_tree.figures import Ball, Vec2
+from quad_tree.recorder import TrajectoryRecorder
+from quad_tree.spatial_hash import BROAD_PHASES, make_broad_phase
+from quad_tree.sprites import draw_balls, draw_system
+
+# широкая фаза векторизованной системы шариков
+VECTOR = "vector"
+ENGINES = (*BROAD_PHASES, VECTOR)
+# кол-во шариков, для которых поле имеет размер c.WIDTH x c.HEIGHT,
+# для большего кол-ва поле растет так, чтобы плотность не менялась
+BASE_COUNT = 1000
+
+
+def field_size(count: int) -> tuple[int, int]:
+    """
+    Размер поля, при котором плотность шариков такая же,
+    как у BASE_COUNT шариков на поле c.WIDTH x c.HEIGHT
+    :param count: кол-во шариков
+    :return: ширина и высота
+    """
+    scale = math.sqrt(max(count / BASE_COUNT, 1))
+    return int(c.WIDTH * scale), int(c.HEIGHT * scale)
+
+
+class Simulation:
+    def __init__(self, screen: pg.Surface, balls: List[Ball] = None,
+                 broad_phase: str = None, time_speed: float = None,
+                 system: BallSystem = None, ccd: bool = None,
+                 config: Config = None) -> None:
+        """
+        Класс ядра симуляции: шарики, широкая фаза и статистика шагов.
+        Окно не нужно, screen может быть поверхностью в памяти
+        :param screen: поверхность, на которую рисуются шарики
+        :param balls: шарики, для векторной системы - ее представления
+        :param broad_phase: "quadtree", "grid" или "vector",
+        по умолчанию - из конфига
+        :param time_speed: фиксированная скорость времени за шаг,
+        по умолчанию на каждом шаге берется скорость из конфига
+        :param system: готовая система шариков для "vector"
+        :param ccd: непрерывное обнаружение столкновений,
+        по умолчанию - из конфига
+        :param config: снимок конфигурации, по умолчанию значения из consts
+        """
+        self.screen = screen
+        self.config = config or Config.from_consts()
+        self.engine = broad_phase or self.config.broad_phase
+        if self.engine not in ENGINES:
+            raise ValueError(f"Неизвестная широкая фаза {self.engine!r}, "
+                             f"доступны: {', '.join(ENGINES)}")
+        self.time_speed = time_speed
+        self.ccd = self.config.ccd if ccd is None else ccd
+        self.system = None
+        self.broad_phase = None
+        if self.engine == VECTOR:
+            width, height = screen.get_size()
+            self.system = system or BallSystem.from_balls(balls or [],
+                                                          width, height)
+            self.balls = self.system.make_views(screen)
+        else:
+            self.balls = list(balls or [])
+            self.broad_phase = make_broad_phase(screen, self.engine,
+                                                self.config)
+            self.broad_phase.upd(self.balls)
+        # кол-во пар широкой фазы и касаний на последнем шаге
+        self.candidates = 0
+        self.contacts = 0
+        self.stats = {"steps": 0, "move_s": 0., "broad_s": 0.,
+                      "narrow_s": 0., "candidates": 0, "contacts": 0}
+        # запись траекторий, кадр пишется после каждого шага
+        self.recorder = None
+
+    @classmethod
+    def generate(cls, count: int, broad_phase: str = None,
+                 time_speed: float = None, seed: int = None,
+                 min_radius: int = None, max_radius: int = None,
+                 size: tuple[int, int] = None,
+                 ccd: bool = None, config: Config = None) -> "Simulation":
+        """
+        Создание симуляции со случайными шариками без окна
+        :param count: кол-во шариков
+        :param broad_phase: "quadtree", "grid" или "vector"
+        :param time_speed: фиксированная скорость времени за шаг
+        :param seed: зерно генератора шариков
+        :param min_radius: минимальный радиус, по умолчанию из конфига
+        :param max_radius: максимальный радиус, по умолчанию из конфига
+        :param size: размер поля, по умолчанию растет с кол-вом шариков
+        :param ccd: непрерывное обнаружение столкновений
+        :param config: снимок конфигурации, по умолчанию значения из consts
+        :return: симуляция
+        """
+        config = config or Config.from_consts()
+        width, height = size or field_size(count)
+        config = config.replace(
+            width=width, height=height,
+            ball_min_radius=min_radius or config.ball_min_radius,
+            ball_max_radius=max_radius or config.ball_max_radius)
+        pg.font.init()
+        screen = pg.Surface((width, height))
+        # шарики генерируются одинаково для всех широких фаз,
+        # чтобы при одном зерне сценарий был один и тот же
+        balls = generate_balls(screen, count, config.ball_min_radius,
+                               config.ball_max_radius,
+                               config.ball_min_velocity,
+                               config.ball_max_velocity, seed)
+        return cls(screen, balls, broad_phase, time_speed, ccd=ccd,
+                   config=config)
+
+    def add_ball(self, pos_x: float, pos_y: float, velocity: Vec2,
+                 radius: float) -> Ball:
+        """
+        Добавление шарика
+        :param pos_x: позиция центра по x
+        :param pos_y: позиция центра по y
+        :param velocity: вектор скорости
+        :param radius: радиус
+        :return: новый шарик или его представление
+        """
+        b_id = len(self.balls)
+        if self.system is not None:
+            ind = self.system.add(pos_x, pos_y, velocity.x, velocity.y,
+                                  radius, b_id)
+            ball = BallView(self.system, ind, self.screen)
+        else:
+            ball = Ball(self.screen, pos_x, pos_y, velocity, radius, b_id)
+        self.balls.append(ball)
+        return ball
+
+    def pop_ball(self) -> None:
+        """
+        Удаление последнего добавленного шарика
+        """
+        if not self.balls:
+            return
+        if self.system is not None:
+            self.system.remove(self.system.count - 1)
+        else:
+            self.balls.pop()
+
+    def sync(self) -> None:
+        """
+        Обновление широкой фазы без шага, например после добавления
+        шарика на паузе, чтобы отрисовка структуры была актуальной
+        """
+        if self.broad_phase is not None:
+            self.broad_phase.upd(self.balls)
+
+    def set_config(self, config: Config) -> None:
+        """
+        Замена снимка конфигурации между шагами. Если поменялись параметры
+        широкой фазы, структура строится заново; размер поля и параметры
+        генерации шариков действуют только при следующем запуске
+        :param config: новый снимок конфигурации
+        """
+        old, self.config = self.config, config
+        if old.ccd != config.ccd:
+            self.ccd = config.ccd
+        if self.broad_phase is None:
+            return
+        if config.broad_phase != old.broad_phase and \
+                config.broad_phase in BROAD_PHASES:
+            self.engine = config.broad_phase
+        elif (old.node_capacity, old.ball_radius, old.ball_max_radius) == \
+                (config.node_capacity, config.ball_radius,
+                 config.ball_max_radius):
+            return
+        self.broad_phase = make_broad_phase(self.screen, self.engine, config)
+        self.broad_phase.upd(self.balls)
+
+    def step(self) -> None:
+        """
+        Один шаг симуляции: движение, широкая фаза и обработка касаний
+        """
+        time_speed = self.config.time_speed if self.time_speed is None \
+            else self.time_speed
+        start = perf_counter()
+        if self.ccd:
+            pairs, contacts, broad_start, narrow_start = \
+                self._ccd_step(time_speed)
+        elif self.system is not None:
+            self.system.move(time_speed)
+            broad_start = perf_counter()
+            pairs = grid_pairs(self.system.pos, self.system.radius)
+            narrow_start = perf_counter()
+            contacts = self.system.collide(pairs, time_speed)
+        else:
+            for ball in self.balls:
+                ball.step(time_speed)
+            broad_start = perf_counter()
+            self.broad_phase.upd(self.balls)
+            pairs = self.broad_phase.find_pairs()
+            narrow_start = perf_counter()
+            contacts = 0
+            for ball1, ball2 in pairs:
+                if ball1.collide(ball2, time_speed):
+                    contacts += 1
+        end = perf_counter()
+
+        self.candidates, self.contacts = len(pairs), contacts
+        stats = self.stats
+        stats["steps"] += 1
+        stats["move_s"] += broad_start - start
+        stats["broad_s"] += narrow_start - broad_start
+        stats["narrow_s"] += end - narrow_start
+        stats["candidates"] += len(pairs)
+        stats["contacts"] += contacts
+        if self.recorder is not None:
+            self.recorder.add_frame(*self.snapshot())
+
+    def snapshot(self) -> tuple:
+        """
+        Текущее состояние шариков в массивах
+        :return: позиции (n, 2), радиусы и счетчики столкновений
+        """
+        if self.system is not None:
+            return self.system.pos, self.system.radius, self.system.collisions
+        balls = self.balls
+        pos = np.array([(ball.pos_x, ball.pos_y) for ball in balls],
+                       dtype=np.float64).reshape(-1, 2)
+        radius = np.array([ball.radius for ball in balls], dtype=np.float64)
+        collisions = np.array([ball.collisions_count for ball in balls],
+                              dtype=np.int64)
+        return pos, radius, collisions
+
+    def _ccd_step(self, time_speed: float) -> tuple:
+        """
+        Шаг с непрерывным обнаружением столкновений: пары ищутся
+        по путям шариков за шаг, касания обрабатываются по времени.
+        Обычные шарики на время шага переносятся в массивы
+        :param time_speed: скорость времени за шаг
+        :return: пары, кол-во касаний и время начала широкой и узкой фаз
+        """
+        system = self.system
+        if system is not None:
+            pos, vel, radius = system.pos, system.vel, system.radius
+            mass, collisions = system.mass, system.collisions
+            bounds = system.bounds
+        else:
+            balls = self.balls
+            pos, radius, collisions = self.snapshot()
+            vel = np.array([(ball.velocity.x, ball.velocity.y)
+                            for ball in balls],
+                           dtype=np.float64).reshape(-1, 2)
+            mass = np.array([ball.mass for ball in balls], dtype=np.float64)
+            bounds = self.screen.get_size()
+
+        broad_start = perf_counter()
+        pairs = swept_pairs(pos, vel, radius, time_speed)
+        narrow_start = perf_counter()
+        contacts = advance(pos, vel, radius, mass, collisions, bounds,
+                           pairs, time_speed)
+
+        if system is None:
+            for ball, (pos_x, pos_y), (vel_x, vel_y), count in zip(
+                    balls, pos.tolist(), vel.tolist(), collisions.tolist()):
+                ball.pos_x, ball.pos_y = pos_x, pos_y
+                ball.velocity = Vec2(vel_x, vel_y)
+                ball.collisions_count = count
+            # структура нужна для отрисовки и для обычных шагов
+            self.broad_phase.upd(balls)
+        return pairs, contacts, broad_start, narrow_start
+
+    def run(self, steps: int) -> dict:
+        """
+        Выполнение нескольких шагов подряд
+        :param steps: кол-во шагов
+        :return: накопленная статистика
+        """
+        for _ in range(steps):
+            self.step()
+        return self.stats
+
+    def render(self, with_broad_phase: bool = False) -> List[pg.Rect]:
+        """
+        Пакетная отрисовка шариков и, если нужно, структуры широкой фазы
+        :param with_broad_phase: рисовать ли дерево или сетку
+        :return: прямоугольники нарисованных шариков
+        """
+        if self.system is not None:
+            rects = draw_system(self.screen, self.system, self.config)
+        else:
+            rects = draw_balls(self.screen, self.balls, self.config)
+        if with_broad_phase and self.broad_phase is not None:
+            self.broad_phase.render()
+        return rects
+
+
+def benchmark(count: int, steps: int, broad_phase: str,
+              time_speed: float = 1., seed: Optional[int] = 0,
+              min_radius: int = 2, max_radius: int = 5,
+              ccd: bool = False, record: str = None,
+              delta: bool = True) -> dict:
+    """
+    Замер шагов симуляции без окна
+    :param count: кол-во шариков
+    :param steps: кол-во шагов
+    :param broad_phase: "quadtree", "grid" или "vector"
+    :param time_speed: скорость времени за шаг
+    :param seed: зерно генератора шариков
+    :param min_radius: минимальный радиус шарика
+    :param max_radius: максимальный радиус шарика
+    :param ccd: непрерывное обнаружение столкновений
+    :param record: путь к файлу записи траекторий, без него запись не ведется
+    :param delta: хранить в записи XOR позиций с прошлым кадром
+    :return: словарь результатов
+    """
+    sim = Simulation.generate(count, broad_phase, time_speed, seed,
+                              min_radius, max_radius, ccd=ccd)
+    if record:
+        # по метаданным сценарий можно повторить на другой широкой фазе
+        sim.recorder = TrajectoryRecorder(record, {
+            "balls": count, "broad_phase": broad_phase, "ccd": ccd,
+            "dt": time_speed, "seed": seed, "min_radius": min_radius,
+            "max_radius": max_radius,
+            "field": [sim.config.width, sim.config.height],
+        }, delta)
+        sim.recorder.add_frame(*sim.snapshot())
+    start = perf_counter()
+    stats = sim.run(steps)
+    elapsed = perf_counter() - start
+    result = {
+        "balls": count,
+        "broad_phase": broad_phase,
+        "ccd": ccd,
+        "steps": steps,
+        "field": [sim.config.width, sim.config.height],
+        "total_s": round(elapsed, 4),
+        "steps_per_s": round(steps / elapsed, 2),
+        "move_ms": round(stats["move_s"] / steps * 1000, 3),
+        "broad_ms": round(stats["broad_s"] / steps * 1000, 3),
+        "narrow_ms": round(stats["narrow_s"] / steps * 1000, 3),
+        "candidates_per_step": round(stats["candidates"] / steps, 1),
+        "contacts_per_step": round(stats["contacts"] / steps, 1),
+    }
+    if sim.recorder is not None:
+        sim.recorder.close()
+        result["record_bytes"] = sim.recorder.bytes_written
+    return result
+
+
+def main():
+    """
+    Точка входа CLI бенчмарка симуляции
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк ядра симуляции")
+    parser.add_argument("--balls", type=int, default=1000,
+                        help="Кол-во шариков")
+    parser.add_argument("--steps", type=int, default=100,
+                        help="Кол-во шагов")
+    parser.add_argument("--broad_phase", choices=ENGINES, default="grid",
+                        help="Широкая фаза")
+    parser.add_argument("--dt", type=float, default=1.,
+                        help="Скорость времени за шаг")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Зерно генератора шариков")
+    parser.add_argument("--min_radius", type=int, default=2,
+                        help="Минимальный радиус шарика")
+    parser.add_argument("--max_radius", type=int, default=5,
+                        help="Максимальный радиус шарика")
+    parser.add_argument("--ccd", action="store_true",
+                        help="Непрерывное обнаружение столкновений")
+    parser.add_argument("--record", default=None,
+                        help="Файл для записи траекторий")
+    parser.add_argument("--no_delta", action="store_true",
+                        help="Хранить в записи сами позиции, а не XOR с прошлым кадром")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.balls, args.steps, args.broad_phase,
+                               args.dt, args.seed, args.min_radius,
+                               args.max_radius, args.ccd, args.record,
+                               not args.no_delta), indent=2))
+
+
+if __name__ == '__main__':
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    main()
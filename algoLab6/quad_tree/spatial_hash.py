@@ -0,0 +1,134 @@
+"""
+Файл в котором реализована равномерная сетка (пространственный хэш)
+для широкой фазы поиска столкновений - альтернатива квадродереву
+для множества шариков близкого размера
+"""
+
+
+from typing import Dict, List, Tuple
+
+from quad_tree.figures import Ball, Box
+from quad_tree.tree import QuadTree
+import quad_tree.consts as c
+import pygame as pg
+
+Cell = Tuple[int, int]
+# шарик и первая ячейка, которую он пересекает
+Entry = Tuple[Ball, int, int]
+
+
+class SpatialHashGrid:
+    def __init__(self, screen: pg.display, cell_size: float = None) -> None:
+        """
+        Класс равномерной сетки: шарик попадает во все ячейки,
+        которые пересекает его ограничивающий квадрат
+        :param screen: экран, куда рисуется сетка
+        :param cell_size: сторона ячейки, по умолчанию - диаметр
+        самого большого шарика, тогда шарик лежит не более чем в 4 ячейках
+        """
+        self.screen = screen
+        self.cell_size = cell_size or max(2 * c.BALL_MAX_RADIUS, 1)
+        self.cells: Dict[Cell, List[Entry]] = {}
+        # кол-во проверенных пар и настоящих касаний при последнем поиске
+        self.candidates = 0
+        self.contacts = 0
+
+    def cell_range(self, ball: Ball) -> Tuple[int, int, int, int]:
+        """
+        Диапазон ячеек, которые пересекает шарик
+        :param ball: шарик
+        :return: первая и последняя ячейки по x и по y
+        """
+        size = self.cell_size
+        return (int((ball.pos_x - ball.radius) // size),
+                int((ball.pos_y - ball.radius) // size),
+                int((ball.pos_x + ball.radius) // size),
+                int((ball.pos_y + ball.radius) // size))
+
+    def insert(self, ball: Ball) -> None:
+        """
+        Метод вставки шарика во все пересекаемые им ячейки
+        :param ball: вставляемый шарик
+        """
+        x_0, y_0, x_1, y_1 = self.cell_range(ball)
+        entry = ball, x_0, y_0
+        cells = self.cells
+        for c_x in range(x_0, x_1 + 1):
+            for c_y in range(y_0, y_1 + 1):
+                cell = cells.get((c_x, c_y))
+                if cell is None:
+                    cells[c_x, c_y] = [entry]
+                else:
+                    cell.append(entry)
+
+    def find_pairs(self) -> List[Tuple[Ball, Ball]]:
+        """
+        Метод отбора пар шариков на проверку пересечений: шарики сравниваются
+        попарно внутри каждой ячейки. Пара, лежащая в нескольких общих ячейках,
+        берется только в первой общей ячейке, поэтому попадает в список один раз
+        :return: список пар
+        """
+        pairs = []
+        for (c_x, c_y), entries in self.cells.items():
+            if len(entries) < 2:
+                continue
+            for i, (ball1, x_1, y_1) in enumerate(entries):
+                for j in range(i + 1, len(entries)):
+                    ball2, x_2, y_2 = entries[j]
+                    if max(x_1, x_2) == c_x and max(y_1, y_2) == c_y:
+                        pairs.append((ball1, ball2))
+        return pairs
+
+    def find_intersections(self) -> List[Tuple[Ball, Ball]]:
+        """
+        Метод поиска и обработки пересечений
+        :return: список проверенных пар
+        """
+        pairs = self.find_pairs()
+        contacts = 0
+        for ball1, ball2 in pairs:
+            if ball1.collide(ball2):
+                contacts += 1
+        self.candidates, self.contacts = len(pairs), contacts
+        return pairs
+
+    def render(self) -> None:
+        """
+        Метод отрисовки занятых ячеек сетки
+        """
+        size = self.cell_size
+        for c_x, c_y in self.cells:
+            Box(c_x * size, c_y * size, size, size).render(self.screen)
+
+    def upd(self, balls: List[Ball]) -> None:
+        """
+        Метод обновления сетки списком шаров
+        :param balls: все шарики сцены
+        """
+        self.cells.clear()
+        for ball in balls:
+            self.insert(ball)
+
+
+BROAD_PHASES = {"quadtree": QuadTree, "grid": SpatialHashGrid}
+
+
+def make_broad_phase(screen: pg.display, name: str = None, config=None):
+    """
+    Создание структуры широкой фазы по имени из конфига
+    :param screen: экран, куда рисуется структура
+    :param name: "quadtree" или "grid", по умолчанию - c.BROAD_PHASE
+    :param config: снимок конфигурации, из него берутся вместимость
+    листа и размеры шариков, по умолчанию значения из consts
+    :return: квадродерево или сетка
+    """
+    name = name or (c.BROAD_PHASE if config is None else config.broad_phase)
+    if name not in BROAD_PHASES:
+        raise ValueError(f"Неизвестная широкая фаза {name!r}, "
+                         f"доступны: {', '.join(BROAD_PHASES)}")
+    if config is None:
+        return BROAD_PHASES[name](screen)
+    if name == "grid":
+        return SpatialHashGrid(screen, max(2 * config.ball_max_radius, 1))
+    return QuadTree(screen, Box(0, 0, *screen.get_size()),
+                    config.node_capacity, config.ball_radius)
@@ -0,0 +1,205 @@
+"""
+Файл с кэшем спрайтов шариков и пакетной отрисовкой:
+круг каждого радиуса и оттенка рисуется один раз, дальше шарики
+выводятся одним вызовом Surface.blits, подписи используют общий шрифт
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pygame as pg
+
+import quad_tree.consts as c
+
+# на сколько оттенков делится переход от BALL_COLOR к BALL_COLOR_INV
+COLOR_STEPS = 32
+
+_sprites: Dict[Tuple[int, int, tuple], pg.Surface] = {}
+_labels: Dict[int, pg.Surface] = {}
+_font = None
+
+
+def color_step(collisions_count: int, max_collisions: int = None) -> int:
+    """
+    Номер оттенка шарика по кол-ву столкновений
+    :param collisions_count: кол-во столкновений
+    :param max_collisions: кол-во столкновений до полной смены цвета,
+    по умолчанию c.MAX_COLLISIONS
+    :return: число от 0 до COLOR_STEPS
+    """
+    max_collisions = max_collisions or c.MAX_COLLISIONS
+    progress = min(max(collisions_count, 0) / max_collisions, 1.0)
+    return round(progress * COLOR_STEPS)
+
+
+def step_color(step: int, colors: Tuple[tuple, tuple] = None
+               ) -> Tuple[int, int, int]:
+    """
+    Цвет оттенка: линейный переход от BALL_COLOR к BALL_COLOR_INV
+    :param step: номер оттенка
+    :param colors: начальный и конечный цвета,
+    по умолчанию c.BALL_COLOR и c.BALL_COLOR_INV
+    :return: цвет RGB
+    """
+    progress = step / COLOR_STEPS
+    ball_color, ball_color_inv = colors or (c.BALL_COLOR, c.BALL_COLOR_INV)
+    return tuple(int((1 - progress) * base + progress * inv)
+                 for base, inv in zip(ball_color, ball_color_inv))
+
+
+def config_colors(config=None) -> Tuple[tuple, tuple]:
+    """
+    Начальный и конечный цвета шариков из снимка конфигурации
+    :param config: снимок конфигурации, по умолчанию значения из consts
+    :return: пара цветов
+    """
+    if config is None:
+        return c.BALL_COLOR, c.BALL_COLOR_INV
+    return config.ball_color, config.ball_color_inv
+
+
+def ball_sprite(radius: float, step: int,
+                colors: Tuple[tuple, tuple] = None) -> pg.Surface:
+    """
+    Спрайт шарика из кэша, ключ - округленный радиус и номер оттенка
+    (и цвета из конфига, чтобы их смена не портила кэш)
+    :param radius: радиус шарика
+    :param step: номер оттенка
+    :param colors: начальный и конечный цвета,
+    по умолчанию c.BALL_COLOR и c.BALL_COLOR_INV
+    :return: поверхность с кругом и прозрачным фоном
+    """
+    radius = max(int(round(radius)), 1)
+    colors = colors or (c.BALL_COLOR, c.BALL_COLOR_INV)
+    key = radius, step, colors
+    sprite = _sprites.get(key)
+    if sprite is None:
+        sprite = pg.Surface((2 * radius, 2 * radius), pg.SRCALPHA)
+        pg.draw.circle(sprite, step_color(step, colors), (radius, radius),
+                       radius)
+        if pg.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        _sprites[key] = sprite
+    return sprite
+
+
+def shared_font() -> pg.font.Font:
+    """
+    Общий для всех шариков шрифт подписей
+    :return: шрифт
+    """
+    global _font
+    if _font is None:
+        _font = pg.font.SysFont("Comic Sans", 12)
+    return _font
+
+
+def ball_label(b_id: int) -> pg.Surface:
+    """
+    Подпись с айди шарика из кэша
+    :param b_id: айди шарика
+    :return: поверхность с текстом
+    """
+    label = _labels.get(b_id)
+    if label is None:
+        label = shared_font().render(str(b_id), True, (0, 0, 0))
+        _labels[b_id] = label
+    return label
+
+
+def _with_labels(screen: pg.Surface, rects: List[pg.Rect],
+                 b_ids: List[int]) -> None:
+    """
+    Вывод подписей по центрам уже нарисованных шариков
+    :param screen: поверхность
+    :param rects: прямоугольники шариков
+    :param b_ids: айди шариков
+    """
+    seq = []
+    for rect, b_id in zip(rects, b_ids):
+        label = ball_label(b_id)
+        seq.append((label, label.get_rect(center=rect.center)))
+    screen.blits(seq, doreturn=False)
+
+
+def draw_balls(screen: pg.Surface, balls: list, config=None) -> List[pg.Rect]:
+    """
+    Пакетная отрисовка шариков, счетчики столкновений
+    ограничиваются так же, как в Ball.render. Значения конфига
+    читаются один раз за кадр
+    :param screen: поверхность
+    :param balls: шарики
+    :param config: снимок конфигурации, по умолчанию значения из consts
+    :return: прямоугольники нарисованных шариков
+    """
+    if config is None:
+        max_collisions, is_render_nums = c.MAX_COLLISIONS, c.IS_RENDER_NUMS
+    else:
+        max_collisions = config.max_collisions
+        is_render_nums = config.is_render_nums
+    colors = config_colors(config)
+    scale = COLOR_STEPS / max_collisions
+    sprite_for = ball_sprite
+    seq = []
+    append = seq.append
+    for ball in balls:
+        count = ball.collisions_count
+        if not 0 <= count <= max_collisions:
+            count = min(max(count, 0), max_collisions)
+            ball.collisions_count = count
+        sprite = sprite_for(ball.radius, round(count * scale), colors)
+        half = sprite.get_width() / 2
+        append((sprite, (ball.pos_x - half, ball.pos_y - half)))
+    rects = screen.blits(seq)
+    if is_render_nums:
+        _with_labels(screen, rects, [ball.b_id for ball in balls])
+    return rects
+
+
+def draw_arrays(screen: pg.Surface, pos: np.ndarray, radius: np.ndarray,
+                collisions: np.ndarray, b_ids: List[int] = None,
+                config=None) -> List[pg.Rect]:
+    """
+    Пакетная отрисовка шариков из массивов позиций, радиусов
+    и счетчиков столкновений
+    :param screen: поверхность
+    :param pos: массив позиций (n, 2)
+    :param radius: массив радиусов
+    :param collisions: массив счетчиков столкновений
+    :param b_ids: айди шариков для подписей, без них подписей нет
+    :param config: снимок конфигурации, по умолчанию значения из consts
+    :return: прямоугольники нарисованных шариков
+    """
+    if config is None:
+        max_collisions, is_render_nums = c.MAX_COLLISIONS, c.IS_RENDER_NUMS
+    else:
+        max_collisions = config.max_collisions
+        is_render_nums = config.is_render_nums
+    colors = config_colors(config)
+    counts = np.clip(collisions, 0, max_collisions)
+    steps = np.rint(counts * (COLOR_STEPS / max_collisions)).astype(int)
+    sizes = np.maximum(np.rint(radius), 1)
+    corners = pos - sizes[:, None]
+    seq = [(ball_sprite(size, step, colors), corner)
+           for size, step, corner in zip(sizes.tolist(), steps.tolist(),
+                                         corners.tolist())]
+    rects = screen.blits(seq)
+    if is_render_nums and b_ids is not None:
+        _with_labels(screen, rects, b_ids)
+    return rects
+
+
+def draw_system(screen: pg.Surface, system, config=None) -> List[pg.Rect]:
+    """
+    Пакетная отрисовка векторизованной системы шариков
+    прямо из ее массивов, без обращения к представлениям
+    :param screen: поверхность
+    :param system: система шариков
+    :param config: снимок конфигурации, по умолчанию значения из consts
+    :return: прямоугольники нарисованных шариков
+    """
+    collisions = system.collisions
+    max_collisions = c.MAX_COLLISIONS if config is None else \
+        config.max_collisions
+    np.clip(collisions, 0, max_collisions, out=collisions)
+    return draw_arrays(screen, system.pos, system.radius, collisions,
+                       system.b_ids, config)
@@ -0,0 +1,69 @@
+"""Тесты для непрерывного обнаружения столкновений
+
+Запуск из algoLab6: python -m unittest quad_tree.tests
+"""
+
+import unittest
+
+import numpy as np
+
+from quad_tree.ccd import advance, swept_pairs
+
+
+def ccd_step(pos: np.ndarray, vel: np.ndarray, radius: np.ndarray,
+             mass: np.ndarray, collisions: np.ndarray, bounds: tuple,
+             time_speed: float) -> None:
+    """
+    Шаг CCD так же, как в Simulation: пары из swept_pairs, потом advance
+    """
+    pairs = swept_pairs(pos, vel, radius, time_speed)
+    advance(pos, vel, radius, mass, collisions, bounds, pairs, time_speed)
+
+
+def max_overlap(pos: np.ndarray, radius: np.ndarray) -> float:
+    """
+    Наибольшее перекрытие пары шариков
+    """
+    delta = pos[:, None] - pos[None]
+    dist = np.hypot(delta[..., 0], delta[..., 1])
+    overlap = radius[:, None] + radius[None] - dist
+    np.fill_diagonal(overlap, -np.inf)
+    return float(overlap.max())
+
+
+class TestCCD(unittest.TestCase):
+    def test_chain(self):
+        """
+        Разогнанный столкновением шарик не пролетает сквозь шарик,
+        которого не было в парах начала шага
+        """
+        pos = np.array([[50., 100.], [100., 100.], [400., 100.]])
+        vel = np.array([[1000., 0.], [0., 0.], [0., 0.]])
+        radius = np.full(3, 10.)
+        collisions = np.zeros(3, dtype=np.int64)
+        pairs = swept_pairs(pos, vel, radius, 0.5).tolist()
+        self.assertNotIn([1, 2], pairs)
+        ccd_step(pos, vel, radius, np.ones(3), collisions, (1000, 200), 0.5)
+        self.assertEqual(collisions.tolist(), [1, 2, 1])
+        self.assertEqual(vel[:, 0].tolist(), [0., 0., 1000.])
+        self.assertLess(pos[1, 0], pos[2, 0])
+
+    def test_no_overlaps(self):
+        """
+        В плотной сетке шариков разной массы после каждого шага
+        нет перекрытий
+        """
+        rng = np.random.default_rng(0)
+        xs, ys = np.meshgrid(np.arange(15, 300, 30.), np.arange(15, 180, 30.))
+        pos = np.stack((xs.ravel(), ys.ravel()), axis=1)
+        vel = rng.normal(0, 80, pos.shape)
+        radius = np.full(len(pos), 10.)
+        mass = rng.uniform(1, 5, len(pos))
+        collisions = np.zeros(len(pos), dtype=np.int64)
+        for _ in range(30):
+            ccd_step(pos, vel, radius, mass, collisions, (300, 180), 0.5)
+            self.assertLess(max_overlap(pos, radius), 1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,51 @@
 """
-Файл в котором реализовано квадродерево
+Файл в котором реализовано квадродерево.
+Кроме поиска столкновений дерево служит пространственным индексом:
+в нем можно хранить Circle с любой нагрузкой и искать по прямоугольнику,
+кругу и k ближайших соседей
 """
 
 
-from typing import List
-from itertools import combinations
+import heapq
+from math import ceil, floor, log2
+from typing import Dict, Iterable, List, Optional, Tuple
+from itertools import combinations, count, product
 
-from quad_tree.figures import Ball, Box
+import numpy as np
+
+from quad_tree.figures import Ball, Box, Circle
 import quad_tree.consts as c
 import pygame as pg
 
 
+def morton_codes(xs: np.ndarray, ys: np.ndarray, box: Box,
+                 levels: int) -> np.ndarray:
+    """
+    Коды Мортона (Z-порядок) центров в сетке, которая совпадает с делением
+    нод дерева: на каждом уровне к коду дописываются два разряда четверти,
+    младший - по x, старший - по y. У объектов одной ноды общий префикс кода,
+    поэтому после сортировки по коду они идут подряд на каждом уровне
+    :param xs: координаты по x
+    :param ys: координаты по y
+    :param box: бокс корня
+    :param levels: кол-во уровней, не больше 32
+    :return: массив кодов uint64
+    """
+    codes = np.zeros(len(xs), dtype=np.uint64)
+    left = np.full(len(xs), box.x, dtype=np.float64)
+    top = np.full(len(ys), box.y, dtype=np.float64)
+    width, height = box.width, box.height
+    for _ in range(levels):
+        width, height = width // 2, height // 2
+        right = xs >= left + width
+        down = ys >= top + height
+        left += right * width
+        top += down * height
+        codes = (codes << np.uint64(2)) | \
+            (right + 2 * down.astype(np.uint64)).astype(np.uint64)
+    return codes
+
+
 class QuadTree:
     class Node:
         def __init__(self, box: Box, parent: "QuadTree.Node" = None) -> None:
@@ -23,26 +58,27 @@ class QuadTree:
             self.children: List["QuadTree.Node"] = []
             self.balls: List[Ball] = []
             self.parent = parent
+            # кол-во шариков в поддереве, включая шарики самой ноды
+            self.count = 0
 
-        def compute_children(self):
+        def compute_children(self, pool: List["QuadTree.Node"] = None):
             """
             Метод рассчета дочерних нод для текущей
+            :param pool: список освобожденных нод, которые переиспользуются
+            вместо создания новых
             """
             x, y, w, h = self.box.x, self.box.y, self.box.width, self.box.height
             w_2 = w // 2
             h_2 = h // 2
-            self.children.append(QuadTree.Node(
-                Box(x, y, w_2, h_2), self
-            ))
-            self.children.append(QuadTree.Node(
-                Box(x + w_2, y, w_2, h_2), self
-            ))
-            self.children.append(QuadTree.Node(
-                Box(x, y + h_2, w_2, h_2), self
-            ))
-            self.children.append(QuadTree.Node(
-                Box(x + w_2, y + h_2, w_2, h_2), self
-            ))
+            for c_x, c_y in ((x, y), (x + w_2, y),
+                             (x, y + h_2), (x + w_2, y + h_2)):
+                if pool:
+                    child = pool.pop()
+                    child.box.reset(c_x, c_y, w_2, h_2)
+                    child.parent = self
+                else:
+                    child = QuadTree.Node(Box(c_x, c_y, w_2, h_2), self)
+                self.children.append(child)
 
         def find_children(self, ball: Ball):
             """
@@ -59,6 +95,17 @@ class QuadTree:
                 return False
             return intersections
 
+        def find_child(self, ball: Ball) -> Optional["QuadTree.Node"]:
+            """
+            Метод поиска дочерней ноды, в которой шарик лежит целиком
+            :param ball: искомый шарик
+            :return: дочерняя нода или None, если шарик лежит на границе
+            """
+            for child in self.children:
+                if child.box.encloses(ball):
+                    return child
+            return None
+
         def __contains__(self, item: Ball) -> bool:
             """
             Проверка на вхождение шарика в ноду
@@ -93,40 +140,142 @@ class QuadTree:
                    f"balls={len(self.balls)}" \
                    f")"
 
-    def __init__(self, screen: pg.display):
-        self.root_node = QuadTree.Node(Box(0, 0, c.WIDTH, c.HEIGHT))
+    def __init__(self, screen: pg.display = None, box: Box = None,
+                 node_capacity: int = None, min_side: float = None):
+        """
+        Динамическое квадродерево: каждый шарик хранится в наименьшей ноде,
+        в которой он лежит целиком, дерево запоминает эту ноду и при
+        обновлении перемещает только шарики, покинувшие свою ноду
+        :param screen: экран, куда рисуется дерево
+        :param box: бокс корня, по умолчанию весь экран c.WIDTH x c.HEIGHT
+        :param node_capacity: вместимость листа, по умолчанию c.NODE_CAPACITY
+        :param min_side: ноды с меньшей стороной не делятся,
+        по умолчанию c.BALL_RADIUS
+        """
+        self.root_node = QuadTree.Node(box or Box(0, 0, c.WIDTH, c.HEIGHT))
         self.screen = screen
-        self.node_capacity = c.NODE_CAPACITY
+        self.node_capacity = node_capacity or c.NODE_CAPACITY
+        self.min_side = c.BALL_RADIUS if min_side is None else min_side
+        # нода каждого шарика по его id
+        self.owners: Dict[int, "QuadTree.Node"] = {}
+        self.pool: List["QuadTree.Node"] = []
+        # кол-во шариков, перемещенных при последнем обновлении
+        self.relocated = 0
+        # кол-во проверенных пар и настоящих касаний при последнем поиске
+        self.candidates = 0
+        self.contacts = 0
 
     def insert(self, ball: Ball):
         """
         Метод вставки шарика в нужную ноду
         :param ball: вставляемый шарик
         """
-        def insert_inner(node: "QuadTree.Node", inner_ball: Ball):
-            """
-            внутренняя рекурсивная функция вставки
-            :param node: текущая нода
-            :param inner_ball: шарик
-            """
-            if inner_ball not in node:
-                return False
+        if id(ball) not in self.owners:
+            self._add(self.root_node, ball)
 
-            if len(node.balls) < self.node_capacity or \
-                    node.box.max_side < c.BALL_RADIUS:
-                node.append(inner_ball)
+    def remove(self, ball: Ball):
+        """
+        Метод удаления шарика из дерева с объединением опустевших нод
+        :param ball: удаляемый шарик
+        """
+        if id(ball) in self.owners:
+            self._merge(self._detach(ball))
+
+    def _add(self, node: "QuadTree.Node", ball: Ball):
+        """
+        Спуск шарика от ноды до наименьшей ноды, в которой он лежит целиком,
+        переполненный лист по пути делится на четыре
+        :param node: нода, с которой начинается спуск
+        :param ball: шарик
+        """
+        while True:
+            if node.children:
+                child = node.find_child(ball)
+                if child is None:
+                    break
+                node = child
+            elif len(node.balls) >= self.node_capacity and \
+                    self._can_split(node.box):
+                self._split(node)
             else:
-                if not node.children:
-                    node.compute_children()
-                child_nums = node.find_children(inner_ball)
-                if child_nums is not False:
-                    for child_num in child_nums:
-                        insert_inner(node.children[child_num],
-                                     inner_ball)
-                else:
-                    return False
+                break
+        node.append(ball)
+        self.owners[id(ball)] = node
+        while node is not None:
+            node.count += 1
+            node = node.parent
 
-        insert_inner(self.root_node, ball)
+    def _can_split(self, box: Box) -> bool:
+        """
+        Проверка на то, что ноду с таким боксом можно делить дальше
+        :param box: бокс ноды
+        :return: True/False в зависимости от вердикта
+        """
+        return box.max_side >= self.min_side and min(box.width, box.height) >= 2
+
+    def _split(self, node: "QuadTree.Node"):
+        """
+        Деление листа на четыре ноды, шарики листа,
+        которые целиком лежат в дочерней ноде, переходят в нее
+        :param node: делимый лист
+        """
+        node.compute_children(self.pool)
+        staying = []
+        for ball in node.balls:
+            child = node.find_child(ball)
+            if child is None:
+                staying.append(ball)
+            else:
+                child.append(ball)
+                child.count += 1
+                self.owners[id(ball)] = child
+        node.balls = staying
+
+    def _detach(self, ball: Ball) -> "QuadTree.Node":
+        """
+        Удаление шарика из его ноды без объединения нод
+        :param ball: шарик
+        :return: нода, в которой лежал шарик
+        """
+        node = self.owners.pop(id(ball))
+        # list.remove сравнивает шарики по b_id, а он может повторяться
+        for i, other in enumerate(node.balls):
+            if other is ball:
+                del node.balls[i]
+                break
+        cur = node
+        while cur is not None:
+            cur.count -= 1
+            cur = cur.parent
+        return node
+
+    def _merge(self, node: "QuadTree.Node"):
+        """
+        Объединение самого верхнего предка ноды, в поддереве которого
+        осталось не больше node_capacity шариков, в один лист.
+        Ноды поддерева возвращаются в пул
+        :param node: нода, из которой удалялись шарики
+        """
+        target = None
+        while node is not None and node.count <= self.node_capacity:
+            if node.children:
+                target = node
+            node = node.parent
+        if target is None:
+            return
+        stack = target.children
+        target.children = []
+        while stack:
+            cur = stack.pop()
+            for ball in cur.balls:
+                target.append(ball)
+                self.owners[id(ball)] = target
+            stack.extend(cur.children)
+            cur.children = []
+            cur.balls = []
+            cur.count = 0
+            cur.parent = None
+            self.pool.append(cur)
 
     # def find_intersections(self):
     #
@@ -173,39 +322,206 @@ class QuadTree:
 
         return find_leaves_inner(self.root_node)
 
-    def find_intersections(self):
+    def find_pairs(self) -> List[Tuple[Ball, Ball]]:
         """
-        Метод поиска возможных пересечений, отбирает шарики
-        на проверку пересечений исходя из их положения в дереве
-        :return:
+        Метод отбора пар шариков на проверку пересечений
+        исходя из их положения в дереве.
+        Шарики ноды проверяются друг с другом и с шариками предков,
+        которые задевают бокс ноды, поэтому каждая пара попадает в список один раз
+        :return: список пар
         """
-        def find_balls_to_intersect(leaf_to_find: "QuadTree.Node"):
-            """
-            Функция, проходящаяся от листка корню,
-            собирающая все шарики по пути
-            :param leaf_to_find: лист из которого идем
-            :return: кортеж из шариков
-            """
-            balls = []
-            while leaf_to_find is not None:
-                balls.extend(leaf_to_find.balls)
-                leaf_to_find = leaf_to_find.parent
-            return tuple(balls)
+        pairs = []
+        stack = [(self.root_node, ())]
+        while stack:
+            node, above = stack.pop()
+            if node.balls:
+                pairs.extend(combinations(node.balls, 2))
+                pairs.extend(product(above, node.balls))
+                above = above + tuple(node.balls)
+            for child in node.children:
+                stack.append((child, tuple(ball for ball in above
+                                           if ball in child.box)))
+        return pairs
+
+    def find_intersections(self) -> List[Tuple[Ball, Ball]]:
+        """
+        Метод поиска и обработки пересечений
+        :return: список проверенных пар
+        """
+        pairs = self.find_pairs()
+        contacts = 0
+        for ball1, ball2 in pairs:
+            if ball1.collide(ball2):
+                contacts += 1
+        self.candidates, self.contacts = len(pairs), contacts
+        return pairs
+
+    @classmethod
+    def bulk_load(cls, items: Iterable, box: Box = None,
+                  node_capacity: int = None, min_side: float = None,
+                  screen: pg.display = None) -> "QuadTree":
+        """
+        Построение дерева сразу по всем объектам. Объекты сортируются по коду
+        Мортона центра, и дерево строится по уровням: на каждом уровне для всех
+        еще не размещенных объектов массивами считаются размеры нод, какие
+        из них делятся и какие объекты не помещаются целиком в дочернюю ноду.
+        Дерево получается таким же, как при вставке по одному,
+        и дальше поддерживает insert, remove и upd
+        :param items: шарики или Circle
+        :param box: бокс корня, по умолчанию накрывает все объекты
+        :param node_capacity: вместимость листа
+        :param min_side: ноды с меньшей стороной не делятся
+        :param screen: экран, куда рисуется дерево
+        :return: дерево
+        """
+        items = list(items)
+        xs = np.array([item.pos_x for item in items], dtype=np.float64)
+        ys = np.array([item.pos_y for item in items], dtype=np.float64)
+        rs = np.array([item.radius for item in items], dtype=np.float64)
+        if box is None:
+            if items:
+                x_0 = floor((xs - rs).min())
+                y_0 = floor((ys - rs).min())
+                side = max(ceil((xs + rs).max()) - x_0,
+                           ceil((ys + rs).max()) - y_0, 1)
+            else:
+                x_0 = y_0 = side = 1
+            box = Box(x_0, y_0, side, side)
+        tree = cls(screen, box, node_capacity, min_side)
+        if not items:
+            return tree
+
+        # размеры нод на каждом уровне одинаковые, поэтому заранее известно,
+        # до какого уровня ноды можно делить
+        sizes = [(box.width, box.height)]
+        while len(sizes) <= 32 and \
+                tree._can_split(Box(0, 0, *sizes[-1])):
+            sizes.append((sizes[-1][0] // 2, sizes[-1][1] // 2))
+        levels = len(sizes) - 1
+        codes = morton_codes(xs, ys, box, levels)
+        order = np.argsort(codes, kind="stable")
+        codes, xs, ys, rs = codes[order], xs[order], ys[order], rs[order]
+        left = np.full(len(items), box.x, dtype=np.float64)
+        top = np.full(len(items), box.y, dtype=np.float64)
 
-        leaves = self.find_leaves()
-        to_check_collides = []
-        for leaf in leaves:
-            inter_list = find_balls_to_intersect(leaf)
-            # for ball1, ball2 in itertools.combinations(inter_list, 2):
-            #     ball1.collide(ball2)
-            to_check_collides.append(inter_list)
+        owners = tree.owners
+        active = np.arange(len(items))
+        nodes = [tree.root_node]
+        for depth in range(levels + 1):
+            prefix = codes[active] >> np.uint64(2 * (levels - depth))
+            starts = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+            counts = np.diff(np.r_[starts, len(active)])
+            group = np.repeat(np.arange(len(starts)), counts)
+            # ноды уровня идут в порядке префиксов, как и группы объектов
+            node_ind = np.searchsorted(node_prefix, prefix[starts]) \
+                if depth else np.zeros(1, dtype=np.int64)
+            for ind, cnt in zip(node_ind.tolist(), counts.tolist()):
+                nodes[ind].count = cnt
+            split = counts > tree.node_capacity if depth < levels else \
+                np.zeros(len(counts), dtype=bool)
 
-        to_check_collides = list(set(to_check_collides))
+            stay = ~split[group]
+            if split.any():
+                half_w, half_h = sizes[depth + 1]
+                quadrant = (codes[active] >> np.uint64(2 * (levels - depth - 1))
+                            ) & np.uint64(3)
+                child_left = left[active] + (quadrant & np.uint64(1)) * half_w
+                child_top = top[active] + (quadrant >> np.uint64(1)) * half_h
+                x, y, r = xs[active], ys[active], rs[active]
+                stay |= (x - r < child_left) | (x + r > child_left + half_w) | \
+                    (y - r < child_top) | (y + r > child_top + half_h)
+                left[active], top[active] = child_left, child_top
 
-        for ball_seq in to_check_collides:
-            for ball1, ball2 in combinations(ball_seq, 2):
-                ball1.collide(ball2)
-        return to_check_collides
+            for ind, item in zip(node_ind[group[stay]].tolist(),
+                                 order[active[stay]].tolist()):
+                node = nodes[ind]
+                node.balls.append(items[item])
+                owners[id(items[item])] = node
+
+            if not split.any():
+                break
+            split_nodes = node_ind[split].tolist()
+            node_prefix = ((prefix[starts][split] << np.uint64(2))[:, None] +
+                           np.arange(4, dtype=np.uint64)).ravel()
+            children = []
+            for ind in split_nodes:
+                nodes[ind].compute_children(tree.pool)
+                children.extend(nodes[ind].children)
+            nodes = children
+            active = active[~stay]
+        return tree
+
+    def query_rect(self, x: float, y: float, width: float,
+                   height: float) -> list:
+        """
+        Поиск объектов, пересекающих прямоугольник
+        :param x: позиция левого верхнего угла по x
+        :param y: позиция левого верхнего угла по y
+        :param width: ширина
+        :param height: высота
+        :return: список шариков или Circle
+        """
+        query = Box(x, y, width, height)
+        found = []
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            found.extend(item for item in node.balls if item in query)
+            stack.extend(child for child in node.children
+                         if child.count and
+                         child.box.intersects(x, y, width, height))
+        return found
+
+    def query_circle(self, x: float, y: float, radius: float) -> list:
+        """
+        Поиск объектов, пересекающих круг
+        :param x: позиция центра по x
+        :param y: позиция центра по y
+        :param radius: радиус
+        :return: список шариков или Circle
+        """
+        query = Circle(x, y, radius)
+        found = []
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            for item in node.balls:
+                reach = radius + item.radius
+                if (item.pos_x - x) ** 2 + (item.pos_y - y) ** 2 <= reach * reach:
+                    found.append(item)
+            stack.extend(child for child in node.children
+                         if child.count and query in child.box)
+        return found
+
+    def nearest(self, k: int, point: Tuple[float, float]) -> list:
+        """
+        Поиск k ближайших к точке объектов обходом по возрастанию расстояния:
+        в очереди с приоритетом лежат ноды с расстоянием до их бокса и объекты
+        с расстоянием до их круга. Бокс ноды содержит все ее объекты, поэтому
+        объект, взятый из очереди, ближе всего, что в ней осталось
+        :param k: кол-во соседей
+        :param point: точка (x, y)
+        :return: список шариков или Circle по возрастанию расстояния
+        """
+        x, y = point
+        order = count()
+        # объекты корня могут лежать вне его бокса, поэтому у корня 0
+        queue = [(0., next(order), self.root_node, True)]
+        found = []
+        while queue and len(found) < k:
+            _, _, obj, is_node = heapq.heappop(queue)
+            if not is_node:
+                found.append(obj)
+                continue
+            for item in obj.balls:
+                dist = max(((item.pos_x - x) ** 2 +
+                            (item.pos_y - y) ** 2) ** 0.5 - item.radius, 0.)
+                heapq.heappush(queue, (dist, next(order), item, False))
+            for child in obj.children:
+                if child.count:
+                    heapq.heappush(queue, (child.box.distance(x, y),
+                                           next(order), child, True))
+        return found
 
     def render(self, cur_node: "QuadTree.Node" = None):
         """
@@ -231,9 +547,41 @@ class QuadTree:
 
     def upd(self, balls: List[Ball]):
         """
-        Метод обновления дерева списком шаров
-        :param balls:
+        Метод обновления дерева списком шаров: новые шарики вставляются,
+        отсутствующие в списке удаляются, а из остальных перемещаются только
+        те, что вышли за свою ноду или теперь целиком лежат в дочерней.
+        Опустевшие ноды объединяются и возвращаются в пул
+        :param balls: все шарики сцены
         """
-        self.root_node = QuadTree.Node(Box(0, 0, c.WIDTH, c.HEIGHT))
+        owners = self.owners
+        root = self.root_node
+        known = 0
+        new_balls = []
+        moved = []
         for ball in balls:
-            self.insert(ball)
+            node = owners.get(id(ball))
+            if node is None:
+                new_balls.append(ball)
+                continue
+            known += 1
+            if node is not root and not node.box.encloses(ball) or \
+                    node.children and node.find_child(ball) is not None:
+                moved.append(ball)
+
+        touched = []
+        if known != len(owners):
+            alive = set(map(id, balls))
+            for node in {owners[b_id] for b_id in owners.keys() - alive}:
+                for ball in [ball for ball in node.balls
+                             if id(ball) not in alive]:
+                    touched.append(self._detach(ball))
+        touched.extend(self._detach(ball) for ball in moved)
+        for ball in moved:
+            self._add(root, ball)
+        for ball in new_balls:
+            self._add(root, ball)
+        for node in touched:
+            # нода могла уйти в пул при объединении соседней
+            if node.parent is not None or node is root:
+                self._merge(node)
+        self.relocated = len(moved)
@@ -118,10 +118,10 @@ class SettingsWindow(QtWidgets.QWidget, Ui_Form):
         """
         Метод запуска симуляции, сохраняет конфиги в файл
         """
-        self.confManager.set_consts()
+        config = self.confManager.snapshot()
         self.confManager.save_to_file()
         self.hide()
-        main_func.run()
+        main_func.run(config, self.confManager.file)
 
 
 
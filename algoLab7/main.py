@@ -68,7 +68,6 @@ class Window:
                         status = True
                     if right_mb:
                         tile.upd_texture("unchecked_way")
-                        tile.f_weight = {}
                         if tile in self.route:
                             self.route.remove(tile)
                             status = True
@@ -86,11 +85,7 @@ class Window:
                 self.route.clear()
             elif event.name == "find_way":
                 if len(self.route) > 1:
-                    for line in self.field:
-                        for tile in line:
-                            if tile not in self.route and tile.status != "wall":
-                                tile.upd_texture("unchecked_way")
-
+                    self.field.reset_ways(self.route)
                     self.field.find_way(self.route)
             elif event.name == "load_from":
                 if event.kind == "txt":
@@ -109,7 +104,7 @@ class Window:
             elif event.name == "gif_change":
                 if c.SAVE_GIF:
                     print("Запись гифки закончена")
-                    del self.gifer
+                    self.gifer.close()
                     self.gifer = None
                     self.field.gifer = None
                 else:
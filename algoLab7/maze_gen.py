@@ -0,0 +1,287 @@
+"""
+Файл с генерацией лабиринта по алгоритму Краскала без привязки к pygame:
+клетки лабиринта - клетки поля с нечетными координатами, стены между ними -
+ребра графа. Стены хранятся в массивах NumPy номеров клеток по их сторонам,
+компоненты связности - в системе непересекающихся множеств над номерами
+клеток в компактных массивах. При запуске как модуля - бенчмарк генерации
+
+Запуск: python maze_gen.py --sizes 31 101 501 1001 2001
+"""
+import argparse
+from array import array
+from time import perf_counter
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# по столько стен за раз переводятся из массивов в числа Python
+CHUNK = 1 << 16
+
+
+class DisjointSet:
+    __slots__ = ("parent", "rank", "count")
+
+    def __init__(self, size: int) -> None:
+        """
+        Система непересекающихся множеств над числами от 0 до size - 1
+        с объединением по рангу и сжатием путей
+        :param size: кол-во элементов
+        """
+        # array вместо списка: 4 байта на элемент вместо объекта int
+        self.parent = array("i", range(size))
+        self.rank = bytearray(size)
+        # кол-во множеств
+        self.count = size
+
+    def find(self, item: int) -> int:
+        """
+        Поиск представителя множества, все элементы на пути
+        подвешиваются прямо к нему
+        :param item: элемент
+        :return: представитель множества
+        """
+        parent = self.parent
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    def union(self, first: int, second: int) -> bool:
+        """
+        Объединение множеств двух элементов, меньшее по рангу
+        подвешивается к большему
+        :param first: первый элемент
+        :param second: второй элемент
+        :return: True, если элементы были в разных множествах
+        """
+        # поиск представителей без вызова find, union вызывается
+        # на каждую стену лабиринта
+        parent = self.parent
+        root = first
+        while parent[root] != root:
+            root = parent[root]
+        while parent[first] != root:
+            parent[first], first = root, parent[first]
+        first = root
+        root = second
+        while parent[root] != root:
+            root = parent[root]
+        while parent[second] != root:
+            parent[second], second = root, parent[second]
+        second = root
+        if first == second:
+            return False
+        rank = self.rank
+        if rank[first] < rank[second]:
+            first, second = second, first
+        parent[second] = first
+        if rank[first] == rank[second]:
+            rank[first] += 1
+        self.count -= 1
+        return True
+
+
+def cells_count(cols: int, rows: int) -> Tuple[int, int]:
+    """
+    Размер сетки клеток лабиринта внутри поля
+    :param cols: кол-во столбцов поля
+    :param rows: кол-во строк поля
+    :return: кол-во клеток по x и по y
+    """
+    return max((cols - 1) // 2, 0), max((rows - 1) // 2, 0)
+
+
+def maze_edges(cols: int, rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Все стены поля, разделяющие две клетки. Клетка (x, y) поля
+    с нечетными x и y имеет номер ((y - 1) // 2) * ширина + (x - 1) // 2,
+    стена между клетками a и b стоит в
+    (a % ширина + b % ширина + 1, a // ширина + b // ширина + 1)
+    :param cols: кол-во столбцов поля
+    :param rows: кол-во строк поля
+    :return: массивы номеров клеток по сторонам стен
+    """
+    width, height = cells_count(cols, rows)
+    cells = np.arange(width * height, dtype=np.int32).reshape(height, width)
+    first = np.concatenate((cells[:, :-1].ravel(), cells[:-1, :].ravel()))
+    second = np.concatenate((cells[:, 1:].ravel(), cells[1:, :].ravel()))
+    return first, second
+
+
+def wall_index(first: np.ndarray, second: np.ndarray, cols: int,
+               rows: int) -> np.ndarray:
+    """
+    Номера клеток поля (y * cols + x), в которых стоят стены
+    :param first: номера клеток с одной стороны стен
+    :param second: номера клеток с другой стороны
+    :param cols: кол-во столбцов поля
+    :param rows: кол-во строк поля
+    :return: массив номеров
+    """
+    width, _ = cells_count(cols, rows)
+    first, second = first.astype(np.int64), second.astype(np.int64)
+    return (first // width + second // width + 1) * cols + \
+        first % width + second % width + 1
+
+
+def kruskal(cols: int, rows: int, weights: np.ndarray = None,
+            rng: np.random.Generator = None) -> Iterator[Tuple[int, int, int]]:
+    """
+    Генерация лабиринта по алгоритму Краскала: стены перебираются
+    по возрастанию веса, стена убирается, если клетки по ее сторонам
+    еще не связаны. Генерация заканчивается, когда убрано
+    (кол-во клеток - 1) стен, оставшиеся стены не проверяются
+    :param cols: кол-во столбцов поля
+    :param rows: кол-во строк поля
+    :param weights: веса клеток поля (y * cols + x), без них стены
+    перебираются в случайном порядке
+    :param rng: генератор случайных чисел для случайного порядка
+    :return: итератор координат убранных стен и кол-ва компонент
+    связности после их удаления
+    """
+    width, height = cells_count(cols, rows)
+    first, second = maze_edges(cols, rows)
+    if weights is None:
+        order = (rng or np.random.default_rng()).permutation(len(first))
+    else:
+        order = np.argsort(weights[wall_index(first, second, cols, rows)],
+                           kind="stable")
+    cells = DisjointSet(width * height)
+    union = cells.union
+    left = width * height - 1
+    for start in range(0, len(order), CHUNK):
+        if left <= 0:
+            break
+        part = order[start:start + CHUNK]
+        for one, other in zip(first[part].tolist(), second[part].tolist()):
+            if union(one, other):
+                left -= 1
+                yield (one % width + other % width + 1,
+                       one // width + other // width + 1, cells.count)
+                if left <= 0:
+                    break
+
+
+def _kruskal_sets(cols: int, rows: int,
+                  edges: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Прежняя генерация со списком множеств клеток, которые после каждой
+    стены попарно проверяются на пересечение. Нужна только для сравнения
+    :param cols: кол-во столбцов поля
+    :param rows: кол-во строк поля
+    :param edges: пары номеров клеток по сторонам стен в порядке перебора
+    :return: кол-во убранных стен и кол-во множеств в конце
+    """
+    def unite_sets(s_list: List[set]) -> None:
+        done = False
+        while not done:
+            done = True
+            for i in range(len(s_list)):
+                for j in range(i + 1, len(s_list)):
+                    if s_list[i].intersection(s_list[j]):
+                        s_list[i].update(s_list[j])
+                        s_list.pop(j)
+                        done = False
+                        break
+                if not done:
+                    break
+
+    width, height = cells_count(cols, rows)
+    ways = set(range(width * height))
+    vert_sets: List[set] = []
+    opened = 0
+    for first, second in edges:
+        verts = {first, second}
+        cycle = False
+        for v_set in vert_sets:
+            if verts.intersection(v_set):
+                if verts.issubset(v_set):
+                    cycle = True
+                else:
+                    v_set.update(verts)
+                break
+        else:
+            vert_sets.append(verts)
+        if not cycle:
+            opened += 1
+        unite_sets(vert_sets)
+        if vert_sets[0] == ways:
+            break
+    return opened, len(vert_sets)
+
+
+def benchmark(sizes: List[int], legacy_max: int,
+              seed: Optional[int]) -> List[dict]:
+    """
+    Замер генерации лабиринтов size x size: система непересекающихся
+    множеств против прежнего списка множеств (только до legacy_max)
+    :param sizes: размеры поля
+    :param legacy_max: наибольший размер для прежней генерации
+    :param seed: зерно порядка стен
+    :return: список результатов
+    """
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        start = perf_counter()
+        opened = 0
+        components = None
+        for _, _, components in kruskal(size, size, rng=rng):
+            opened += 1
+        elapsed = perf_counter() - start
+        width, height = cells_count(size, size)
+        result = {
+            "size": f"{size}x{size}",
+            "cells": width * height,
+            "opened": opened,
+            "components": components,
+            "dsu_s": round(elapsed, 4),
+            "sets_s": "-",
+        }
+        if size <= legacy_max:
+            first, second = maze_edges(size, size)
+            order = np.random.default_rng(seed).permutation(len(first))
+            edges = list(zip(first[order].tolist(), second[order].tolist()))
+            start = perf_counter()
+            _kruskal_sets(size, size, edges)
+            result["sets_s"] = round(perf_counter() - start, 4)
+        results.append(result)
+    return results
+
+
+def print_table(results: List[dict]) -> None:
+    """
+    Вывод результатов замеров в виде таблицы
+    :param results: список словарей с одинаковыми ключами
+    """
+    if not results:
+        return
+    cols = list(results[0])
+    widths = [max(len(col), *(len(str(res[col])) for res in results))
+              for col in cols]
+    print("  ".join(col.ljust(w) for col, w in zip(cols, widths)))
+    for res in results:
+        print("  ".join(str(res[col]).ljust(w) for col, w in zip(cols, widths)))
+
+
+def main():
+    """
+    Точка входа CLI бенчмарка
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк генерации "
+                                                 "лабиринта")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[31, 101, 501, 1001, 2001],
+                        help="Размеры поля (нечетные)")
+    parser.add_argument("--legacy_max", type=int, default=51,
+                        help="Наибольший размер для прежней генерации")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Зерно порядка стен")
+    args = parser.parse_args()
+    print_table(benchmark(args.sizes, args.legacy_max, args.seed))
+
+
+if __name__ == '__main__':
+    main()
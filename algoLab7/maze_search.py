@@ -0,0 +1,226 @@
+"""
+Файл с поиском пути в лабиринте без привязки к pygame: поиск в ширину
+по полю клеток с плоскими массивами родителей, расстояний и меток поколения.
+Волна обрабатывается целиком операциями NumPy, а не по одной клетке из
+очереди. Отметки прошлого поиска не стираются - у каждого поиска свое
+поколение, клетка считается просмотренной, только если ее метка совпадает
+с текущим поколением. При запуске как модуля - бенчмарк поиска
+
+Запуск: python maze_search.py --sizes 101 501 1001 2001
+"""
+import argparse
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from maze_gen import kruskal, print_table
+
+# наибольшее поколение, после него метки обнуляются
+MAX_GENERATION = (1 << 32) - 1
+
+
+class WaveSearch:
+    __slots__ = ("cols", "rows", "width", "stamp", "parent", "distance",
+                 "generation")
+
+    def __init__(self, cols: int, rows: int) -> None:
+        """
+        Класс поиска в ширину по полю cols x rows. Массивы хранятся для поля,
+        дополненного столбцом справа и строками сверху и снизу, которые
+        всегда считаются стенами: соседи любой клетки поля лежат внутри
+        массивов, и проверка границ не нужна
+        :param cols: кол-во столбцов поля
+        :param rows: кол-во строк поля
+        """
+        self.cols = cols
+        self.rows = rows
+        self.width = cols + 1
+        size = self.width * (rows + 2)
+        self.stamp = np.zeros(size, dtype=np.uint32)
+        self.parent = np.zeros(size, dtype=np.int32)
+        self.distance = np.zeros(size, dtype=np.int32)
+        self.generation = 0
+
+    def _padded(self, index: int) -> int:
+        """
+        Перевод индекса клетки поля в индекс дополненного поля
+        :param index: индекс клетки поля (y * cols + x)
+        :return: индекс в массивах поиска
+        """
+        return (index // self.cols + 1) * self.width + index % self.cols
+
+    def _unpadded(self, index: np.ndarray) -> np.ndarray:
+        """
+        Перевод индексов дополненного поля в индексы клеток поля
+        :param index: индексы в массивах поиска
+        :return: индексы клеток поля
+        """
+        return (index // self.width - 1) * self.cols + index % self.width
+
+    def search(self, passable: np.ndarray, start: int,
+               target: int) -> Optional[List[int]]:
+        """
+        Поиск кратчайшего пути поиском в ширину, который останавливается
+        на волне, дошедшей до конечной клетки
+        :param passable: массив проходимости клеток поля (y * cols + x)
+        :param start: индекс начальной клетки
+        :param target: индекс конечной клетки
+        :return: список индексов клеток пути от start до target
+        или None, если пути нет
+        """
+        if self.generation >= MAX_GENERATION - 1:
+            self.stamp[:] = 0
+            self.generation = 0
+        # стены помечаются своим поколением, просмотренные клетки - следующим,
+        # все метки меньше wall остались от прошлых поисков
+        wall, seen = self.generation + 1, self.generation + 2
+        self.generation = seen
+        stamp, parent, distance = self.stamp, self.parent, self.distance
+        grid = stamp.reshape(self.rows + 2, self.width)
+        grid[[0, -1], :] = wall
+        grid[:, -1] = wall
+        grid[1:-1, :-1][~np.asarray(passable, dtype=bool).reshape(
+            self.rows, self.cols)] = wall
+
+        start, target = self._padded(start), self._padded(target)
+        stamp[start] = seen
+        parent[start] = start
+        distance[start] = 0
+        front = np.array([start], dtype=np.int64)
+        offsets = np.array([-1, 1, -self.width, self.width], dtype=np.int64)
+        step = 0
+        while front.size and stamp[target] != seen:
+            step += 1
+            near = (front[:, None] + offsets).ravel()
+            free = np.flatnonzero(stamp[near] < wall)
+            near, source = near[free], front[free >> 2]
+            # в клетку могут прийти несколько клеток волны,
+            # остается та, что записалась в parent последней
+            parent[near] = source
+            near = near[parent[near] == source]
+            stamp[near] = seen
+            distance[near] = step
+            front = near
+        if stamp[target] != seen:
+            return None
+
+        # путь восстанавливается по родителям за его длину
+        way = [target]
+        while target != start:
+            target = int(parent[target])
+            way.append(target)
+        way.reverse()
+        return self._unpadded(np.array(way, dtype=np.int64)).tolist()
+
+    def visited(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Клетки, просмотренные последним поиском, в порядке волн
+        :return: массивы индексов клеток поля и их расстояний от начала
+        """
+        index = np.flatnonzero(self.stamp == self.generation)
+        distance = self.distance[index]
+        order = np.argsort(distance, kind="stable")
+        return self._unpadded(index[order]), distance[order]
+
+
+def _wave_marks(passable: np.ndarray, cols: int, start: int,
+                target: int) -> Optional[List[int]]:
+    """
+    Прежний волновой поиск: номера волн в словаре, соседи ищутся заново
+    для каждой клетки, путь восстанавливается выбором соседа с наименьшей
+    отметкой. Нужен только для сравнения
+    :param passable: массив проходимости клеток поля
+    :param cols: кол-во столбцов поля
+    :param start: индекс начальной клетки
+    :param target: индекс конечной клетки
+    :return: список индексов клеток пути или None, если пути нет
+    """
+    def neighbours(index: int) -> List[int]:
+        x = index % cols
+        return [near for near, inside in ((index - 1, x > 0),
+                                          (index + 1, x < cols - 1),
+                                          (index - cols, index >= cols),
+                                          (index + cols,
+                                           index + cols < len(passable)))
+                if inside and passable[near]]
+
+    marks: Dict[int, int] = {start: 1}
+    weighted = {1: [start]}
+    while target not in marks:
+        cur_weight = max(weighted.keys())
+        weighted[cur_weight + 1] = []
+        for cur in weighted[cur_weight]:
+            for near in neighbours(cur):
+                if near not in marks:
+                    marks[near] = cur_weight + 1
+                    weighted[cur_weight + 1].append(near)
+        if not weighted[cur_weight + 1]:
+            return None
+
+    way = [target]
+    while way[-1] != start:
+        cur_marked = list(filter(lambda near: near in marks,
+                                 neighbours(way[-1])))
+        way.append(min(cur_marked, key=lambda near: marks[near]))
+    way.reverse()
+    return way
+
+
+def benchmark(sizes: List[int], legacy_max: int,
+              seed: Optional[int]) -> List[dict]:
+    """
+    Замер поиска пути между противоположными углами лабиринта size x size:
+    поиск в ширину против прежнего волнового (только до legacy_max)
+    :param sizes: размеры поля
+    :param legacy_max: наибольший размер для прежнего поиска
+    :param seed: зерно генерации лабиринта
+    :return: список результатов
+    """
+    results = []
+    for size in sizes:
+        passable = np.zeros(size * size, dtype=bool)
+        passable.reshape(size, size)[1:-1:2, 1:-1:2] = True
+        for x, y, _ in kruskal(size, size, rng=np.random.default_rng(seed)):
+            passable[y * size + x] = True
+        start, target = size + 1, (size - 2) * size + size - 2
+
+        searcher = WaveSearch(size, size)
+        began = perf_counter()
+        way = searcher.search(passable, start, target)
+        elapsed = perf_counter() - began
+        result = {
+            "size": f"{size}x{size}",
+            "way": len(way),
+            "visited": len(searcher.visited()[0]),
+            "bfs_s": round(elapsed, 4),
+            "waves_s": "-",
+        }
+        if size <= legacy_max:
+            began = perf_counter()
+            legacy = _wave_marks(passable, size, start, target)
+            result["waves_s"] = round(perf_counter() - began, 4)
+            assert len(legacy) == len(way)
+        results.append(result)
+    return results
+
+
+def main():
+    """
+    Точка входа CLI бенчмарка
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска пути "
+                                                 "в лабиринте")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[101, 501, 1001, 2001],
+                        help="Размеры поля (нечетные)")
+    parser.add_argument("--legacy_max", type=int, default=1001,
+                        help="Наибольший размер для прежнего поиска")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Зерно генерации лабиринта")
+    args = parser.parse_args()
+    print_table(benchmark(args.sizes, args.legacy_max, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,32 @@
 """
-Файл с реализацией поля клеток лабиринта и камеры для его отображения
+Файл с реализацией поля клеток лабиринта и камеры для его отображения.
+Поле хранит статусы, номера текстур и веса клеток в плоских массивах,
+клетка (y * кол-во столбцов + x) - индекс в них
 """
 
 from math import ceil
-from typing import List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
 import pygame as pg
 import pygame_menu as pgm
-from random import randint, choice
-from functools import reduce
+from random import randrange
 
 from PIL import Image
 
 from pg_menus import Events
 
 from parse_tiles import Tiles
+from maze_gen import cells_count, kruskal
+from maze_search import WaveSearch
 import consts as c
 
+# статусы клеток, код статуса - его индекс
+STATUSES = ("wall", "way", "checked_way", "unchecked_way")
+WALL, WAY, CHECKED_WAY, UNCHECKED_WAY = range(len(STATUSES))
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+# вес клеток, которые не участвуют в генерации: рамки, путей и убранных стен
+NO_WEIGHT = -1
+
 
 class Camera:
     def __init__(self, screen: pg.Surface,
@@ -91,32 +102,52 @@ class Camera:
         self.width, self.height = self.default_wh
 
 
-class TileField(List[List["TileField.Tile"]]):
+class TileField:
     class Tile:
         tiler = Tiles()
-        textures_status = {
-            "wall": tiler.get_random_wall,
-            "way": tiler.get_random_way,
-            "checked_way": tiler.get_random_checked_way,
-            "unchecked_way": tiler.get_random_unchecked_way
-        }
-
-        def __init__(self, x, y, status="unchecked_way", weight=None) -> None:
+        # текстуры статусов в порядке их кодов
+        textures = (tiler.wall_textures, tiler.way_floor_textures,
+                    tiler.checked_way_textures, tiler.unchecked_way_textures)
+        __slots__ = ("field", "index")
+
+        def __init__(self, field: "TileField", x: int, y: int) -> None:
             """
-            Класс клетки обладающей своей текстурой,
-            зависящей от статуса и координатами
+            Класс клетки - легкое представление клетки поля: статус,
+            текстура и вес хранятся в массивах поля, клетка помнит
+            только поле и свой индекс в нем
+            :param field: поле
             :param x: координато по оси x
             :param y: координато по оси y
-            :param status: статус клетки
-            :param weight: для генерации стен
             """
-            self.x = x
-            self.y = y
-            self.status = status
-            self.texture = TileField.Tile.textures_status[self.status]()
-            self.weight = weight
-            self.f_weight = {}
-            self.neighbours = []
+            self.field = field
+            self.index = y * field.cols + x
+
+        @property
+        def x(self) -> int:
+            return self.index % self.field.cols
+
+        @property
+        def y(self) -> int:
+            return self.index // self.field.cols
+
+        @property
+        def status(self) -> str:
+            return STATUSES[self.field.status[self.index]]
+
+        @property
+        def texture(self) -> pg.Surface:
+            code = self.field.status[self.index]
+            return TileField.Tile.textures[code][self.field.texture[self.index]]
+
+        @property
+        def weight(self) -> Optional[int]:
+            weight = int(self.field.weight[self.index])
+            return None if weight == NO_WEIGHT else weight
+
+        @weight.setter
+        def weight(self, weight: Optional[int]) -> None:
+            self.field.weight[self.index] = \
+                NO_WEIGHT if weight is None else weight
 
         def render(self, surface, cam) -> None:
             """
@@ -144,8 +175,7 @@ class TileField(List[List["TileField.Tile"]]):
             Метод обновления текстуры клетки исходя из статуса
             :param new_status: новый статус
             """
-            self.status = new_status
-            self.texture = TileField.Tile.textures_status[self.status]()
+            self.field.set_status(self.index, STATUS_CODES[new_status])
 
         def __hash__(self) -> int:
             return hash((self.x, self.y))
@@ -168,43 +198,125 @@ class TileField(List[List["TileField.Tile"]]):
 
     def __init__(self, screen, camera, clock, gifer=None) -> None:
         """
-        Класс поля для клеток, наследованный от двумерного списка
+        Класс поля клеток: статусы (uint8), номера текстур (uint8)
+        и веса (int32) клеток лежат в плоских массивах NumPy,
+        клетки TileField.Tile создаются только при обращении
         :param screen: холст, для отрисовки поля
         :param camera: камера
         :param clock: pygame clock для поддержания fps
         :param gifer: экземпляр GifSaver для записи гифки
         """
-        super().__init__()
-        self.walls = []
-        self.ways = []
         self.screen = screen
         self.camera = camera
         self.clock = clock
         self.gifer = gifer
+        self.cols = self.rows = 0
+        self.status = np.zeros(0, dtype=np.uint8)
+        self.texture = np.zeros(0, dtype=np.uint8)
+        self.weight = np.zeros(0, dtype=np.int32)
+        self.searcher: Optional[WaveSearch] = None
+        # текстуры, отмасштабированные под текущий размер клетки на экране
+        self._scaled: Dict[Tuple[int, int], pg.Surface] = {}
+        self._scaled_size = None
         self.pred_gen()
 
-    def __getitem__(self, item):
+    def _allocate(self, cols: int, rows: int) -> None:
+        """
+        Создание массивов поля, где все клетки - стены без веса
+        :param cols: кол-во столбцов
+        :param rows: кол-во строк
+        """
+        c.COLS, c.ROWS = cols, rows
+        self.cols, self.rows = cols, rows
+        self.status = np.full(cols * rows, WALL, dtype=np.uint8)
+        self.texture = np.zeros(cols * rows, dtype=np.uint8)
+        self.weight = np.full(cols * rows, NO_WEIGHT, dtype=np.int32)
+        # массивы поиска пути создаются при первом поиске на этом поле
+        self.searcher: Optional[WaveSearch] = None
+
+    def _random_textures(self, indices: np.ndarray = None) -> None:
+        """
+        Выбор случайных текстур клеток по их статусам
+        :param indices: индексы клеток, по умолчанию все клетки
+        """
+        counts = np.array([len(textures) for textures in
+                           TileField.Tile.textures], dtype=np.uint16)
+        status = self.status if indices is None else self.status[indices]
+        texture = (np.random.randint(0, 1 << 16, len(status), dtype=np.uint16)
+                   % counts[status]).astype(np.uint8)
+        if indices is None:
+            self.texture = texture
+        else:
+            self.texture[indices] = texture
+
+    def set_status(self, index: int, code: int) -> None:
+        """
+        Смена статуса клетки и выбор ее новой случайной текстуры
+        :param index: индекс клетки
+        :param code: код статуса
+        """
+        self.status[index] = code
+        self.texture[index] = randrange(len(TileField.Tile.textures[code]))
+
+    def __getitem__(self, item) -> Union["TileField.Tile",
+                                         List["TileField.Tile"]]:
         if isinstance(item, tuple):
             x, y = item
-            return super().__getitem__(y).__getitem__(x)
-        else:
-            return super().__getitem__(item)
+            if not (0 <= x < self.cols and 0 <= y < self.rows):
+                raise IndexError(f"Клетка ({x}, {y}) вне поля")
+            return TileField.Tile(self, x, y)
+        y = range(self.rows)[item]
+        return [TileField.Tile(self, x, y) for x in range(self.cols)]
 
-    def __setitem__(self, key, value):
-        if isinstance(key, tuple):
-            x, y = key
-            super().__getitem__(y).__setitem__(x, value)
-        else:
-            super().__setitem__(key, value)
+    def __len__(self) -> int:
+        return self.rows
+
+    def __iter__(self) -> Iterator[List["TileField.Tile"]]:
+        for y in range(self.rows):
+            yield self[y]
 
     def render(self) -> None:
         """
-        Метод отрисовки поля на холст
+        Метод отрисовки поля на холст: рисуются только клетки, попадающие
+        в камеру, одним вызовом blits, текстуры масштабируются
+        один раз на размер клетки
         """
         self.screen.fill(c.BLACK)
-        for line in self:
-            for tile in line:
-                tile.render(self.screen, self.camera)
+        cam = self.camera
+        step = c.CELL_SIZE * cam.zoom
+        size = ceil(step)
+        if size != self._scaled_size:
+            self._scaled.clear()
+            self._scaled_size = size
+        w_w, w_h = TileField.Tile.tiler.wall_tile_size
+        lift = int((w_h - w_w) * (size / w_w))
+        wall_h = int(w_h * size / w_w)
+
+        x_0 = max(int(cam.x // step), 0)
+        x_1 = min(int((cam.x + c.MAZE_W) // step) + 1, self.cols)
+        y_0 = max(int(cam.y // step), 0)
+        # стены выступают вверх, поэтому берется еще одна строка снизу
+        y_1 = min(int((cam.y + c.MAZE_H) // step) + 2, self.rows)
+        scaled = self._scaled
+        textures = TileField.Tile.textures
+        lefts = [ceil(x * c.CELL_SIZE * cam.zoom - cam.x)
+                 for x in range(x_0, x_1)]
+        seq = []
+        for y in range(y_0, y_1):
+            start = y * self.cols
+            top = ceil(y * c.CELL_SIZE * cam.zoom - cam.y)
+            for left, code, tex in zip(
+                    lefts, self.status[start + x_0:start + x_1].tolist(),
+                    self.texture[start + x_0:start + x_1].tolist()):
+                surface = scaled.get((code, tex))
+                if surface is None:
+                    surface = pg.transform.scale(
+                        textures[code][tex],
+                        (size, wall_h if code == WALL else size))
+                    scaled[code, tex] = surface
+                seq.append((surface,
+                            (left, top - lift if code == WALL else top)))
+        self.screen.blits(seq, doreturn=False)
         pg.display.flip()
         self.clock.tick(30)
 
@@ -212,21 +324,36 @@ class TileField(List[List["TileField.Tile"]]):
         """
         Метод генерации поля, где у каждой клетки соседи - стены
         """
-        max_weight = c.ROWS * c.COLS
-        for y in range(c.ROWS):
-            line = []
-            for x in range(c.COLS):
-                if x == 0 or x == c.COLS - 1 or y == 0 or y == c.ROWS - 1:
-                    new_tile = TileField.Tile(x, y, status="wall")
-                elif x % 2 == 0 or y % 2 == 0:
-                    new_tile = TileField.Tile(x, y, status="wall",
-                                              weight=randint(0, max_weight))
-                    self.walls.append(new_tile)
-                else:
-                    new_tile = TileField.Tile(x, y)
-                    self.ways.append(new_tile)
-                line.append(new_tile)
-            self.append(line)
+        cols, rows = c.COLS, c.ROWS
+        self._allocate(cols, rows)
+        xs, ys = np.arange(cols), np.arange(rows)
+        inner = ((ys > 0) & (ys < rows - 1))[:, None] & \
+            ((xs > 0) & (xs < cols - 1))[None, :]
+        way = inner & (ys % 2 == 1)[:, None] & (xs % 2 == 1)[None, :]
+        self.status[way.ravel()] = UNCHECKED_WAY
+        maze_wall = (inner & ~way).ravel()
+        self.weight[maze_wall] = np.random.randint(
+            0, rows * cols + 1, np.count_nonzero(maze_wall), dtype=np.int32)
+        self._random_textures()
+
+    def neighbours(self, index: int) -> List[int]:
+        """
+        Индексы соседей клетки, не являющихся стенами
+        :param index: индекс клетки
+        :return: список индексов слева, справа, сверху и снизу
+        """
+        cols, status = self.cols, self.status
+        x = index % cols
+        result = []
+        if x > 0 and status[index - 1] != WALL:
+            result.append(index - 1)
+        if x < cols - 1 and status[index + 1] != WALL:
+            result.append(index + 1)
+        if index >= cols and status[index - cols] != WALL:
+            result.append(index - cols)
+        if index + cols < len(status) and status[index + cols] != WALL:
+            result.append(index + cols)
+        return result
 
     def get_not_wall_neighbours(self, tile: "TileField.Tile") -> \
             List["TileField.Tile"]:
@@ -235,39 +362,26 @@ class TileField(List[List["TileField.Tile"]]):
         :param tile: клетка
         :return: список клеток
         """
-        neighbours = [
-            self[tile.x - 1, tile.y],
-            self[tile.x + 1, tile.y],
-            self[tile.x, tile.y - 1],
-            self[tile.x, tile.y + 1]
+        cols = self.cols
+        return [TileField.Tile(self, index % cols, index // cols)
+                for index in self.neighbours(tile.index)]
 
-        ]
-        return [tile for tile in neighbours if tile.status != "wall"]
+    def reset_ways(self, keep: List["TileField.Tile"] = ()) -> None:
+        """
+        Сброс всех клеток, кроме стен и клеток keep, в непроверенный путь
+        :param keep: клетки, статус которых не меняется
+        """
+        mask = self.status != WALL
+        mask[[tile.index for tile in keep]] = False
+        self.status[mask] = UNCHECKED_WAY
+        self._random_textures(np.flatnonzero(mask))
 
     def generate_maze(self) -> None:
         """
-        Метод генерации лабиринта по алгоритму Краскала
+        Метод генерации лабиринта по алгоритму Краскала: стены
+        перебираются по возрастанию веса, связность клеток хранится
+        в системе непересекающихся множеств (maze_gen.kruskal)
         """
-        def unite_sets(s_list) -> List[set]:
-            """
-            Функция объединения пересекающихся множеств в списке
-            :param s_list: список с множествами
-            :return: список без пересекающихся множеств
-            """
-            done = False
-            while not done:
-                done = True
-                for i in range(len(s_list)):
-                    for j in range(i + 1, len(s_list)):
-                        if s_list[i].intersection(s_list[j]):
-                            s_list[i].update(s_list[j])
-                            s_list.pop(j)
-                            done = False
-                            break
-                    if not done:
-                        break
-            return s_list
-
         if not c.REALTIME_GEN:
             menu = pgm.Menu("Generating...",
                             width=self.screen.get_width(),
@@ -279,38 +393,23 @@ class TileField(List[List["TileField.Tile"]]):
                                              width=int(
                                                  self.screen.get_width() * 0.8))
 
-        ways = set(self.ways)
-
-        edges = []
-        for wall in self.walls:
-            verts = set(self.get_not_wall_neighbours(wall))
-            if verts:
-                edges.append((verts, wall))
-        edges.sort(key=lambda x: x[1].weight)
-
-        vert_sets: List[set] = []
-        idx = 0
-        while True:
-
-            edge = edges[idx]
-            cycle = False
-            for v_set in vert_sets:
-                if edge[0].intersection(v_set):
-                    if edge[0].issubset(v_set):
-                        cycle = True
-                    else:
-                        v_set.update(edge[0])
-                    break
-            else:
-                vert_sets.append(edge[0])
-            if not cycle:
-                edge[1].upd_texture("unchecked_way")
-                edge[1].weight = None
-            unite_sets(vert_sets)
+        # прогресс - доля объединений из (кол-во клеток - 1) нужных
+        width, height = cells_count(self.cols, self.rows)
+        merges = max(width * height - 1, 1)
+        percentage = 0
+        # без отрисовки по ходу генерации стены убираются разом в конце,
+        # убранных стен ровно (кол-во клеток - 1)
+        opened = np.empty(max(width * height - 1, 0), dtype=np.int64)
+        count = 0
+        for x, y, components in kruskal(self.cols, self.rows, self.weight):
+            index = y * self.cols + x
+            opened[count] = index
+            count += 1
 
             if self.gifer:
                 self.gifer.add_img(pg.image.tostring(self.screen, "RGBA"))
             if c.REALTIME_GEN:
+                self.set_status(index, UNCHECKED_WAY)
                 Events.pygame_events_handler(
                     {
                         "handler": Events.move_event_handler,
@@ -318,61 +417,40 @@ class TileField(List[List["TileField.Tile"]]):
                     }
                 )
                 self.render()
-            else:
-                percentage = round(
-                    len(reduce(
-                        lambda x, y: x.union(y),
-                        vert_sets
-                    )) / len(ways) * 100, 2
-                )
-                prog_bar.set_value(percentage)
-                events = pg.event.get()
-                menu.update(events)
-                menu.draw(self.screen)
-                pg.display.flip()
-
-            idx += 1
-            if vert_sets[0] == ways:
-                break
+                continue
+            new_percentage = (merges - components + 1) * 100 // merges
+            # полоса перерисовывается, только когда растет целый процент
+            if new_percentage == percentage:
+                continue
+            percentage = new_percentage
+            prog_bar.set_value(percentage)
+            events = pg.event.get()
+            menu.update(events)
+            menu.draw(self.screen)
+            pg.display.flip()
+
+        opened = opened[:count]
+        self.status[opened] = UNCHECKED_WAY
+        self.weight[opened] = NO_WEIGHT
+        self._random_textures(opened)
 
     def find_way(self, routes) -> None:
         """
-        Метод поиска пути в лабиринте используя
-        алгоритм Ли (Волновой алгоритм)
+        Метод поиска пути в лабиринте поиском в ширину
+        (maze_search.WaveSearch). Поиск идет без отрисовки,
+        просмотренные клетки показываются по волнам уже после него
         :param routes: список точек, в который нужно прийти по порядку
         """
-        def mark_tiles(from_tile: TileField.Tile, to_tile: TileField.Tile) -> bool:
+        def render_waves() -> None:
             """
-            Функция отметки клеток, который просмотрены алгоритмом
-            :param from_tile: начальная клетка пути
-            :param to_tile: конечная клетка пути
-            :return: True при наличии пути, False в обратном случае
+            Функция отрисовки волн последнего поиска на холст
             """
-            from_tile.f_weight[to_tile] = 1
-            weighted = {1: [from_tile]}
-
-            while isinstance(to_tile.f_weight.get(to_tile, False), bool):
-                cur_weight = max(weighted.keys())
-                cur_wave = weighted[cur_weight]
-
-                weighted[cur_weight + 1] = []
-                appends = 0
-                for cur_tile in cur_wave:
-                    for n_tile in cur_tile.neighbours:
-
-                        if n_tile.f_weight.get(to_tile, False):
-                            continue
-
-                        n_tile.f_weight[to_tile] = cur_weight + 1
-
-                        if n_tile.status != "way":
-                            n_tile.upd_texture("checked_way")
-
-                        weighted[cur_weight + 1].append(n_tile)
-                        appends += 1
-                if appends == 0:
-                    print("NO WAY")
-                    return False
+            cells, distances = self.searcher.visited()
+            keep = self.status[cells] != WAY
+            cells, distances = cells[keep], distances[keep]
+            for wave in np.split(cells, np.flatnonzero(np.diff(distances)) + 1):
+                self.status[wave] = CHECKED_WAY
+                self._random_textures(wave)
 
                 Events.pygame_events_handler(
                     {
@@ -385,59 +463,18 @@ class TileField(List[List["TileField.Tile"]]):
 
                 if self.gifer:
                     self.gifer.add_img(pg.image.tostring(self.screen, "RGBA"))
-            return True
 
-        def find_way_in_marked(from_tile: TileField.Tile, to_tile: TileField.Tile) \
-            -> List[TileField.Tile]:
-            """
-            Функция поиска пути в пространстве отмеченных клеток
-            :param from_tile: начальная клетка
-            :param to_tile: конечная клетка
-            :return: список клеток, входящих в путь
-            """
-            way = [to_tile]
-            cur_tile = to_tile
-            while cur_tile != from_tile:
-                neighbours = self.get_not_wall_neighbours(cur_tile)
-                cur_marked = list(
-                    filter(lambda c_tile: c_tile.f_weight.get(to_tile, False),
-                           neighbours))
-
-                lowest = \
-                    min(cur_marked,
-                        key=lambda c_tile: c_tile.f_weight[to_tile]).f_weight[
-                        to_tile]
-                lowest_list = [c_tile for c_tile in cur_marked if
-                               c_tile.f_weight[to_tile] == lowest]
-                try:
-                    res_tile = choice(lowest_list)
-                except Exception:
-                    break
-
-                way.append(res_tile)
-                cur_tile = res_tile
-
-                Events.pygame_events_handler(
-                    {
-                        "handler": Events.move_event_handler,
-                        "args": [self.camera]
-                    }
-                )
-
-            way.reverse()
-            return way
-
-        def render_ways(ways: List[List[TileField.Tile]]) -> None:
+        def render_ways(ways: List[List[int]]) -> None:
             """
             Функция отрисовки клеток путей на холст
-            :param ways:
+            :param ways: списки индексов клеток путей
             """
             for way in ways:
                 if way is None:
                     continue
                 for tile in way:
 
-                    tile.upd_texture("way")
+                    self.set_status(tile, WAY)
 
                     Events.pygame_events_handler(
                         {
@@ -450,26 +487,28 @@ class TileField(List[List["TileField.Tile"]]):
                     if self.gifer:
                         self.gifer.add_img(pg.image.tostring(self.screen, "RGBA"))
 
-        for y in range(1, c.ROWS - 1):
-            for x in range(1, c.COLS - 1):
-                tile = self[x, y]
-                tile.f_weight = {}
-                if tile.status != "wall":
-                    tile.neighbours = self.get_not_wall_neighbours(tile)
-                    if tile.status != "way":
-                        tile.upd_texture("unchecked_way")
+        # отметки прошлых поисков сбрасываются, выбранные точки остаются
+        checked = np.flatnonzero(self.status == CHECKED_WAY)
+        self.status[checked] = UNCHECKED_WAY
+        self._random_textures(checked)
 
-        pairs = [(routes[i], routes[i + 1]) for i in range(len(routes) - 1)]
+        if self.searcher is None:
+            self.searcher = WaveSearch(self.cols, self.rows)
+        passable = self.status != WALL
+        indices = [tile.index for tile in routes]
+        pairs = [(indices[i], indices[i + 1]) for i in range(len(indices) - 1)]
 
         ways = []
         for pair in pairs:
-            if mark_tiles(*pair):
-                ways.append(find_way_in_marked(*pair))
+            way = self.searcher.search(passable, *pair)
+            render_waves()
+            if way is None:
+                print("NO WAY")
+                continue
+            ways.append(way)
 
         render_ways(ways)
 
-        print("fin")
-
     def save_to_txt(self, wall="▓▓", way="░░", filename="maze.txt") -> None:
         """
         Функция сохранения лабиринта в txt формат
@@ -480,15 +519,14 @@ class TileField(List[List["TileField.Tile"]]):
         if len(wall) != len(way):
             raise ValueError("Длина обозначения стены не может "
                              "отличаться от длины обозначения пути")
+        symbols = [way] * len(STATUSES)
+        symbols[WALL] = wall
         with open(filename, "w", encoding="utf-8") as file:
             file.write(f"wall={wall}\n")
             file.write(f"way={way}\n\n")
-            for line in self:
-                for tile in line:
-                    if tile.status == "wall":
-                        file.write(wall)
-                    else:
-                        file.write(way)
+            for y in range(self.rows):
+                line = self.status[y * self.cols:(y + 1) * self.cols]
+                file.write("".join(symbols[code] for code in line.tolist()))
                 file.write("\n")
 
     def save_to_png(self, filename="maze_sources\\maze.png") -> None:
@@ -497,19 +535,10 @@ class TileField(List[List["TileField.Tile"]]):
         :param filename: название файла
         """
         f_w, f_h = TileField.Tile.tiler.floor_tile_size
-        save_surface = pg.Surface((f_w * c.COLS, f_w * c.ROWS))
-        surf_rect = save_surface.get_rect()
-
-        for y, line in enumerate(self):
-            for x, tile in enumerate(line):
-                rect = pg.Rect(x * f_w, y * f_h, f_w, f_h)
-                if self[x, y].status == "wall":
-                    pg.draw.rect(save_surface, c.BLACK, rect)
-                else:
-                    pg.draw.rect(save_surface, c.WHITE, rect)
-                # save_surface.blit(texture_surface, rect)
-        img = Image.frombytes('RGBA', (surf_rect.w, surf_rect.h),
-                              pg.image.tostring(save_surface, 'RGBA'))
+        pixels = np.where(self.status.reshape(self.rows, self.cols) == WALL,
+                          0, 255).astype(np.uint8)
+        pixels = np.repeat(np.repeat(pixels, f_h, axis=0), f_w, axis=1)
+        img = Image.fromarray(pixels, "L").convert("RGBA")
         img.save(filename)
         img.close()
 
@@ -529,19 +558,21 @@ class TileField(List[List["TileField.Tile"]]):
                                  "отличаться от длины обозначения пути")
             tile_len = len(wall)
             file.readline()
-            self.clear()
-            y = 0
+            lines = []
             while (line := file.readline()) != "":
-                field_line = []
-                for x, inline_idx in enumerate(range(0, len(line), tile_len)):
+                codes = []
+                for inline_idx in range(0, len(line), tile_len):
                     if line[inline_idx:inline_idx + tile_len] == wall:
-                        field_line.append(TileField.Tile(x, y, "wall"))
+                        codes.append(WALL)
                     elif line[inline_idx:inline_idx + tile_len] == way:
-                        field_line.append(TileField.Tile(x, y, "unchecked_way"))
-                self.append(field_line)
-                y += 1
-            c.ROWS = y
-            c.COLS = len(self[0])
+                        codes.append(UNCHECKED_WAY)
+                lines.append(codes)
+        cols = len(lines[0])
+        self._allocate(cols, len(lines))
+        for y, codes in enumerate(lines):
+            codes = codes[:cols]
+            self.status[y * cols:y * cols + len(codes)] = codes
+        self._random_textures()
 
     def load_from_png(self, filename="maze_sources/test2.png") -> None:
         """
@@ -553,32 +584,20 @@ class TileField(List[List["TileField.Tile"]]):
         img = img.resize((i_w // c.CELL_SIZE, i_h // c.CELL_SIZE),
                          resample=Image.NEAREST)
         img = img.convert('1')
-
-        width, height = img.size
-        self.clear()
-        c.COLS = width
-        c.ROWS = height
-
-        for y in range(height):
-            line = []
-            for x in range(width):
-                col = img.getpixel((x, y))
-                if x == 0 or x == width - 1 or y == 0 or y == height - 1:
-                    line.append(TileField.Tile(x, y, status="wall"))
-                elif col == 255:
-                    line.append(TileField.Tile(x, y, "unchecked_way"))
-                else:
-                    line.append(TileField.Tile(x, y, "wall"))
-            self.append(line)
-
+        pixels = np.array(img, dtype=bool)
         img.close()
 
+        height, width = pixels.shape
+        self._allocate(width, height)
+        status = np.where(pixels, UNCHECKED_WAY, WALL).astype(np.uint8)
+        status[[0, -1], :] = WALL
+        status[:, [0, -1]] = WALL
+        self.status = status.ravel()
+        self._random_textures()
+
     def regen(self) -> None:
         """
         Метод регенерации лабиринта
         """
-        self.walls.clear()
-        self.ways.clear()
-        super().clear()
         self.pred_gen()
         self.generate_maze()